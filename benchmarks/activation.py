@@ -0,0 +1,122 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Benchmark of plugin activation time and memory against the number of tabs.
+
+Activates the gedit 3.8 plugin on a window with N tabs, then makes every tab
+active once (which is when the plugin hooks up a view and indexes its
+document). The window is a stand-in for Gedit.Window that holds real
+GtkSource views, so this needs GTK 3, GtkSourceView 3 and the Gedit typelib.
+
+Usage: python3 benchmarks/activation.py [LINES_PER_DOCUMENT] [TAB_COUNT...]
+"""
+
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import gi
+gi.require_version('Gtk', '3.0')
+gi.require_version('GtkSource', '3.0')
+from gi.repository import GObject, Gtk, GtkSource
+
+# keep the benchmark away from the user's vocabulary file
+os.environ['XDG_DATA_HOME'] = tempfile.mkdtemp()
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gedit3-8'))
+
+import intelligent_text_completion
+
+SAMPLE_LINE = "    def frobnicate(self, widget, *args): return self._helper(widget) + 42  # lorem ipsum\n"
+
+class Tab(object):
+    def __init__(self, lines):
+        self.document = GtkSource.Buffer()
+        self.document.set_text(SAMPLE_LINE * lines)
+        self.view = GtkSource.View.new_with_buffer(self.document)
+
+    def get_document(self):
+        return self.document
+
+    def get_view(self):
+        return self.view
+
+class Window(GObject.Object):
+    """ The part of Gedit.Window that the plugin uses """
+
+    __gsignals__ = {
+        'tab-added': (GObject.SignalFlags.RUN_LAST, None, (object,)),
+        'tab-removed': (GObject.SignalFlags.RUN_LAST, None, (object,)),
+        'active-tab-changed': (GObject.SignalFlags.RUN_LAST, None, (object,)),
+    }
+
+    def __init__(self, tabs):
+        GObject.Object.__init__(self)
+        self.tabs = tabs
+        self.active_tab = tabs[0] if tabs else None
+        # the plugin adds its menu items to it
+        self.ui_manager = Gtk.UIManager()
+
+    def get_views(self):
+        return [tab.get_view() for tab in self.tabs]
+
+    def get_documents(self):
+        return [tab.get_document() for tab in self.tabs]
+
+    def get_active_tab(self):
+        return self.active_tab
+
+    def get_active_document(self):
+        return self.active_tab.get_document()
+
+    def get_ui_manager(self):
+        return self.ui_manager
+
+    def set_active_tab(self, tab):
+        self.active_tab = tab
+        self.emit('active-tab-changed', tab)
+
+class BenchmarkPlugin(intelligent_text_completion.IntelligentTextCompletionPlugin):
+    # a plain attribute instead of the Gedit.Window property
+    window = None
+
+def measure(callback):
+    """ Get (milliseconds, KiB allocated) of callback() """
+    tracemalloc.start()
+    start = time.perf_counter()
+    callback()
+    elapsed = (time.perf_counter() - start) * 1000
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, size / 1024.0
+
+def visit_all(window):
+    for tab in window.tabs:
+        window.set_active_tab(tab)
+
+def main(argv):
+    lines = int(argv[0]) if argv else 1000
+    tab_counts = [int(arg) for arg in argv[1:]] or [1, 10, 100, 300]
+    print("%d lines per document" % lines)
+    print("%6s %14s %14s %14s %14s" % ("tabs", "activate ms", "activate KiB", "visit all ms", "visit all KiB"))
+    for tab_count in tab_counts:
+        window = Window([Tab(lines) for _ in range(tab_count)])
+        plugin = BenchmarkPlugin()
+        plugin.window = window
+        activate_ms, activate_kib = measure(plugin.do_activate)
+        visit_ms, visit_kib = measure(lambda: visit_all(window))
+        plugin.do_deactivate()
+        print("%6d %14.1f %14.1f %14.1f %14.1f" % (tab_count, activate_ms, activate_kib, visit_ms, visit_kib))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,418 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Differential fuzzing of the completion rules.
+
+Generates random documents, cursor positions and keystrokes, runs them
+through a reference implementation and through the current one, and reports
+the first case where the resulting text or cursor differ, shrunk to a small
+case by removing keystrokes and pieces of the document while the difference
+remains.
+
+Targets:
+  keys     The plugin's key handler. The reference is the gedit 3.8 plugin at
+           the git revision given with --reference, which is required: pass
+           the last revision whose key handling is known to be right, like
+           the merge base of a branch. The current one is the working tree.
+           Each runs in its own process on real GtkSource buffers. The plugin
+           module imports Gedit and PeasGtk too, so this needs gedit 3.8 and
+           libpeas with their GObject introspection data, besides GTK 3 and
+           GtkSourceView 3.
+  xmltags  get_closing_xml_tag and the TagIndex against the frozen copy of
+           the original implementation below for XML. For HTML, whose implied
+           end tags the original didn't know, the TagIndex is compared with
+           get_unclosed_xml_tags on the whole text, after it was scanned in
+           two pieces and part of it was forgotten and scanned again. This
+           needs nothing but Python.
+
+Usage: python3 benchmarks/differential_fuzz.py [--target keys|xmltags]
+           [--reference REVISION] [--seconds N] [--seed N]
+
+The exit status is 1 when a difference was found, and 2 when a case fails
+with the same error on both sides, since then nothing was compared.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+PLUGIN_DIR = os.path.join(ROOT, 'gedit3-8')
+
+# cases that are sent to the workers at once
+BATCH_SIZE = 50
+
+##### case generation #####
+
+FRAGMENTS = [
+    '<div>', '</div>', '<p class="x">', '</p>', '<br/>', '<!-- c -->', '<?php ?>', '< span>',
+    '{% if x %}', '{{ y }}', '{', '}', '(', ')', '[', ']', '"', "'", '"""', '\\',
+    '/*', '/**', ' * ', '*/', '// ', '- ', '* ', '> ', '1. ', '2. ', 'a) ', 'ii. ', '| a | bb |', '|',
+    'def f(x,', 'return x', 'if x:', 'then', 'fi', 'do', 'done', 'end',
+    'word', 'x = 1', ' ', '    ', '\t', '\n', '\n', '\n',
+]
+# elements with implied end tags and void elements, for the HTML cases
+HTML_FRAGMENTS = [
+    '<ul>', '</ul>', '<li>', '</li>', '<LI>', '<p>', '<dl>', '<dt>', '<dd>', '<table>', '</table>',
+    '<tr>', '<td>', '</td>', '<th>', '<select>', '<option>', '<optgroup>', '<br>', '</br>', '<img src="x">',
+    '<head>', '<body>', '</body>', '<html>', '</html>',
+]
+# (string, keyval) of the keys that are typed
+KEYS = [(char, ord(char)) for char in '"\'()[]{}<>/%|*:-.1a \\'] + [
+    ('\r', 65293), # return
+    ('\x08', 65288), # backspace
+    ('\t', 65289), # tab
+]
+LANGUAGES = [None, 'python', 'html', 'xml', 'django', 'markdown', 'c', 'js', 'sh']
+
+def random_document(rng, max_fragments=40):
+    return ''.join(rng.choice(FRAGMENTS) for _ in range(rng.randint(0, max_fragments)))
+
+def random_case(rng):
+    document = random_document(rng)
+    return {
+        'language': rng.choice(LANGUAGES),
+        'document': document,
+        'cursor': rng.randint(0, len(document)),
+        'keys': [rng.choice(KEYS) for _ in range(rng.randint(1, 6))],
+    }
+
+##### shrinking #####
+
+def _without_keys(case):
+    for i in range(len(case['keys']) - 1, -1, -1):
+        smaller = dict(case)
+        smaller['keys'] = case['keys'][:i] + case['keys'][i + 1:]
+        yield smaller
+
+def _without_text(case):
+    document = case['document']
+    size = len(document) // 2
+    while size >= 1:
+        for start in range(0, len(document) - size + 1, size):
+            end = start + size
+            cursor = case['cursor']
+            if start < cursor < end:
+                continue
+            smaller = dict(case)
+            smaller['document'] = document[:start] + document[end:]
+            smaller['cursor'] = cursor - size if cursor >= end else cursor
+            yield smaller
+        size //= 2
+
+def _without_language(case):
+    if case.get('language') is not None:
+        smaller = dict(case)
+        smaller['language'] = None
+        yield smaller
+
+def shrink(case, differs):
+    """ Make case smaller as long as differs(case) stays true """
+    progress = True
+    while progress:
+        progress = False
+        for candidates in (_without_keys, _without_text, _without_language):
+            for smaller in candidates(case):
+                if differs(smaller):
+                    case = smaller
+                    progress = True
+                    break
+            if progress:
+                break
+    return case
+
+##### xmltags target #####
+
+def reference_get_closing_xml_tag(document):
+    """ The original implementation, frozen """
+    tags = re.findall(r'<.*?>', document)
+    tags.reverse()
+    closed = []
+    for tag in tags:
+        # ignore special tags like <!-- --> and <!doctype ...>
+        if re.match(r'<!.*?>', tag):
+            continue
+        # ignore special tags like <?, <?=, <?php
+        if re.match(r'<\?.*?>', tag):
+            continue
+        # neutral tag
+        if re.match(r'<.*?/>', tag):
+            continue
+        # closing tag
+        m = re.match(r'</ *([^ ]*).*?>', tag)
+        if m:
+            closed.append(m.group(1))
+            continue
+        # opening tag
+        m = re.match(r'< *([^/][^ ]*).*?>', tag)
+        if m:
+            openedtag = m.group(1)
+            while True:
+                if len(closed) == 0:
+                    return openedtag
+                close_tag = closed.pop()
+                if close_tag.lower() == openedtag.lower():
+                    break
+            continue
+    return None
+
+class XmlTagsTarget(object):
+
+    def __init__(self, reference):
+        sys.path.insert(0, PLUGIN_DIR)
+        from intelligent_text_completion_lib.xmltags import get_closing_xml_tag, get_unclosed_xml_tags, TagIndex
+        self.get_closing_xml_tag = get_closing_xml_tag
+        self.get_unclosed_xml_tags = get_unclosed_xml_tags
+        self.TagIndex = TagIndex
+
+    def random_case(self, rng):
+        html = rng.random() < 0.5
+        fragments = FRAGMENTS + HTML_FRAGMENTS * 2 if html else FRAGMENTS
+        document = ''.join(rng.choice(fragments) for _ in range(rng.randint(0, 80)))
+        return {
+            'document': document,
+            'cursor': rng.randint(0, len(document)),
+            'split': rng.randint(0, len(document)),
+            'forget': rng.randint(0, len(document)),
+            'keys': [],
+            'html': html,
+        }
+
+    def _indexed(self, case, limit=1):
+        # index the document in two pieces, forget the text from an offset on
+        # and index it again, then look at the tags in front of the cursor
+        document = case['document']
+        split = min(case['split'], len(document))
+        index = self.TagIndex()
+        index.scan(document[:split], 0)
+        index.scan(document[index.scanned_end:], index.scanned_end)
+        index.forget(min(case['forget'], len(document)))
+        index.scan(document[index.scanned_end:], index.scanned_end)
+        return index.unclosed_before(case['cursor'], limit=limit, html=case['html'])
+
+    def run(self, cases):
+        reference = []
+        current = []
+        for case in cases:
+            text = case['document'][:case['cursor']]
+            if case['html']:
+                reference.append(self.get_unclosed_xml_tags(text, html=True))
+                current.append(self._indexed(case, limit=None))
+                continue
+            expected = reference_get_closing_xml_tag(text)
+            reference.append([expected, expected])
+            unclosed = self._indexed(case)
+            current.append([self.get_closing_xml_tag(text), unclosed[0] if unclosed else None])
+        return reference, current
+
+    def close(self):
+        pass
+
+##### keys target #####
+
+_worker = None
+
+def _init_key_worker(plugin_dir):
+    """ Load the plugin in plugin_dir in this worker process """
+    global _worker
+    os.environ['XDG_DATA_HOME'] = tempfile.mkdtemp()
+    os.environ['XDG_CONFIG_HOME'] = tempfile.mkdtemp()
+    sys.path.insert(0, plugin_dir)
+    _worker = KeyWorker()
+
+class KeyEvent(object):
+    """ The fields of Gdk.EventKey that the plugin reads """
+
+    def __init__(self, string, keyval):
+        self.string = string
+        self.keyval = keyval
+
+class KeyWorker(object):
+
+    def __init__(self):
+        import gi
+        gi.require_version('Gtk', '3.0')
+        gi.require_version('GtkSource', '3.0')
+        from gi.repository import GObject, GtkSource
+        import intelligent_text_completion
+
+        class Document(GtkSource.Buffer):
+            """ A buffer with the signals of Gedit.Document that the plugin
+            connects to """
+            __gsignals__ = {
+                'loaded': (GObject.SignalFlags.RUN_LAST, None, ()),
+            }
+
+        class Window(GObject.Object):
+            """ The part of Gedit.Window that the key handler uses """
+
+            def __init__(self):
+                GObject.Object.__init__(self)
+                self.document = None
+
+            def get_active_document(self):
+                return self.document
+
+        class FuzzPlugin(intelligent_text_completion.IntelligentTextCompletionPlugin):
+            # a plain attribute instead of the Gedit.Window property
+            window = None
+
+        self.GtkSource = GtkSource
+        self.Document = Document
+        self.languages = GtkSource.LanguageManager.get_default()
+        self.window = Window()
+        self.plugin = FuzzPlugin()
+        self.plugin.window = self.window
+
+    def run_case(self, case):
+        doc = self.Document()
+        if case['language']:
+            doc.set_language(self.languages.get_language(case['language']))
+        doc.set_text(case['document'])
+        view = self.GtkSource.View.new_with_buffer(doc)
+        self.window.document = doc
+        doc.place_cursor(doc.get_iter_at_offset(case['cursor']))
+        try:
+            for string, keyval in case['keys']:
+                if self.plugin._handle_event(view, KeyEvent(string, keyval), self.window):
+                    continue
+                # what GtkTextView does with the key
+                cursor = doc.get_iter_at_mark(doc.get_insert())
+                if keyval == 65288:
+                    doc.backspace(cursor, True, True)
+                elif keyval == 65293:
+                    doc.insert_interactive_at_cursor('\n', -1, True)
+                else:
+                    doc.insert_interactive_at_cursor(string, -1, True)
+        except Exception as e:
+            return {'error': '%s: %s' % (type(e).__name__, e)}
+        finally:
+            # older revisions keep less state per document
+            state = getattr(self.plugin, '_instances', {}).pop(doc, None)
+            if hasattr(state, 'clear'):
+                state.clear()
+        start, end = doc.get_bounds()
+        return {
+            'text': doc.get_text(start, end, False),
+            'cursor': doc.get_iter_at_mark(doc.get_insert()).get_offset(),
+        }
+
+def _run_key_cases(cases):
+    return [_worker.run_case(case) for case in cases]
+
+def export_revision(revision):
+    """ Get a directory with the gedit 3.8 plugin at revision """
+    head = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=ROOT)
+    commit = subprocess.check_output(['git', 'rev-parse', revision + '^{commit}'], cwd=ROOT)
+    changes = subprocess.check_output(['git', 'status', '--porcelain', 'gedit3-8'], cwd=ROOT)
+    if commit == head and not changes.strip():
+        raise SystemExit("the reference %s is the same as the working tree" % revision)
+    directory = tempfile.mkdtemp()
+    archive = subprocess.Popen(['git', 'archive', revision, 'gedit3-8'], cwd=ROOT, stdout=subprocess.PIPE)
+    subprocess.check_call(['tar', '-x', '-C', directory], stdin=archive.stdout)
+    if archive.wait() != 0:
+        raise SystemExit("can't export revision %s" % revision)
+    return os.path.join(directory, 'gedit3-8')
+
+def check_gedit_modules():
+    """ Exit if the modules the plugin needs can't be imported """
+    try:
+        import gi
+        for namespace, version in (('Gtk', '3.0'), ('GtkSource', '3.0'), ('Gedit', '3.0'), ('PeasGtk', '1.0')):
+            gi.require_version(namespace, version)
+        from gi.repository import Gtk, GtkSource, Gedit, PeasGtk
+    except (ImportError, ValueError) as e:
+        raise SystemExit("the keys target needs gedit 3.8 and its introspection data: %s" % e)
+
+class KeysTarget(object):
+
+    def __init__(self, reference):
+        if reference is None:
+            raise SystemExit("the keys target needs --reference REVISION")
+        # a worker that fails to start is started again by its pool forever
+        check_gedit_modules()
+        context = multiprocessing.get_context('spawn')
+        self.pools = [
+            context.Pool(1, _init_key_worker, (export_revision(reference),)),
+            context.Pool(1, _init_key_worker, (PLUGIN_DIR,)),
+        ]
+
+    def random_case(self, rng):
+        return random_case(rng)
+
+    def run(self, cases):
+        results = [pool.apply_async(_run_key_cases, (cases,)) for pool in self.pools]
+        return tuple(result.get() for result in results)
+
+    def close(self):
+        for pool in self.pools:
+            pool.close()
+            pool.join()
+
+TARGETS = {
+    'keys': KeysTarget,
+    'xmltags': XmlTagsTarget,
+}
+
+##### main #####
+
+def main(argv):
+    parser = argparse.ArgumentParser(description='Differential fuzzing of the completion rules.')
+    parser.add_argument('--target', choices=sorted(TARGETS), default='keys')
+    parser.add_argument('--reference', help='git revision of the reference plugin (required by the keys target)')
+    parser.add_argument('--seconds', type=float, default=60.0, help='time budget')
+    parser.add_argument('--seed', type=int, default=None)
+    options = parser.parse_args(argv)
+    seed = options.seed if options.seed is not None else random.randrange(2 ** 32)
+    rng = random.Random(seed)
+    print("target %s, seed %d" % (options.target, seed))
+
+    target = TARGETS[options.target](options.reference)
+    try:
+        deadline = time.time() + options.seconds
+        count = 0
+        while time.time() < deadline:
+            cases = [target.random_case(rng) for _ in range(BATCH_SIZE)]
+            reference_results, current_results = target.run(cases)
+            count += len(cases)
+            for case, reference_result, current_result in zip(cases, reference_results, current_results):
+                if reference_result == current_result and isinstance(current_result, dict) and 'error' in current_result:
+                    print("both sides failed after %d cases, the harness is broken:" % count)
+                    print(json.dumps({'case': case, 'error': current_result['error']}, indent=2))
+                    return 2
+                if reference_result != current_result:
+                    def differs(candidate):
+                        reference_result, current_result = target.run([candidate])
+                        return reference_result != current_result
+                    case = shrink(case, differs)
+                    reference_results, current_results = target.run([case])
+                    print("difference after %d cases:" % count)
+                    print(json.dumps({
+                        'case': case,
+                        'reference': reference_results[0],
+                        'current': current_results[0],
+                    }, indent=2))
+                    return 1
+        print("%d cases, no differences" % count)
+        return 0
+    finally:
+        target.close()
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
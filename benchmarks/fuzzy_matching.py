@@ -0,0 +1,117 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Benchmark of the fuzzy matcher against a naive scorer.
+
+The naive scorer computes the prefix edit distance with dynamic programming
+for every word in the vocabulary. Both are run on the same random queries
+(prefixes of vocabulary words, half of them with a typo) and their results are
+compared.
+
+Usage: python benchmarks/fuzzy_matching.py [VOCABULARY_SIZE] [QUERIES]
+"""
+
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gedit3-8'))
+
+from intelligent_text_completion_lib.fuzzy import FuzzyIndex, EXACT, TYPO, SUBSEQUENCE, MIN_TYPO_LENGTH, is_subsequence
+
+def naive_prefix_distance(pattern, word):
+    previous = list(range(len(word) + 1))
+    for i, pattern_char in enumerate(pattern, 1):
+        current = [i]
+        for j, word_char in enumerate(word, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (pattern_char != word_char)))
+        previous = current
+    return min(previous)
+
+def naive_match(index, pattern, k=10, max_distance=1):
+    """ Get the k best (word, quality) matches by scoring every word """
+    found = []
+    for word_id, word in enumerate(index.words):
+        if word == pattern or index.counts[word_id] <= 0:
+            continue
+        if word.startswith(pattern):
+            quality = EXACT
+        elif len(pattern) >= MIN_TYPO_LENGTH and naive_prefix_distance(pattern, word) <= max_distance:
+            quality = TYPO
+        elif word[0] == pattern[0] and is_subsequence(pattern, word):
+            quality = SUBSEQUENCE
+        else:
+            continue
+        found.append(((index.score(word_id, quality), word), word, quality))
+    found.sort(reverse=True)
+    return [(word, quality) for key, word, quality in found[:k]]
+
+def random_word(rng):
+    length = rng.randint(3, 14)
+    return ''.join(rng.choice(string.ascii_lowercase[:20]) for _ in range(length))
+
+def make_query(rng, words):
+    word = rng.choice(words)
+    pattern = word[:rng.randint(3, min(8, len(word)))]
+    if rng.random() < 0.5:
+        pos = rng.randrange(len(pattern))
+        pattern = pattern[:pos] + rng.choice(string.ascii_lowercase[:20]) + pattern[pos + 1:]
+    return pattern
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+def main(argv):
+    vocabulary_size = int(argv[0]) if len(argv) > 0 else 100000
+    query_count = int(argv[1]) if len(argv) > 1 else 200
+    rng = random.Random(42)
+    words = list(set(random_word(rng) for _ in range(vocabulary_size)))
+    index = FuzzyIndex()
+    start = time.time()
+    for word in words:
+        index.add(word, rng.randint(1, 100))
+    print("vocabulary: %d words, indexed in %.2f s" % (len(words), time.time() - start))
+
+    queries = [make_query(rng, words) for _ in range(query_count)]
+    # the first query merges the new words into the sorted word list, which
+    # only happens once after a document is indexed
+    start = time.perf_counter()
+    index.match(queries[0], k=10)
+    print("first query: %.3f ms" % ((time.perf_counter() - start) * 1000))
+    timings = []
+    for pattern in queries:
+        start = time.perf_counter()
+        index.match(pattern, k=10)
+        timings.append((time.perf_counter() - start) * 1000)
+    print("fuzzy index: mean %.3f ms, p50 %.3f ms, p99 %.3f ms" % (
+        sum(timings) / len(timings), percentile(timings, 0.5), percentile(timings, 0.99)))
+
+    naive_queries = queries[:max(1, query_count // 20)]
+    naive_timings = []
+    mismatches = 0
+    for pattern in naive_queries:
+        start = time.perf_counter()
+        expected = naive_match(index, pattern)
+        naive_timings.append((time.perf_counter() - start) * 1000)
+        if index.match(pattern, k=10) != expected:
+            mismatches += 1
+        # without the cut-off, all matches should be found as well
+        if set(index.match(pattern, k=len(words))) != set(naive_match(index, pattern, k=len(words))):
+            mismatches += 1
+    print("naive scorer: mean %.3f ms over %d queries" % (sum(naive_timings) / len(naive_timings), len(naive_queries)))
+    print("queries with different matches: %d" % mismatches)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
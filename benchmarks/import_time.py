@@ -0,0 +1,94 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Check that importing the gedit 3.8 plugin stays within a time budget.
+
+Runs a fresh interpreter with -X importtime that first imports what gedit
+has already loaded when it loads a plugin (the gi.repository modules), and then
+the plugin module. The plugin's cumulative import time is compared with the
+budget, and the slowest modules it pulled in are listed. The exit status is 1
+when the budget is exceeded.
+
+Usage: python3 benchmarks/import_time.py [--budget MILLISECONDS] [--runs N] [MODULE]
+
+MODULE defaults to intelligent_text_completion. Pass e.g.
+intelligent_text_completion_lib.vocabulary to measure a helper module without
+gedit being installed.
+"""
+
+import os
+import subprocess
+import sys
+
+PLUGIN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gedit3-8')
+DEFAULT_MODULE = 'intelligent_text_completion'
+DEFAULT_BUDGET_MS = 20.0
+
+# modules that gedit has imported before it loads the plugin
+PRELOAD = "from gi.repository import Gtk, Gdk, GLib, GObject, Gedit, GtkSource, PeasGtk, Gio"
+
+def parse_importtime(output):
+    """ Get [(name, self us, cumulative us)] from -X importtime output """
+    result = []
+    for line in output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        result.append((name.strip(), int(self_us), int(cumulative_us)))
+    return result
+
+def measure(module):
+    """ Get the importtime entries of importing module after the preload """
+    preload = PRELOAD if module == DEFAULT_MODULE else ""
+    code = "%s\nimport sys; sys.stderr.write('-- measure --\\n')\nimport %s" % (preload, module)
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=PLUGIN_DIR, stderr=subprocess.PIPE, universal_newlines=True,
+    )
+    if process.returncode != 0:
+        sys.stderr.write(process.stderr)
+        raise SystemExit("importing %s failed" % module)
+    return parse_importtime(process.stderr.split('-- measure --\n', 1)[1])
+
+def main(argv):
+    budget_ms = DEFAULT_BUDGET_MS
+    runs = 5
+    module = DEFAULT_MODULE
+    args = list(argv)
+    while args:
+        arg = args.pop(0)
+        if arg == '--budget':
+            budget_ms = float(args.pop(0))
+        elif arg == '--runs':
+            runs = int(args.pop(0))
+        else:
+            module = arg
+
+    best = None
+    for _ in range(runs):
+        entries = measure(module)
+        total = [cumulative for name, self_us, cumulative in entries if name == module][0]
+        if best is None or total < best[0]:
+            best = (total, entries)
+    total, entries = best
+
+    print("slowest modules imported by %s:" % module)
+    for name, self_us, cumulative in sorted(entries, key=lambda entry: -entry[1])[:10]:
+        print("  %8.2f ms  %s" % (self_us / 1000.0, name))
+    print("import of %s: %.2f ms (budget %.2f ms, best of %d)" % (module, total / 1000.0, budget_ms, runs))
+    if total / 1000.0 > budget_ms:
+        print("over budget")
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,99 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Benchmark of the memory taken by the tag index.
+
+Indexes a generated XML document with N tags (a tree of a few hundred
+distinct element names) with TagIndex, and builds the naive alternative, a
+list of (start, end, kind, name) tuples, from the same tags. Both are measured
+with tracemalloc, along with the time to build them and to find the open tags
+at random offsets.
+
+Usage: python3 benchmarks/tag_index_memory.py [MILLIONS_OF_TAGS]
+"""
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'gedit3-8'))
+
+from intelligent_text_completion_lib.xmltags import TagIndex, TAG_RE, classify_tag
+
+NAMES = ['element%d' % i for i in range(300)]
+LOOKUPS = 100
+
+def generate_document(tag_count, rng):
+    parts = []
+    stack = []
+    count = 0
+    while count < tag_count:
+        if stack and (len(stack) > 8 or rng.random() < 0.45):
+            parts.append('</%s>\n' % stack.pop())
+        elif rng.random() < 0.1:
+            parts.append('<%s attribute="%d"/>\n' % (rng.choice(NAMES), count))
+        else:
+            name = rng.choice(NAMES)
+            stack.append(name)
+            parts.append('<%s id="%d">text ' % (name, count))
+        count += 1
+    return ''.join(parts)
+
+def build_tuples(document):
+    tags = []
+    for m in TAG_RE.finditer(document):
+        kind, name = classify_tag(m.group())
+        tags.append((m.start(), m.end(), kind, name))
+    return tags
+
+def build_index(document):
+    index = TagIndex()
+    index.scan(document, 0)
+    return index
+
+def measure(callback):
+    """ Get (result, seconds, bytes allocated) of callback() """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = callback()
+    elapsed = time.perf_counter() - start
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, size
+
+def main(argv):
+    millions = float(argv[0]) if argv else 1.0
+    tag_count = int(millions * 1000000)
+    rng = random.Random(1)
+    document = generate_document(tag_count, rng)
+    print("%d tags, %.1f MB of text" % (tag_count, len(document) / 1048576.0))
+
+    tuples, tuples_seconds, tuples_bytes = measure(lambda: build_tuples(document))
+    del tuples
+    index, index_seconds, index_bytes = measure(lambda: build_index(document))
+    offsets = [rng.randint(0, len(document)) for _ in range(LOOKUPS)]
+    start = time.perf_counter()
+    for offset in offsets:
+        index.unclosed_before(offset, limit=1)
+    lookup_ms = (time.perf_counter() - start) * 1000 / LOOKUPS
+
+    print("%-16s %14s %14s %10s" % ("", "bytes per tag", "MB per 1M tags", "build s"))
+    for label, seconds, size in [("list of tuples", tuples_seconds, tuples_bytes),
+                                 ("TagIndex", index_seconds, index_bytes)]:
+        print("%-16s %14.1f %14.1f %10.2f" % (label, size / float(tag_count),
+                                              size / float(tag_count) / 1.048576, seconds))
+    print("open tags at a random offset: %.3f ms" % lookup_ms)
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
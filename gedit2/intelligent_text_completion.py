@@ -16,7 +16,6 @@ import gtk
 import pango
 import re
 import traceback
-import gconf
 
 class IntelligentTextCompletionPlugin(gedit.Plugin):
 
@@ -365,11 +364,17 @@ class Options(gobject.GObject):
         self.detectLists = True
         self.autoindentAfterFunctionOrList = True
     
-        # create gconf directory if not set yet
+        # watch the gconf directory and read all of its keys at once (gconf
+        # is only imported once the options are needed, to keep loading the
+        # plugin fast)
+        import gconf
         client = gconf.client_get_default()        
-        if not client.dir_exists(self.__gconfDir):
-            client.add_dir(self.__gconfDir,gconf.CLIENT_PRELOAD_NONE)
-        
+        client.add_dir(self.__gconfDir,gconf.CLIENT_PRELOAD_ONELEVEL)
+        client.notify_add(self.__gconfDir, self._on_gconf_changed)
+        self._reload_id = None
+        self._load_options(client)
+
+    def _load_options(self, client):
         if client.dir_exists(self.__gconfDir+"/closeBracketsAndQuotes"):
             # get the gconf keys, or stay with default if key not set
             try:
@@ -379,13 +384,17 @@ class Options(gobject.GObject):
                 self.autoindentAfterFunctionOrList = client.get_bool(self.__gconfDir+"/autoindentAfterFunctionOrList")
             except Exception, e: # catch, just in case
                 print e
-    def __del__(self):
-        # write changes to gconf
-        client = gconf.client_get_default()
-        client.set_bool(self.__gconfDir+"/closeBracketsAndQuotes", self.closeBracketsAndQuotes)
-        client.set_bool(self.__gconfDir+"/completeXML", self.completeXML)
-        client.set_bool(self.__gconfDir+"/detectLists", self.detectLists)
-        client.set_bool(self.__gconfDir+"/autoindentAfterFunctionOrList", self.autoindentAfterFunctionOrList)
+
+    def _on_gconf_changed(self, client, connection_id, entry, *args):
+        # the OK button writes every key, read them again once they are all in
+        if self._reload_id is None:
+            self._reload_id = gobject.idle_add(self._on_idle_reload, client)
+
+    def _on_idle_reload(self, client):
+        self._reload_id = None
+        self._load_options(client)
+        self.emit("options-changed")
+        return False
 
     def create_configure_dialog(self):
         win = gtk.Window()
@@ -447,6 +456,7 @@ class Options(gobject.GObject):
             self.autoindentAfterFunctionOrList = autoindentAfterFunctionOrList.get_active()
                 
             # write changes to gconf
+            import gconf
             client = gconf.client_get_default()
 
             client.set_bool(self.__gconfDir+"/closeBracketsAndQuotes", self.closeBracketsAndQuotes)
@@ -13,7 +13,6 @@
 from gi.repository import Gtk, GObject, Gedit, PeasGtk
 import re
 import traceback
-import gconf
 
 class IntelligentTextCompletionPlugin(GObject.Object, Gedit.WindowActivatable, PeasGtk.Configurable):
     window = GObject.property(type=Gedit.Window)
@@ -63,6 +62,8 @@ class IntelligentTextCompletionPlugin(GObject.Object, Gedit.WindowActivatable, P
             for handler_id in getattr(widget, 'intelligent_text_completion_id', []):
                 widget.disconnect(handler_id)
             widget.intelligent_text_completion_id = None
+        if IntelligentTextCompletionOptions.singleton is not None:
+            IntelligentTextCompletionOptions.singleton.flush()
 
     def _on_view_key_press_event(self, view, event, window):
         doc = window.get_active_document()
@@ -355,19 +356,29 @@ class IntelligentTextCompletionOptions(object):
     _completeXMLButton = None
     _detectListsButton = None
     _autoindentAfterFunctionOrListButton = None
+    # set while the buttons are updated to options changed elsewhere
+    _updating_buttons = False
 
     ## configuration client
     _GCONF_SETTINGS_DIR = "/apps/gedit-3/plugins/intelligent_text_completion"
     _gconf_client = None
+    # changed options are written this long after the last change
+    _SAVE_DELAY_MS = 500
+    _unsaved_settings = None
+    _save_id = None
 
     ## static singleton reference
     singleton = None
 
     def __init__(self):
-        # create gconf directory if not set yet
+        # watch the gconf directory and read all of its keys at once (gconf
+        # is only imported once the options are needed, to keep loading the
+        # plugin fast)
+        import gconf
         self._gconf_client = gconf.client_get_default()
-        if not self._gconf_client.dir_exists(self._GCONF_SETTINGS_DIR):
-            self._gconf_client.add_dir(self._GCONF_SETTINGS_DIR, gconf.CLIENT_PRELOAD_NONE)
+        self._gconf_client.add_dir(self._GCONF_SETTINGS_DIR, gconf.CLIENT_PRELOAD_ONELEVEL)
+        self._gconf_client.notify_add(self._GCONF_SETTINGS_DIR, self._on_gconf_changed)
+        self._unsaved_settings = {}
 
         # load settings
         self.closeBracketsAndQuotes = self._load_setting("closeBracketsAndQuotes")
@@ -421,6 +432,8 @@ class IntelligentTextCompletionOptions(object):
         return check_button
 
     def _on_check_button_toggled(self, *args):
+        if self._updating_buttons:
+            return
         # set class attributes
         self.closeBracketsAndQuotes = self._closeBracketsAndQuotesButton.get_active()
         self.completeXML = self._completeXMLButton.get_active()
@@ -433,8 +446,43 @@ class IntelligentTextCompletionOptions(object):
         self._save_setting("detectLists", self.detectLists)
         self._save_setting("autoindentAfterFunctionOrList", self.autoindentAfterFunctionOrList)
 
+    def _on_gconf_changed(self, client, connection_id, entry, *args):
+        # take over options that were changed outside of this dialog
+        setting_name = entry.get_key().rsplit("/", 1)[-1]
+        if not hasattr(self, setting_name) or entry.get_value() is None:
+            return
+        setattr(self, setting_name, entry.get_value().get_bool())
+        if self._closeBracketsAndQuotesButton is None:
+            return
+        self._updating_buttons = True
+        try:
+            self._closeBracketsAndQuotesButton.set_active(self.closeBracketsAndQuotes)
+            self._completeXMLButton.set_active(self.completeXML)
+            self._detectListsButton.set_active(self.detectLists)
+            self._autoindentAfterFunctionOrListButton.set_active(self.autoindentAfterFunctionOrList)
+        finally:
+            self._updating_buttons = False
+
     def _save_setting(self, setting_name, value):
-        self._gconf_client.set_bool("{}/{}".format(self._GCONF_SETTINGS_DIR, setting_name), value)
+        # changes are written together once the options stop changing
+        self._unsaved_settings[setting_name] = value
+        if self._save_id is not None:
+            GObject.source_remove(self._save_id)
+        self._save_id = GObject.timeout_add(self._SAVE_DELAY_MS, self._on_save_timeout)
+
+    def _on_save_timeout(self):
+        self._save_id = None
+        for setting_name, value in self._unsaved_settings.items():
+            if self._load_setting(setting_name) != value:
+                self._gconf_client.set_bool("{}/{}".format(self._GCONF_SETTINGS_DIR, setting_name), value)
+        self._unsaved_settings = {}
+        return False
+
+    def flush(self):
+        """ Write the changed options now """
+        if self._save_id is not None:
+            GObject.source_remove(self._save_id)
+            self._on_save_timeout()
 
     def _load_setting(self, setting_name):
         try:
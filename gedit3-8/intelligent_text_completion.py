@@ -10,16 +10,63 @@
 # FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
 # details.
 
-from gi.repository import Gtk, GObject, Gedit, PeasGtk, Gio
+from gi.repository import Gtk, Gdk, GLib, GObject, Gedit, GtkSource, PeasGtk, Gio
 import re
 import traceback
+# the helper modules in intelligent_text_completion_lib are imported where a
+# feature is first used, so loading the plugin doesn't compile the regexes
+# of every feature. Once imported, an import statement is a lookup in
+# sys.modules (about 1 us).
+
+_cache_budget = None
+_key_event_recorder = None
+
+def get_cache_budget():
+    """ Get the memory budget for the caches of the documents of all windows """
+    global _cache_budget
+    if _cache_budget is None:
+        from intelligent_text_completion_lib.cachebudget import CacheBudget
+        _cache_budget = CacheBudget()
+    return _cache_budget
+
+def get_key_event_recorder():
+    """ Get the recorder of the slowest key presses, which are recorded when
+    profiling is turned on in the options """
+    global _key_event_recorder
+    if _key_event_recorder is None:
+        from intelligent_text_completion_lib.profiler import SlowEventRecorder
+        _key_event_recorder = SlowEventRecorder()
+    return _key_event_recorder
+
+# menu items of the plugin
+UI_XML = """<ui>
+  <menubar name="MenuBar">
+    <menu name="EditMenu" action="Edit">
+      <placeholder name="EditOps_6">
+        <menuitem name="IntelligentTextCompletionCloseAllTags" action="IntelligentTextCompletionCloseAllTags"/>
+      </placeholder>
+    </menu>
+  </menubar>
+</ui>"""
 
 class IntelligentTextCompletionPlugin(GObject.Object, Gedit.WindowActivatable, PeasGtk.Configurable):
     window = GObject.property(type=Gedit.Window)
 
     def __init__(self):
+        from intelligent_text_completion_lib.words import WordIndex
+        from intelligent_text_completion_lib.ngrams import NgramModel
+        from intelligent_text_completion_lib.vocabulary import Vocabulary, default_vocabulary_path
         GObject.Object.__init__(self)
         self._instances = {}
+        self._snippets = None
+        self._snippet_keyval = None
+        self._words = WordIndex()
+        self._ngrams = NgramModel()
+        self._word_provider = None
+        self._vocabulary = Vocabulary(default_vocabulary_path())
+        self._vocabulary_flush_id = None
+        self._action_group = None
+        self._ui_id = None
 
     def do_create_configure_widget(self):
         return IntelligentTextCompletionOptions.get_instance().create_configure_dialog()
@@ -27,18 +74,140 @@ class IntelligentTextCompletionPlugin(GObject.Object, Gedit.WindowActivatable, P
     def _connect_view(self, view, window):
         """Connect to view's editing signals."""
         callback = self._on_view_key_press_event
-        id = view.connect("key-press-event", callback, window)
-        view.intelligent_text_completion_id = id
+        id_1 = view.connect("key-press-event", callback, window)
+        callback = self._on_view_paste_clipboard
+        id_2 = view.connect("paste-clipboard", callback)
+        view.intelligent_text_completion_id = (id_1, id_2)
+        # index the words of the document and offer them as completions
+        self._get_document_state(view.get_buffer())
+        if self._word_provider is None:
+            self._word_provider = WordCompletionProvider(self._words, self._vocabulary, self._ngrams)
+        view.get_completion().add_provider(self._word_provider)
 
-    def _on_window_tab_added(self, window, tab):
-        """Connect to signals of the document and view in tab."""
+    def _connect_tab(self, tab, window):
+        """Connect to signals of the document and view in tab, if not done yet."""
         view = tab.get_view()
         handler_id = getattr(view, 'intelligent_text_completion_id', None)
         if handler_id is None:
             self._connect_view(view, window)
 
+    def _activate_tab(self, tab, window):
+        """Connect to the tab and make room for its caches."""
+        self._connect_tab(tab, window)
+        doc = tab.get_document()
+        cache_budget = get_cache_budget()
+        cache_budget.touch(doc, self._get_document_state(doc))
+        cache_budget.set_budget_mb(IntelligentTextCompletionOptions.get_instance().cacheBudget)
+        cache_budget.enforce()
+
+    def _on_window_tab_added(self, window, tab):
+        """Connect to the tab if it is opened in the foreground."""
+        if tab is window.get_active_tab():
+            self._activate_tab(tab, window)
+
+    def _on_window_active_tab_changed(self, window, tab):
+        """Connect to the tab the first time it becomes active.
+
+        Tabs in the background can't receive key presses, so views are only
+        hooked up (and their documents indexed) once they are shown. This
+        keeps restoring a session with many tabs fast.
+        """
+        self._activate_tab(tab, window)
+
     def _on_window_tab_removed(self, window, tab):
-        pass
+        """Forget the state kept for the document in tab."""
+        doc = tab.get_document()
+        if doc in self._instances:
+            for handler_id in getattr(doc, 'intelligent_text_completion_id', None) or []:
+                doc.disconnect(handler_id)
+            doc.intelligent_text_completion_id = None
+            state = self._instances.pop(doc)
+            get_cache_budget().remove(doc)
+            self._learn_words(state)
+            state.clear()
+            if self._vocabulary_flush_id is None:
+                self._vocabulary_flush_id = GLib.idle_add(self._on_idle_flush_vocabulary)
+
+    def _learn_words(self, state):
+        """Add the words of a document to the user's vocabulary."""
+        if not IntelligentTextCompletionOptions.get_instance().completeWords:
+            return
+        for word, count in state.words.counts.items():
+            self._vocabulary.add(word, count)
+
+    def _on_idle_flush_vocabulary(self):
+        self._vocabulary_flush_id = None
+        # merging a large vocabulary takes a while, keep it off the main loop
+        self._vocabulary.flush_in_background()
+        return False
+
+    def _get_document_state(self, doc):
+        """Get the plugin state of doc, creating it on first use."""
+        state = self._instances.get(doc)
+        if state is None:
+            state = DocumentState(doc, self._words, self._ngrams)
+            self._instances[doc] = state
+            handler_ids = [
+                doc.connect("insert-text", self._on_document_insert_text),
+                doc.connect_after("insert-text", self._on_document_insert_text_after),
+                doc.connect("delete-range", self._on_document_delete_range),
+                doc.connect_after("delete-range", self._on_document_delete_range_after),
+                doc.connect("notify::language", self._on_document_language_changed),
+            ]
+            # only a Gedit.Document is loaded from a file, not a plain buffer
+            if GObject.signal_lookup("loaded", type(doc)):
+                handler_ids.append(doc.connect("loaded", self._on_document_loaded))
+            doc.intelligent_text_completion_id = tuple(handler_ids)
+        return state
+
+    def _on_document_loaded(self, doc, *args):
+        """Detect the indentation style of the loaded file."""
+        state = self._instances.get(doc)
+        if state is not None:
+            state.indentation_dirty = True
+
+    def _on_document_language_changed(self, doc, *args):
+        """Switch to the rules of the new language."""
+        state = self._instances.get(doc)
+        if state is not None:
+            state.update_rules()
+
+    def _on_document_insert_text(self, doc, location, text, length):
+        """Remove the words of the line that is about to change from the index."""
+        state = self._instances.get(doc)
+        if state is not None:
+            line = location.get_line()
+            state.unindex_lines(line, line)
+            if state.tag_index is not None:
+                state.tag_index.forget(location.get_offset())
+            state.changed_line = line
+            # only indentation in another style can change the detected style
+            from intelligent_text_completion_lib.indentation import whitespace_conflicts
+            if not state.indentation_dirty and whitespace_conflicts(text, state.indentation):
+                if '\n' in text or '\r' in text or location.starts_line() or text.isspace():
+                    state.indentation_dirty = True
+
+    def _on_document_insert_text_after(self, doc, location, text, length):
+        """Add the words of the changed lines to the index."""
+        state = self._instances.get(doc)
+        if state is not None:
+            state.index_lines(state.changed_line, location.get_line())
+
+    def _on_document_delete_range(self, doc, start, end):
+        """Drop the closers and indexed words that are about to be deleted."""
+        state = self._instances.get(doc)
+        if state is not None:
+            state.forget_closers(start, end)
+            state.unindex_lines(start.get_line(), end.get_line())
+            if state.tag_index is not None:
+                state.tag_index.forget(start.get_offset())
+
+    def _on_document_delete_range_after(self, doc, start, end):
+        """Add the words of the joined line to the index."""
+        state = self._instances.get(doc)
+        if state is not None:
+            line = start.get_line()
+            state.index_lines(line, line)
 
     def do_activate(self):
         """Activate plugin."""
@@ -47,30 +216,120 @@ class IntelligentTextCompletionPlugin(GObject.Object, Gedit.WindowActivatable, P
         id_1 = window.connect("tab-added", callback)
         callback = self._on_window_tab_removed
         id_2 = window.connect("tab-removed", callback)
-        window.intelligent_text_completion_id = (id_1, id_2)
-        views = window.get_views()
-        for view in views:
-            self._connect_view(view, window)
+        callback = self._on_window_active_tab_changed
+        id_3 = window.connect("active-tab-changed", callback)
+        window.intelligent_text_completion_id = (id_1, id_2, id_3)
+        cache_budget = get_cache_budget()
+        cache_budget.add_shared(self._words)
+        cache_budget.add_shared(self._ngrams)
+        tab = window.get_active_tab()
+        if tab is not None:
+            self._activate_tab(tab, window)
+        self._add_menu_items(window)
+
+    def _add_menu_items(self, window):
+        """Add the actions of the plugin to the Edit menu."""
+        self._action_group = Gtk.ActionGroup("IntelligentTextCompletionActions")
+        self._action_group.add_actions([
+            ("IntelligentTextCompletionCloseAllTags", None, "Close All Open _Tags", "<Primary><Alt>slash",
+             "Insert the end tags of all elements that are open at the cursor", self._on_close_all_tags_activate),
+        ])
+        manager = window.get_ui_manager()
+        manager.insert_action_group(self._action_group, -1)
+        self._ui_id = manager.add_ui_from_string(UI_XML)
+
+    def do_update_state(self):
+        """Only allow the actions on a document that can be edited."""
+        view = self.window.get_active_view()
+        if self._action_group is not None:
+            self._action_group.set_sensitive(view is not None and view.get_editable())
 
     def do_deactivate(self):
         """Deactivate plugin."""
         window = self.window
+        cache_budget = get_cache_budget()
+        cache_budget.remove_shared(self._words)
+        cache_budget.remove_shared(self._ngrams)
+        manager = window.get_ui_manager()
+        manager.remove_ui(self._ui_id)
+        manager.remove_action_group(self._action_group)
+        manager.ensure_update()
+        self._action_group = None
+        self._ui_id = None
         widgets = [window]
         widgets.extend(window.get_views())
         widgets.extend(window.get_documents())
+        for view in window.get_views():
+            if getattr(view, 'intelligent_text_completion_id', None) and self._word_provider is not None:
+                view.get_completion().remove_provider(self._word_provider)
+        self._word_provider = None
         for widget in widgets:
-            for handler_id in getattr(widget, 'intelligent_text_completion_id', []):
+            for handler_id in getattr(widget, 'intelligent_text_completion_id', None) or []:
                 widget.disconnect(handler_id)
             widget.intelligent_text_completion_id = None
+        for doc, state in self._instances.items():
+            get_cache_budget().remove(doc)
+            self._learn_words(state)
+            state.clear()
+        self._instances = {}
+        if self._vocabulary_flush_id is not None:
+            GLib.source_remove(self._vocabulary_flush_id)
+            self._vocabulary_flush_id = None
+        # don't hold up closing the window while a large vocabulary is merged
+        self._vocabulary.flush_in_background()
+        self._vocabulary.close()
+        if IntelligentTextCompletionOptions.singleton is not None:
+            IntelligentTextCompletionOptions.singleton.flush()
+
+    def _get_snippet_store(self):
+        """Get the user's snippets, reloading them if the file changed."""
+        if self._snippets is None:
+            from intelligent_text_completion_lib.snippets import SnippetStore, default_snippets_path
+            self._snippets = SnippetStore(default_snippets_path())
+        if self._snippets.maybe_reload():
+            self._snippet_keyval = Gdk.keyval_from_name(self._snippets.key_name)
+        return self._snippets
 
     def _on_view_key_press_event(self, view, event, window):
         doc = window.get_active_document()
+        token = None
+        if IntelligentTextCompletionOptions.get_instance().profileKeyEvents:
+            token = get_key_event_recorder().start()
         try:
             return self._handle_event(view, event, window)
         except:
             err = "Exception\n"
             err += traceback.format_exc()
             doc.set_text(err)
+        finally:
+            if token is not None:
+                get_key_event_recorder().stop(token, lambda: get_key_event_context(doc, event))
+
+    def _on_view_paste_clipboard(self, view):
+        """Paste text of several lines re-indented to the current line."""
+        options = IntelligentTextCompletionOptions.get_instance()
+        if not options.reindentPastedText or not view.get_editable():
+            return
+        from intelligent_text_completion_lib.blocks import LINE_BREAK_RE
+        from intelligent_text_completion_lib.indentation import reindent_text
+        text = view.get_clipboard(Gdk.SELECTION_CLIPBOARD).wait_for_text()
+        if not text or not LINE_BREAK_RE.search(text):
+            return
+        doc = view.get_buffer()
+        state = self._get_document_state(doc)
+        tab_string = get_tab_string(view, state.get_indentation())
+        doc.begin_user_action()
+        try:
+            doc.delete_selection(True, True)
+            cursor = doc.get_iter_at_mark(doc.get_insert())
+            line_start = cursor.copy()
+            line_start.set_line_offset(0)
+            preceding_line = doc.get_text(line_start, cursor, False)
+            doc.insert(cursor, reindent_text(text, preceding_line, tab_string, view.get_tab_width()))
+        finally:
+            doc.end_user_action()
+        view.stop_emission_by_name("paste-clipboard")
+        view.scroll_mark_onscreen(doc.get_insert())
 
     ############ plugin core functions ############
     def _handle_event(self, view, event, window):
@@ -113,6 +372,10 @@ class IntelligentTextCompletionPlugin(GObject.Object, Gedit.WindowActivatable, P
             whitespace_pos += 1
         # get options
         options = IntelligentTextCompletionOptions.get_instance()
+        # get closers that were inserted by this plugin
+        state = self._get_document_state(doc)
+        # get the rules for the language of the document
+        rules = state.rules
 
         # Do not complete text after pasting text.
         if len(typed_string) > 1:
@@ -148,12 +411,43 @@ class IntelligentTextCompletionPlugin(GObject.Object, Gedit.WindowActivatable, P
                         # add close char
                         doc.insert_at_cursor(close)
                         return True
+            # indent, dedent or prefix every line of a selection of lines
+            if bounds[0].get_line() != bounds[1].get_line():
+                from intelligent_text_completion_lib import selections
+                tab_string = get_tab_string(view, state.get_indentation())
+                if event.keyval == 65289: # tab
+                    return self._edit_selected_lines(doc, bounds, lambda text: selections.indent_text(text, tab_string))
+                if event.keyval == 65056: # shift-tab
+                    return self._edit_selected_lines(doc, bounds, lambda text: selections.dedent_text(text, tab_string))
+                if typed_char in rules.line_prefixes:
+                    prefix = rules.line_prefixes[typed_char]
+                    return self._edit_selected_lines(doc, bounds, lambda text: selections.prefix_text(text, prefix))
             return False
 
+        ################### expand snippets ###################
+        if options.expandSnippets:
+            snippets = self._get_snippet_store()
+            if event.keyval == self._snippet_keyval:
+                snippet = snippets.lookup(preceding_line)
+                if snippet:
+                    trigger, template = snippet
+                    start = cursor.copy()
+                    start.set_line_offset(len(preceding_line) - len(trigger))
+                    doc.delete(start, cursor)
+                    from intelligent_text_completion_lib.snippets import expand_snippet
+                    middle, end = expand_snippet(template, whitespace, get_tab_string(view, state.get_indentation()))
+                    return self._insert_at_cursor(middle, end)
+
+        ################### align tables ###################
+        if options.alignTables and 'tables' in rules:
+            if typed_char == '|' or event.keyval == 65289: # tab
+                if preceding_line.lstrip(' \t').startswith('|'):
+                    return self._align_table(doc, state, typed_char == '|')
+
         ################### auto-close brackets and quotes ###################
         if options.closeBracketsAndQuotes and prev_char != '\\':
             """ detect python comments """
-            if typed_char == '"' and re.search('^[^"]*""$', preceding_line) and cursor.ends_line():
+            if typed_char == '"' and 'python_docstring' in rules and re.search('^[^"]*""$', preceding_line) and cursor.ends_line():
                 return self._insert_at_cursor(typed_char + ' ', ' """')
 
             for check_char, add_char in open_close.items():
@@ -161,18 +455,8 @@ class IntelligentTextCompletionPlugin(GObject.Object, Gedit.WindowActivatable, P
                 # is auto-generated, remove the auto generated char
                 if typed_char == add_char:
                     if not cursor.ends_line():
-                        if next_char == add_char:
-                            if check_char != add_char:
-                                # don't remove ) when it's probably not auto-generated
-                                preceding_check_chars = len(re.findall('\%s' % check_char, preceding_line))
-                                preceding_add_chars = len(re.findall('\%s' % add_char, preceding_line))
-                                following_check_chars = len(re.findall('\%s' % check_char, line_after))
-                                following_add_chars = len(re.findall('\%s' % add_char, line_after))
-                                if preceding_check_chars - preceding_add_chars > following_add_chars:
-                                    continue
-                                # don't remove ) when the line becomes complex
-                                if following_check_chars > 0:
-                                    continue
+                        # only remove ) when it was auto-generated
+                        if next_char == add_char and state.pop_closer(cursor):
                             doc.delete(cursor, next_char_pos)
                             return False
                 # typed_char equals char we're looking for
@@ -204,16 +488,14 @@ class IntelligentTextCompletionPlugin(GObject.Object, Gedit.WindowActivatable, P
                     return self._insert_at_cursor(typed_char, add_char)
                 # check backspace
                 if event.keyval == 65288: # backspace
-                    if prev_char == check_char and next_char == add_char:
+                    if prev_char == check_char and next_char == add_char and state.pop_closer(cursor):
                         doc.delete(cursor, next_char_pos)
 
         ################### auto-complete XML tags ###################
-        if options.completeXML:
+        if options.completeXML and 'xml_tags' in rules:
             if prev_char == "<" and typed_char == "/":
-                start = doc.get_start_iter()
-                preceding_document = doc.get_text(start, cursor, False)
                 # analyse previous XML code
-                closing_tag = get_closing_xml_tag(preceding_document)
+                closing_tag = state.get_closing_xml_tag(cursor, 'html_elements' in rules)
                 # insert code
                 if closing_tag:
                     return self._insert_at_cursor(typed_char + closing_tag + ">")
@@ -221,7 +503,7 @@ class IntelligentTextCompletionPlugin(GObject.Object, Gedit.WindowActivatable, P
                     return False # do nothing
 
         ################### auto-complete django tags ###################
-        if options.completeXML: # TODO: make separate setting for this
+        if options.completeXML and 'django_tags' in rules: # TODO: make separate setting for this
             if typed_char == "{":
                 # The normal opening and closing paradigm does not autocomplete
                 # for instance <a href="{{ url }}"> becase {{ url }} is inside
@@ -240,71 +522,248 @@ class IntelligentTextCompletionPlugin(GObject.Object, Gedit.WindowActivatable, P
                 doc.place_cursor(cursor)
                 return True
 
+        ################### line triggers ###################
+        # all list bullets, comment openers and indent triggers of the line
+        line_triggers = {}
+        if event.keyval == 65293: # return
+            for kind, value in rules.return_triggers.match(preceding_line, whitespace_pos):
+                line_triggers[kind] = value
+
         ################### detect lists ###################
         if options.detectLists:
-            if event.keyval == 65293: # return
-                # constants
-                list_bullets = ['* ', '- ', '$ ', '> ', '+ ', '~ ']
-                # cycle through all bullets
-                for bullet in list_bullets:
-                    if len(preceding_line) >= whitespace_pos + len(bullet):
-                        if preceding_line[whitespace_pos:whitespace_pos + len(bullet)] == bullet:
-                            # endlist function by double enter
-                            if preceding_line == whitespace + bullet and bullet != '* ':
-                                start = cursor.copy()
-                                start.set_line_offset(len(whitespace))
-                                doc.delete(start, cursor)
-                                return True
-                            return self._insert_at_cursor(typed_char + whitespace + bullet)
+            if event.keyval == 65293 and 'numbered_lists' in rules: # return
+                from intelligent_text_completion_lib.lists import parse_item
+                if parse_item(preceding_line) is not None:
+                    return self._continue_numbered_list(doc, state, cursor, typed_char, preceding_line, line_after)
+            if 'list' in line_triggers:
+                bullet = line_triggers['list']
+                # endlist function by double enter
+                if preceding_line == whitespace + bullet and bullet != '* ':
+                    start = cursor.copy()
+                    start.set_line_offset(len(whitespace))
+                    doc.delete(start, cursor)
+                    return True
+                return self._insert_at_cursor(typed_char + whitespace + bullet)
 
         ################### detect java-like comment ###################
-        if event.keyval == 65293: # return
-            # constants
-            comments = {
-                '/**' : (' * ', ' */'),
-                '/*'  : (' * ', ' */'),
-            }
-            # cycle through all types of comment
-            for comment_start, (comment_middle, comment_end) in comments.items():
-                if preceding_line[whitespace_pos:] == comment_start:
-                    add_middle = typed_char + whitespace + comment_middle
-                    add_end = typed_char + whitespace + comment_end
-                    return self._insert_at_cursor(add_middle, add_end)
+        if 'comment' in line_triggers:
+            comment_middle, comment_end = line_triggers['comment']
+            add_middle = typed_char + whitespace + comment_middle
+            add_end = typed_char + whitespace + comment_end
+            if 'block_comments' in rules:
+                from intelligent_text_completion_lib.comments import CLOSER
+                # don't add */ when the comment will be closed by a */ below
+                if state.get_comment_index().next_token(cursor.get_line() + 1) == CLOSER:
+                    return self._insert_at_cursor(add_middle)
+            return self._insert_at_cursor(add_middle, add_end)
+        if event.keyval == 65293 and 'block_comments' in rules: # return
+            # continue a comment on its other lines, like /** text or  * text
+            comment_text = preceding_line[whitespace_pos:]
+            if comment_text.startswith('*') or comment_text.startswith('/*'):
+                from intelligent_text_completion_lib.comments import scan_line
+                inside = state.get_comment_index().inside(cursor.get_line())
+                if scan_line(preceding_line, inside):
+                    if comment_text.startswith('*'):
+                        return self._insert_at_cursor(typed_char + whitespace + '* ')
+                    return self._insert_at_cursor(typed_char + whitespace + ' * ')
 
         ################### auto-indent after function/list ###################
         if options.autoindentAfterFunctionOrList:
-            if event.keyval == 65293: # return
-                indent_triggers = {
-                    '(': ')',
-                    '{': '}',
-                    '[': ']',
-                    ':': '',
-                }
-                for indent_trigger, ending_char in indent_triggers.items():
-                    if prev_char == indent_trigger:
-                        if line_after:
-                            # text between begin and ending brackets should come
-                            # in the middle row
-                            if ending_char != '' and ending_char in line_after:
-                                ending_pos = line_after.find(ending_char)
-                            else:
-                                ending_pos = len(line_after)
-                            end = cursor.copy()
-                            end.set_line_offset(end.get_line_offset() + ending_pos)
-                            ending_text = doc.get_text(cursor, end, False).strip()
-                            doc.delete(cursor, end)
-
-                            add_middle = typed_char + whitespace + get_tab_string(view)
-                            add_end = ending_text + typed_char + whitespace
-                        else:
-                            add_middle = typed_char + whitespace + get_tab_string(view)
-                            add_end = ""
-                        return self._insert_at_cursor(add_middle, add_end)
-            if typed_char == '}':
+            if 'indent' in line_triggers:
+                ending_char = line_triggers['indent']
+                if line_after:
+                    # text between begin and ending brackets should come
+                    # in the middle row
+                    if ending_char != '' and ending_char in line_after:
+                        ending_pos = line_after.find(ending_char)
+                    else:
+                        ending_pos = len(line_after)
+                    end = cursor.copy()
+                    end.set_line_offset(end.get_line_offset() + ending_pos)
+                    ending_text = doc.get_text(cursor, end, False).strip()
+                    doc.delete(cursor, end)
+
+                    add_middle = typed_char + whitespace + get_tab_string(view, state.get_indentation())
+                    add_end = ending_text + typed_char + whitespace
+                else:
+                    add_middle = typed_char + whitespace + get_tab_string(view, state.get_indentation())
+                    add_end = ""
+                return self._insert_at_cursor(add_middle, add_end)
+            if event.keyval == 65293 and not line_after.strip(): # return
+                # align with the first argument after an open bracket
+                column = get_hanging_indent_column(preceding_line) if 'hanging_indent' in rules else None
+                if column is not None:
+                    alignment = whitespace + " " * (column - len(whitespace))
+                    return self._insert_at_cursor(typed_char + alignment)
+                # dedent after a statement that ends a python block
+                words = preceding_line.split(None, 1)
+                if words and words[0] in DEDENT_KEYWORDS and whitespace and 'python_dedent' in rules:
+                    from intelligent_text_completion_lib.selections import dedent_whitespace
+                    tab_string = get_tab_string(view, state.get_indentation())
+                    return self._insert_at_cursor(typed_char + dedent_whitespace(whitespace, tab_string))
+            if typed_char == '}' and 'brace_dedent' in rules:
                 if preceding_line and preceding_line.isspace():
+                    from intelligent_text_completion_lib.lineindex import BRACES
+                    # indent like the line with the matching {
+                    opener = state.get_line_index().find_opener(cursor.get_line(), BRACES)
+                    if opener is not None:
+                        return self._reindent_line(doc, cursor, state.get_line_whitespace(opener), "}")
                     whitespace_pos_iter = cursor.copy()
                     whitespace_pos_iter.set_line_offset(whitespace_pos)
                     return self._remove_at_cursor(whitespace_pos_iter) and self._insert_at_cursor("}")
+            if not line_after.strip() and 'keyword_dedent' in rules:
+                # indent end, fi, done and esac like the line that opened the
+                # block, once the character after the keyword is typed
+                from intelligent_text_completion_lib.lineindex import KEYWORDS, completed_closer
+                keyword = completed_closer(preceding_line, typed_char)
+                if keyword is not None:
+                    opener = state.get_line_index().find_opener(cursor.get_line(), KEYWORDS)
+                    if opener is not None and state.get_line_whitespace(opener) != whitespace:
+                        self._reindent_line(doc, cursor, state.get_line_whitespace(opener), keyword)
+                    # the typed character goes after the keyword
+                    return False
+
+    def _continue_numbered_list(self, doc, state, cursor, typed_char, preceding_line, line_after):
+        """Start the next item of a numbered list, or end the list when the
+        item is empty, and renumber the items below."""
+        line = cursor.get_line()
+        block = state.get_list_block(line)
+        if block is None:
+            return False
+        index = block.item_index(line)
+        if block.first_line + block.items[index] != line:
+            return False
+        prefix = block.item_prefix(index)
+        doc.begin_user_action()
+        try:
+            if not preceding_line[len(prefix):].strip() and not line_after.strip():
+                # endlist function by double enter
+                start = cursor.copy()
+                start.set_line_offset(len(block.indent))
+                doc.delete(start, cursor)
+                block.remove_item(index)
+                self._renumber_list(doc, state, block, index)
+                return True
+            self._insert_at_cursor(typed_char + block.item_prefix(index + 1) + " ")
+            block.insert_item(index + 1, line + 1 - block.first_line)
+            self._renumber_list(doc, state, block, index + 2)
+            state.list_blocks.add(block)
+            return True
+        finally:
+            doc.end_user_action()
+
+    def _renumber_list(self, doc, state, block, first_index):
+        """Relabel the items of block from first_index on in a single edit."""
+        if first_index >= len(block.items):
+            return
+        first_line = block.first_line + block.items[first_index]
+        from intelligent_text_completion_lib.lists import renumber_text
+        text = state.get_lines_text(first_line, block.last_line)
+        change = renumber_text(block, text, first_index)
+        if change is None:
+            return
+        first, last, new_text = change
+        start = doc.get_iter_at_line(first_line + first)
+        end = doc.get_iter_at_line(first_line + last)
+        if not end.ends_line():
+            end.forward_to_line_end()
+        doc.delete(start, end)
+        doc.insert(start, new_text)
+
+    def _align_table(self, doc, state, add_pipe):
+        """Type a | or move to the next cell, and pad the cells of the table
+        to the width of their column."""
+        from intelligent_text_completion_lib import tables
+        from intelligent_text_completion_lib.blocks import join_lines
+        doc.begin_user_action()
+        try:
+            if add_pipe:
+                doc.insert_at_cursor("|")
+            cursor = doc.get_iter_at_mark(doc.get_insert())
+            line = cursor.get_line()
+            table = state.get_table(line)
+            if table is None:
+                return add_pipe
+            index = line - table.first_line
+            cell, offset = tables.cell_position(table.rows[index].text, cursor.get_line_offset())
+            if not add_pipe:
+                # tab moves to the next cell
+                cell, offset = cell + 1, 0
+            # rewrite the rows that aren't aligned, from the bottom up so the
+            # line numbers of the other runs stay valid
+            for first, last, lines in reversed(table.align()):
+                start = doc.get_iter_at_line(table.first_line + first)
+                end = doc.get_iter_at_line(table.first_line + last)
+                if not end.ends_line():
+                    end.forward_to_line_end()
+                new_text = join_lines(doc.get_text(start, end, False), lines)
+                doc.delete(start, end)
+                doc.insert(start, new_text)
+            # the table is up to date with the rows that were just written
+            table.dirty.clear()
+            state.tables.add(table)
+            column = tables.cell_column(table.rows[index], table.widths, cell, offset)
+            cursor = doc.get_iter_at_line(line)
+            cursor.set_line_offset(column)
+            doc.place_cursor(cursor)
+            return True
+        finally:
+            doc.end_user_action()
+
+    def _on_close_all_tags_activate(self, action):
+        """Insert the end tags of all open elements in a single edit."""
+        view = self.window.get_active_view()
+        if view is None or not view.get_editable():
+            return
+        doc = view.get_buffer()
+        state = self._get_document_state(doc)
+        cursor = doc.get_iter_at_mark(doc.get_insert())
+        open_tags = state.get_open_xml_tags(cursor, 'html_elements' in state.rules)
+        if not open_tags:
+            return
+        line_start = cursor.copy()
+        line_start.set_line_offset(0)
+        at_line_start = not doc.get_text(line_start, cursor, False).strip()
+        from intelligent_text_completion_lib.xmltags import closing_tags_text
+        text = closing_tags_text(open_tags, cursor.get_line(), at_line_start)
+        doc.begin_user_action()
+        try:
+            if at_line_start:
+                doc.delete(line_start, cursor)
+            doc.insert_at_cursor(text)
+        finally:
+            doc.end_user_action()
+        view.scroll_mark_onscreen(doc.get_insert())
+
+    def _edit_selected_lines(self, doc, bounds, edit):
+        """Replace the selected lines by edit(text) in a single edit and
+        select the new lines."""
+        start, end = bounds
+        start.set_line_offset(0)
+        if end.get_line_offset() == 0:
+            # the line in front of which the selection ends isn't selected
+            end = doc.get_iter_at_line(end.get_line() - 1)
+        if not end.ends_line():
+            end.forward_to_line_end()
+        text = doc.get_text(start, end, False)
+        new_text = edit(text)
+        if new_text != text:
+            first = start.get_offset()
+            doc.begin_user_action()
+            try:
+                doc.delete(start, end)
+                doc.insert(start, new_text)
+            finally:
+                doc.end_user_action()
+            doc.select_range(doc.get_iter_at_offset(first), start)
+        return True
+
+    def _reindent_line(self, doc, cursor, whitespace, text):
+        """Replace the line up to cursor by whitespace + text."""
+        line_start = cursor.copy()
+        line_start.set_line_offset(0)
+        doc.delete(line_start, cursor)
+        return self._insert_at_cursor(whitespace + text)
 
     def _insert_at_cursor(self, middle, end = ""):
         window = self.window
@@ -314,6 +773,9 @@ class IntelligentTextCompletionPlugin(GObject.Object, Gedit.WindowActivatable, P
         cursor = doc.get_iter_at_mark(doc.get_insert())
         cursor.set_offset(cursor.get_offset() - len(end))
         doc.place_cursor(cursor)
+        # remember auto-inserted closers so they can be overwritten later
+        if end in CLOSING_CHARS:
+            self._get_document_state(doc).add_closer(cursor)
         return True
 
     def _remove_at_cursor(self, pos):
@@ -321,9 +783,427 @@ class IntelligentTextCompletionPlugin(GObject.Object, Gedit.WindowActivatable, P
         doc = window.get_active_document()
         return doc.backspace(pos, False, True)
 
+##### document state #####
+
+CLOSING_CHARS = frozenset(['"', "'", ')', '}', ']'])
+# lines whose words and n-grams are counted at a time when idle, about 15 ms
+# of work
+INDEX_CHUNK_LINES = 500
+
+class DocumentState(object):
+    """ Plugin state that belongs to a single document """
+
+    def __init__(self, doc, shared_words, shared_ngrams):
+        from intelligent_text_completion_lib.words import DocumentWordIndex
+        from intelligent_text_completion_lib.blocks import BlockCache
+        self.doc = doc
+        # marks in front of closers that were inserted by the plugin. The marks
+        # have right gravity, so text typed at the cursor pushes them along.
+        self.closers = set()
+        # word and n-gram counts, kept up to date by re-indexing the lines
+        # that change
+        self.words = DocumentWordIndex(shared_words)
+        self.ngrams = shared_ngrams
+        self.changed_line = 0
+        # the words and n-grams of the lines above indexed_lines are counted;
+        # the rest are counted in chunks when idle, so a large document
+        # doesn't block the first switch to its tab
+        self.indexed_lines = 0
+        self.index_idle_id = None
+        # indentation style, detected from a sample of lines when needed
+        self.indentation = None
+        self.indentation_dirty = True
+        # indentation and nesting of every line, built when needed
+        self.line_index = None
+        # block comments, built when needed
+        self.comment_index = None
+        # tags in front of the cursor, scanned when needed
+        self.tag_index = None
+        # bytes taken by the indexes above and the blocks below, or None if
+        # they were built or dropped since they were measured
+        self._index_usage = None
+        self.changed_lines = (0, 0)
+        # numbered lists that were found
+        self.list_blocks = BlockCache()
+        # pipe tables that were found, with the widths of their columns
+        self.tables = BlockCache()
+        # rules for the language of the document
+        self.rules = None
+        self.update_rules()
+        self.index_idle_id = GLib.idle_add(self._on_idle_index_lines, priority=GLib.PRIORITY_LOW)
+
+    def _on_idle_index_lines(self):
+        """ Count the words and n-grams of the next chunk of lines """
+        line_count = self.doc.get_line_count()
+        end_line = min(self.indexed_lines + INDEX_CHUNK_LINES, line_count)
+        if end_line > self.indexed_lines:
+            text = self.get_lines_text(self.indexed_lines, end_line - 1)
+            self.words.add_text(text)
+            self.ngrams.add_text(text)
+            self.indexed_lines = end_line
+        if self.indexed_lines < line_count:
+            return True
+        self.index_idle_id = None
+        return False
+
+    def update_rules(self):
+        """ Load the rules for the current language of the document """
+        from intelligent_text_completion_lib.rules import get_rule_table
+        language = self.doc.get_language()
+        self.rules = get_rule_table(language.get_id() if language else None)
+        if self.line_index is not None and self.line_index.openers != self.rules.keyword_openers:
+            # the block keywords differ, index the lines again when needed
+            self.line_index = None
+            self._index_usage = None
+
+    def get_indentation(self):
+        """ Get the (use_spaces, width) indentation style, or None if unknown """
+        if self.indentation_dirty:
+            from intelligent_text_completion_lib.indentation import sample_windows, detect_indentation
+            self.indentation_dirty = False
+            windows = []
+            for first_line, end_line in sample_windows(self.doc.get_line_count()):
+                windows.append([self._get_line_start(line) for line in range(first_line, end_line)])
+            self.indentation = detect_indentation(windows)
+        return self.indentation
+
+    def _get_line_start(self, line):
+        from intelligent_text_completion_lib.indentation import MAX_SAMPLE_LINE_LENGTH
+        start = self.doc.get_iter_at_line(line)
+        end = start.copy()
+        if not end.ends_line():
+            end.forward_to_line_end()
+        if end.get_line_offset() > MAX_SAMPLE_LINE_LENGTH:
+            end.set_line_offset(MAX_SAMPLE_LINE_LENGTH)
+        return self.doc.get_text(start, end, False)
+
+    def get_lines_text(self, first_line, last_line):
+        start = self.doc.get_iter_at_line(first_line)
+        end = self.doc.get_iter_at_line(last_line)
+        if not end.ends_line():
+            end.forward_to_line_end()
+        return self.doc.get_text(start, end, False)
+
+    def index_lines(self, first_line, last_line):
+        """ Add the given lines to the indexes, they replace the lines that
+        were passed to unindex_lines() """
+        text = self.get_lines_text(first_line, last_line)
+        old_first_line, old_last_line = self.changed_lines
+        old_count = old_last_line - old_first_line + 1
+        if old_last_line < self.indexed_lines:
+            self.words.add_text(text)
+            self.ngrams.add_text(text)
+            self.indexed_lines += last_line - first_line + 1 - old_count
+        self.list_blocks.lines_replaced(first_line, old_count, last_line - first_line + 1)
+        self.tables.lines_replaced(first_line, old_count, last_line - first_line + 1)
+        if self.line_index is not None or self.comment_index is not None:
+            from intelligent_text_completion_lib import lineindex, comments
+            lines = lineindex.split_lines(text)
+            row_bytes = 0
+            if self.line_index is not None:
+                self.line_index.replace_lines(first_line, old_count, lines)
+                row_bytes += lineindex.ROW_BYTES
+            if self.comment_index is not None:
+                self.comment_index.replace_lines(first_line, old_count, lines)
+                row_bytes += comments.ROW_BYTES
+            # an edit only adds or removes rows, don't walk the indexes again
+            if self._index_usage is not None:
+                self._index_usage += (len(lines) - old_count) * row_bytes
+
+    def unindex_lines(self, first_line, last_line):
+        """ Remove the given lines from the indexes, before they change """
+        if last_line < self.indexed_lines:
+            text = self.get_lines_text(first_line, last_line)
+            self.words.remove_text(text)
+            self.ngrams.remove_text(text)
+        elif first_line < self.indexed_lines:
+            # the lines from first_line on are counted again when idle
+            text = self.get_lines_text(first_line, self.indexed_lines - 1)
+            self.words.remove_text(text)
+            self.ngrams.remove_text(text)
+            self.indexed_lines = first_line
+            if self.index_idle_id is None:
+                self.index_idle_id = GLib.idle_add(self._on_idle_index_lines, priority=GLib.PRIORITY_LOW)
+        self.changed_lines = (first_line, last_line)
+
+    def get_line_index(self):
+        """ Get the LineIndex of the document, building it on first use """
+        if self.line_index is None:
+            from intelligent_text_completion_lib.lineindex import LineIndex
+            start, end = self.doc.get_bounds()
+            self.line_index = LineIndex(self.doc.get_text(start, end, False), self.rules.keyword_openers)
+            self._index_usage = None
+        return self.line_index
+
+    def get_comment_index(self):
+        """ Get the CommentIndex of the document, building it on first use """
+        if self.comment_index is None:
+            from intelligent_text_completion_lib.comments import CommentIndex
+            start, end = self.doc.get_bounds()
+            self.comment_index = CommentIndex(self.doc.get_text(start, end, False))
+            self._index_usage = None
+        return self.comment_index
+
+    def get_list_block(self, line):
+        """ Get the numbered list with an item on line, or None. Lines that
+        were edited since the list was found are checked again. """
+        block = self.list_blocks.get(line)
+        if block is not None and not block.refresh(self._get_line):
+            self.list_blocks.discard(block)
+            block = None
+        if block is None:
+            from intelligent_text_completion_lib.lists import find_block
+            block = find_block(self._get_line, self.doc.get_line_count(), line)
+            if block is not None:
+                self.list_blocks.add(block)
+                self._index_usage = None
+        return block
+
+    def get_table(self, line):
+        """ Get the pipe table with a row on line, or None. Rows that were
+        edited since the table was found are parsed again. """
+        table = self.tables.get(line)
+        if table is not None and not table.refresh(self._get_line):
+            self.tables.discard(table)
+            table = None
+        if table is None:
+            from intelligent_text_completion_lib.tables import find_table
+            table = find_table(self._get_line, self.doc.get_line_count(), line)
+            if table is not None:
+                self.tables.add(table)
+                self._index_usage = None
+        return table
+
+    def _get_line(self, line):
+        return self.get_lines_text(line, line)
+
+    def get_tag_index(self, cursor):
+        """ Get the TagIndex, covering at least the text in front of cursor """
+        from intelligent_text_completion_lib.xmltags import TagIndex, TAG_BYTES
+        if self.tag_index is None:
+            self.tag_index = TagIndex()
+            self._index_usage = None
+        index = self.tag_index
+        if cursor.get_offset() > index.scanned_end:
+            start = self.doc.get_iter_at_offset(index.scanned_end)
+            count = len(index)
+            index.scan(self.doc.get_text(start, cursor, False), index.scanned_end)
+            if self._index_usage is not None:
+                self._index_usage += (len(index) - count) * TAG_BYTES
+        return index
+
+    def get_closing_xml_tag(self, cursor, html=False):
+        """ Get the name of the innermost tag that is open at cursor, or None """
+        unclosed = self.get_tag_index(cursor).unclosed_before(cursor.get_offset(), limit=1, html=html)
+        return unclosed[0] if unclosed else None
+
+    def get_open_xml_tags(self, cursor, html=False):
+        """ Get (name, line, leading whitespace of line) of every tag that is
+        open at cursor, innermost first """
+        open_tags = []
+        for name, offset in self.get_tag_index(cursor).open_tags_before(cursor.get_offset(), html=html):
+            line = self.doc.get_iter_at_offset(offset).get_line()
+            open_tags.append((name, line, self.get_line_whitespace(line)))
+        return open_tags
+
+    def get_line_whitespace(self, line):
+        """ Get the leading whitespace of line """
+        start = self.doc.get_iter_at_line(line)
+        end = start.copy()
+        end.set_line_offset(self.get_line_index().indent(line))
+        return self.doc.get_text(start, end, False)
+
+    def add_closer(self, pos):
+        """ Register the auto-inserted closer right after pos """
+        mark = self.doc.create_mark(None, pos, False)
+        self.closers.add(mark)
+
+    def pop_closer(self, pos):
+        """ Unregister the closer right after pos, return whether there was one """
+        for mark in pos.get_marks():
+            if mark in self.closers:
+                self.closers.discard(mark)
+                self.doc.delete_mark(mark)
+                return True
+        return False
+
+    def forget_closers(self, start, end):
+        """ Unregister all closers in the range [start, end) """
+        if not self.closers:
+            return
+        start_offset = start.get_offset()
+        end_offset = end.get_offset()
+        if end_offset - start_offset <= len(self.closers):
+            # small deletion: look at the marks in the range
+            pos = start.copy()
+            marks = []
+            while pos.get_offset() < end_offset:
+                marks.extend(pos.get_marks())
+                if not pos.forward_char():
+                    break
+        else:
+            # large deletion: look at the registered marks
+            marks = list(self.closers)
+        for mark in marks:
+            if mark in self.closers:
+                offset = self.doc.get_iter_at_mark(mark).get_offset()
+                if start_offset <= offset < end_offset:
+                    self.closers.discard(mark)
+                    self.doc.delete_mark(mark)
+
+    def cache_usage(self):
+        """ Get the number of bytes taken by the indexes of the document. They
+        are only walked again when one was built or dropped since they were
+        last measured. """
+        if self._index_usage is None:
+            from intelligent_text_completion_lib.cachebudget import deep_getsizeof
+            self._index_usage = deep_getsizeof(
+                [self.line_index, self.comment_index, self.tag_index, self.list_blocks, self.tables])
+        return self._index_usage
+
+    def memory_usage(self):
+        """ Get the number of bytes taken by the word counts of the document,
+        which are kept until it is closed. The words and n-grams that all
+        documents share are counted by the cache budget. """
+        return self.words.memory_usage()
+
+    def evict_caches(self):
+        """ Drop the indexes that can be built again, they are built when they
+        are needed next. Returns the number of bytes freed. """
+        usage = self.cache_usage()
+        self.line_index = None
+        self.comment_index = None
+        self.tag_index = None
+        self.list_blocks.clear()
+        self.tables.clear()
+        self._index_usage = None
+        return usage - self.cache_usage()
+
+    def clear(self):
+        """ Remove all marks from the document and its words from the index """
+        for mark in self.closers:
+            if not mark.get_deleted():
+                self.doc.delete_mark(mark)
+        self.closers = set()
+        self.words.clear()
+        if self.index_idle_id is not None:
+            GLib.source_remove(self.index_idle_id)
+            self.index_idle_id = None
+        if self.indexed_lines:
+            self.ngrams.remove_text(self.get_lines_text(0, self.indexed_lines - 1))
+            self.indexed_lines = 0
+
+class WordCompletionProvider(GObject.Object, GtkSource.CompletionProvider):
+    """ Completes the word at the cursor with words of the open documents and
+    of the user's vocabulary. Words that are likely to follow the preceding
+    words on the line are proposed first, also when nothing is typed yet. """
+
+    def __init__(self, words, vocabulary, ngrams):
+        GObject.Object.__init__(self)
+        self._words = words
+        self._vocabulary = vocabulary
+        self._ngrams = ngrams
+
+    def do_get_name(self):
+        return "Words"
+
+    def do_match(self, context):
+        return IntelligentTextCompletionOptions.get_instance().completeWords
+
+    def do_populate(self, context):
+        from intelligent_text_completion_lib.words import MIN_PREFIX_LENGTH, WORD_RE
+        cursor = context.get_iter()
+        if isinstance(cursor, tuple):
+            # newer versions of GtkSourceView return (is_valid, iter)
+            cursor = cursor[1]
+        line_start = cursor.copy()
+        line_start.set_line_offset(0)
+        preceding_line = cursor.get_buffer().get_text(line_start, cursor, False)
+        m = re.search(r'\w+$', preceding_line, re.UNICODE)
+        prefix = m.group(0) if m else ''
+        preceding_words = WORD_RE.findall(preceding_line[:len(preceding_line) - len(prefix)])
+        predicted = self._ngrams.predict(preceding_words[-2:], prefix)
+        proposals = []
+        for word in predicted:
+            proposals.append(GtkSource.CompletionItem.new(word, word, None, None))
+        if len(prefix) >= MIN_PREFIX_LENGTH:
+            # words of the open documents match fuzzily, the vocabulary's
+            # words only by prefix
+            words = [word for word, quality in self._words.fuzzy.match(prefix)]
+            words.extend(word for word, count in self._vocabulary.complete(prefix) if word != prefix)
+            for word in words:
+                if word not in predicted:
+                    predicted.append(word)
+                    proposals.append(GtkSource.CompletionItem.new(word, word, None, None))
+        context.add_proposals(self, proposals, True)
+
+    def do_activate_proposal(self, proposal, pos):
+        # rank recently chosen words higher, and let GtkSourceView insert it
+        self._words.fuzzy.touch(proposal.get_text())
+        return False
+
 ##### regular functions #####
 
-def get_tab_string(view):
+# python statements after which the next line is dedented
+DEDENT_KEYWORDS = frozenset(['return', 'break', 'continue', 'pass', 'raise'])
+
+def get_hanging_indent_column(line):
+    """ Get the column right after the last bracket in line that is still open
+    and is followed by text, or None """
+    stack = []
+    quote = None
+    escaped = False
+    for column, char in enumerate(line):
+        if quote:
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == quote:
+                quote = None
+        elif char in '"\'':
+            quote = char
+        elif char in '([':
+            stack.append(column)
+        elif char in ')]' and stack:
+            stack.pop()
+    if not stack or not line[stack[-1] + 1:].strip():
+        return None
+    return stack[-1] + 1
+
+def get_key_event_context(doc, event):
+    """ Describe the key and the document of a key press that was handled,
+    for the profiles of slow key presses """
+    cursor = doc.get_iter_at_mark(doc.get_insert())
+    line_end = cursor.copy()
+    if not line_end.ends_line():
+        line_end.forward_to_line_end()
+    context_start = cursor.copy()
+    context_start.set_line_offset(max(0, cursor.get_line_offset() - 40))
+    context_end = cursor.copy()
+    context_end.set_line_offset(min(line_end.get_line_offset(), cursor.get_line_offset() + 40))
+    language = doc.get_language()
+    return {
+        'key': Gdk.keyval_name(event.keyval),
+        'language': language.get_id() if language else None,
+        'document_chars': doc.get_char_count(),
+        'document_lines': doc.get_line_count(),
+        'line': cursor.get_line(),
+        'column': cursor.get_line_offset(),
+        'line_length': line_end.get_line_offset(),
+        'before_cursor': doc.get_text(context_start, cursor, False),
+        'after_cursor': doc.get_text(cursor, context_end, False),
+        'selection': bool(doc.get_selection_bounds()),
+    }
+
+def get_tab_string(view, style=None):
+    """ Get the string of one indentation level, in the given (use_spaces,
+    width) style if it is known and in the view's style otherwise """
+    if style is not None:
+        use_spaces, width = style
+        if use_spaces:
+            return " " * width
+        return "\t"
     tab_width = view.get_tab_width()
     tab_spaces = view.get_insert_spaces_instead_of_tabs()
     tab_code = ""
@@ -334,40 +1214,6 @@ def get_tab_string(view):
         tab_code = "\t"
     return tab_code
 
-def get_closing_xml_tag(document):
-    tags = re.findall(r'<.*?>', document)
-    tags.reverse()
-    closed = []
-    for tag in tags:
-        # ignore special tags like <!-- --> and <!doctype ...>
-        if re.match(r'<!.*?>', tag):
-            continue
-        # ignore special tags like <?, <?=, <?php
-        if re.match(r'<\?.*?>', tag):
-            continue
-        # neutral tag
-        if re.match(r'<.*?/>', tag):
-            continue
-        # closing tag
-        m = re.match(r'</ *([^ ]*).*?>', tag)
-        if m:
-            closed.append(m.group(1))
-            continue
-        # opening tag
-        m = re.match(r'< *([^/][^ ]*).*?>', tag)
-        if m:
-            openedtag = m.group(1)
-            while True:
-                if len(closed) == 0:
-                    return openedtag
-                close_tag = closed.pop()
-                if close_tag.lower() == openedtag.lower():
-                    break
-            continue
-    return None
-
-
-
 ################## OPTIONS DIALOG ##################
 class IntelligentTextCompletionOptions(object):
 
@@ -376,31 +1222,70 @@ class IntelligentTextCompletionOptions(object):
     completeXML = True
     detectLists = True
     autoindentAfterFunctionOrList = True
+    expandSnippets = True
+    completeWords = True
+    alignTables = True
+    reindentPastedText = True
+    profileKeyEvents = False
+    # in MB, read with the other options
+    cacheBudget = None
 
     ## buttons for settings
     _closeBracketsAndQuotesButton = None
     _completeXMLButton = None
     _detectListsButton = None
     _autoindentAfterFunctionOrListButton = None
+    _expandSnippetsButton = None
+    _completeWordsButton = None
+    _alignTablesButton = None
+    _reindentPastedTextButton = None
+    _profileKeyEventsButton = None
+    _cacheBudgetButton = None
 
-    ## configuration client
-    _BASE_KEY = "apps.gedit-3.plugins.intelligent_text_completion"
+    ## settings store
+    _SCHEMA_ID = "org.gnome.gedit.plugins.intelligent-text-completion"
+    # changed options are written this long after the last change
+    _SAVE_DELAY_MS = 500
     _settings = None
+    _settings_monitor = None
+    _save_id = None
+    _updating_buttons = False
 
     ## static singleton reference
     singleton = None
 
     def __init__(self):
-        # create settings directory if not set yet
-        #self._settings = Gio.Settings.new(self._BASE_KEY)
-        #if not self._gconf_client.dir_exists(self._GCONF_SETTINGS_DIR):
-        #    self._gconf_client.add_dir(self._GCONF_SETTINGS_DIR, gconf.CLIENT_PRELOAD_NONE)
+        # the options are read once and kept in memory, so handling a key
+        # press never touches the settings store
+        self._settings = self._open_settings()
+        self._load_settings()
+
+    def _open_settings(self):
+        """ Open the GSettings of the plugin, or the key file if its schema
+        isn't installed """
+        source = Gio.SettingsSchemaSource.get_default()
+        if source is not None and source.lookup(self._SCHEMA_ID, True) is not None:
+            return GSettingsStore(self._SCHEMA_ID, self._on_settings_changed)
+        from intelligent_text_completion_lib.settings import KeyFileSettings, default_settings_path
+        settings = KeyFileSettings(default_settings_path())
+        self._settings_monitor = Gio.File.new_for_path(settings.path).monitor_file(Gio.FileMonitorFlags.NONE, None)
+        self._settings_monitor.connect('changed', self._on_settings_file_changed)
+        return settings
 
-        # load settings
+    def _load_settings(self):
+        from intelligent_text_completion_lib.cachebudget import DEFAULT_BUDGET_MB, MIN_BUDGET_MB, MAX_BUDGET_MB
         self.closeBracketsAndQuotes = self._load_setting("closeBracketsAndQuotes")
         self.completeXML = self._load_setting("completeXML")
         self.detectLists = self._load_setting("detectLists")
         self.autoindentAfterFunctionOrList = self._load_setting("autoindentAfterFunctionOrList")
+        self.expandSnippets = self._load_setting("expandSnippets")
+        self.completeWords = self._load_setting("completeWords")
+        self.alignTables = self._load_setting("alignTables")
+        self.reindentPastedText = self._load_setting("reindentPastedText")
+        self.profileKeyEvents = self._load_setting("profileKeyEvents", False)
+        # the settings file may hold any number
+        self.cacheBudget = min(max(self._load_int_setting("cacheBudget", DEFAULT_BUDGET_MB),
+                                   MIN_BUDGET_MB), MAX_BUDGET_MB)
 
     @classmethod
     def get_instance(cls):
@@ -415,12 +1300,6 @@ class IntelligentTextCompletionOptions(object):
         vbox = Gtk.VBox()
         vbox.set_border_width(6)
 
-        # add warning
-        box = Gtk.HBox()
-        label = Gtk.Label("Warning: these options are not yet persistent")
-        box.pack_start(label, False, False, 6)
-        vbox.pack_start(box, False, True, 0)
-
         # add checkboxes
         self._closeBracketsAndQuotesButton = self._add_setting_checkbox(
             vbox=vbox,
@@ -442,8 +1321,74 @@ class IntelligentTextCompletionOptions(object):
             current_value=self.autoindentAfterFunctionOrList,
             helptext="Auto-indent after function or list",
         )
+        self._expandSnippetsButton = self._add_setting_checkbox(
+            vbox=vbox,
+            current_value=self.expandSnippets,
+            helptext="Expand snippets",
+        )
+        self._completeWordsButton = self._add_setting_checkbox(
+            vbox=vbox,
+            current_value=self.completeWords,
+            helptext="Complete words from open documents",
+        )
+        self._alignTablesButton = self._add_setting_checkbox(
+            vbox=vbox,
+            current_value=self.alignTables,
+            helptext="Align tables",
+        )
+        self._reindentPastedTextButton = self._add_setting_checkbox(
+            vbox=vbox,
+            current_value=self.reindentPastedText,
+            helptext="Re-indent pasted lines",
+        )
+
+        # add memory budget
+        box = Gtk.HBox()
+        label = Gtk.Label("Memory for document caches (MB)")
+        box.pack_start(label, False, False, 6)
+        from intelligent_text_completion_lib.cachebudget import MIN_BUDGET_MB, MAX_BUDGET_MB
+        self._cacheBudgetButton = Gtk.SpinButton.new_with_range(MIN_BUDGET_MB, MAX_BUDGET_MB, 1)
+        self._cacheBudgetButton.set_value(self.cacheBudget)
+        self._cacheBudgetButton.connect('value-changed', self._on_cache_budget_changed)
+        box.pack_start(self._cacheBudgetButton, False, False, 6)
+        vbox.pack_start(box, False, True, 0)
+
+        # add memory usage of the open documents
+        cache_budget = get_cache_budget()
+        usage = ["%s: %.1f MB" % (doc.get_short_name_for_display(), size / 1048576.0)
+                 for doc, size in cache_budget.usage()]
+        if usage:
+            usage.append("Words of all documents: %.1f MB" % (cache_budget.shared_usage() / 1048576.0))
+        box = Gtk.HBox()
+        label = Gtk.Label("\n".join(usage) or "No documents")
+        label.set_alignment(0, 0)
+        box.pack_start(label, False, False, 6)
+        vbox.pack_start(box, False, True, 0)
+
+        # add profiling of slow key presses
+        self._profileKeyEventsButton = self._add_setting_checkbox(
+            vbox=vbox,
+            current_value=self.profileKeyEvents,
+            helptext="Record the slowest key presses (for bug reports)",
+        )
+        box = Gtk.HBox()
+        button = Gtk.Button("Save profiles")
+        label = Gtk.Label("")
+        label.set_selectable(True)
+        button.connect('clicked', self._on_save_profiles_clicked, label)
+        box.pack_start(button, False, False, 6)
+        box.pack_start(label, False, False, 6)
+        vbox.pack_start(box, False, True, 0)
         return vbox
 
+    def _on_save_profiles_clicked(self, button, label):
+        recorder = get_key_event_recorder()
+        if not recorder.events():
+            label.set_text("No key presses recorded")
+            return
+        from intelligent_text_completion_lib.profiler import default_profile_dir
+        label.set_text(recorder.dump(default_profile_dir()))
+
     def _add_setting_checkbox(self, vbox, current_value, helptext):
         box = Gtk.HBox()
         check_button = Gtk.CheckButton(helptext)
@@ -454,22 +1399,110 @@ class IntelligentTextCompletionOptions(object):
         return check_button
 
     def _on_check_button_toggled(self, *args):
+        if self._updating_buttons:
+            return
         # set class attributes
         self.closeBracketsAndQuotes = self._closeBracketsAndQuotesButton.get_active()
         self.completeXML = self._completeXMLButton.get_active()
         self.detectLists = self._detectListsButton.get_active()
         self.autoindentAfterFunctionOrList = self._autoindentAfterFunctionOrListButton.get_active()
+        self.expandSnippets = self._expandSnippetsButton.get_active()
+        self.completeWords = self._completeWordsButton.get_active()
+        self.alignTables = self._alignTablesButton.get_active()
+        self.reindentPastedText = self._reindentPastedTextButton.get_active()
+        self.profileKeyEvents = self._profileKeyEventsButton.get_active()
 
-        # write changes to gconf
+        # write changes
         self._save_setting("closeBracketsAndQuotes", self.closeBracketsAndQuotes)
         self._save_setting("completeXML", self.completeXML)
         self._save_setting("detectLists", self.detectLists)
         self._save_setting("autoindentAfterFunctionOrList", self.autoindentAfterFunctionOrList)
+        self._save_setting("expandSnippets", self.expandSnippets)
+        self._save_setting("completeWords", self.completeWords)
+        self._save_setting("alignTables", self.alignTables)
+        self._save_setting("reindentPastedText", self.reindentPastedText)
+        self._save_setting("profileKeyEvents", self.profileKeyEvents)
+
+    def _on_cache_budget_changed(self, *args):
+        if self._updating_buttons:
+            return
+        self.cacheBudget = self._cacheBudgetButton.get_value_as_int()
+        self._save_setting("cacheBudget", self.cacheBudget)
+        cache_budget = get_cache_budget()
+        cache_budget.set_budget_mb(self.cacheBudget)
+        cache_budget.enforce()
+
+    def _on_settings_file_changed(self, *args):
+        if self._settings.maybe_reload():
+            self._on_settings_changed()
+
+    def _on_settings_changed(self, *args):
+        """ Take over options that were changed outside of this dialog """
+        self._load_settings()
+        if self._closeBracketsAndQuotesButton is None:
+            return
+        self._updating_buttons = True
+        try:
+            self._closeBracketsAndQuotesButton.set_active(self.closeBracketsAndQuotes)
+            self._completeXMLButton.set_active(self.completeXML)
+            self._detectListsButton.set_active(self.detectLists)
+            self._autoindentAfterFunctionOrListButton.set_active(self.autoindentAfterFunctionOrList)
+            self._expandSnippetsButton.set_active(self.expandSnippets)
+            self._completeWordsButton.set_active(self.completeWords)
+            self._alignTablesButton.set_active(self.alignTables)
+            self._reindentPastedTextButton.set_active(self.reindentPastedText)
+            self._profileKeyEventsButton.set_active(self.profileKeyEvents)
+            self._cacheBudgetButton.set_value(self.cacheBudget)
+        finally:
+            self._updating_buttons = False
 
     def _save_setting(self, setting_name, value):
-        pass
-        #self._gconf_client.set_bool("{}/{}".format(self._GCONF_SETTINGS_DIR, setting_name), value)
+        # changes are written together once the options stop changing
+        self._settings.set(setting_name, value)
+        if self._save_id is not None:
+            GLib.source_remove(self._save_id)
+        self._save_id = GLib.timeout_add(self._SAVE_DELAY_MS, self._on_save_timeout)
+
+    def _on_save_timeout(self):
+        self._save_id = None
+        self._settings.flush()
+        return False
 
-    def _load_setting(self, setting_name):
+    def flush(self):
+        """ Write the changed options now """
+        if self._save_id is not None:
+            GLib.source_remove(self._save_id)
+            self._on_save_timeout()
+
+    def _load_setting(self, setting_name, default=True):
+        return self._settings.get(setting_name, default)
+
+    def _load_int_setting(self, setting_name, default):
+        return self._settings.get(setting_name, default)
+
+class GSettingsStore(object):
+    """ Options stored with GSettings, with the same interface as
+    KeyFileSettings. Changes are held back until flush(). """
+
+    def __init__(self, schema_id, on_changed):
+        self._settings = Gio.Settings.new(schema_id)
+        self._settings.delay()
+        self._settings.connect('changed', on_changed)
+
+    def get(self, name, default):
+        from intelligent_text_completion_lib.settings import key_name
+        # the schema has a default for every option
+        return self._settings.get_value(key_name(name)).unpack()
+
+    def set(self, name, value):
+        from intelligent_text_completion_lib.settings import key_name
+        key = key_name(name)
+        old_value = self._settings.get_value(key)
+        if old_value.unpack() != value:
+            self._settings.set_value(key, GLib.Variant(old_value.get_type_string(), value))
+
+    def flush(self):
+        if not self._settings.get_has_unapplied():
+            return False
+        self._settings.apply()
         return True
-        #return self._gconf_client.get_bool("{}/{}".format(self._GCONF_SETTINGS_DIR, setting_name))
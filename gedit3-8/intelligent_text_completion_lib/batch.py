@@ -0,0 +1,223 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Run the completion rules over trees of files, outside of Gedit.
+
+Usage: python -m intelligent_text_completion_lib.batch [options] PATH...
+
+Every file under the given paths is checked by a pool of worker processes,
+with the same code the plugin uses, and one JSON object per file is written
+to standard output as soon as the file is done:
+
+    {"path": "a.html", "unclosed_tags": ["div"], "lists": []}
+    {"path": "b.md", "unclosed_tags": [], "lists": [{"line": 3, "label": "4", "expected": "3"}]}
+
+unclosed_tags are the tags that are still open at the end of the file,
+innermost first; lists are the items of numbered lists whose label doesn't
+follow from the first item. Lines are counted from 1. Which checks run
+depends on the rule pack of the language of the file, which is known from
+its extension (see EXTENSION_LANGUAGES). Files with another extension are
+skipped while walking a directory, unless -e names their extension; they are
+checked with the default pack and never fixed. Files that aren't UTF-8 are
+reported with an error and left alone. With --fix, list labels are corrected
+in place. The exit status is 1 if any problem was found.
+"""
+
+import argparse
+import json
+import mmap
+import multiprocessing
+import os
+import sys
+
+from . import lists
+from .blocks import LINE_BREAK_RE
+from .rules import get_rule_table
+from .xmltags import get_unclosed_xml_tags
+
+# file extension -> GtkSourceLanguage id
+EXTENSION_LANGUAGES = {
+    '.html': 'html',
+    '.htm': 'html',
+    '.xhtml': 'html',
+    '.xml': 'xml',
+    '.svg': 'xml',
+    '.md': 'markdown',
+    '.markdown': 'markdown',
+    '.py': 'python',
+    '.c': 'c',
+    '.h': 'chdr',
+    '.cpp': 'cpp',
+    '.java': 'java',
+    '.js': 'js',
+    '.json': 'json',
+    '.sh': 'sh',
+    '.rb': 'ruby',
+    '.lua': 'lua',
+}
+
+# files with a NUL byte in their first bytes are not text
+BINARY_CHECK_SIZE = 8192
+
+def read_text(path, marker=None):
+    """ Get the text of the file at path, or None if it is a binary file.
+    If marker is given and the file doesn't contain it, the file isn't
+    decoded and the text is empty. Raises UnicodeDecodeError if the file
+    isn't UTF-8. """
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return u''
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if data.find(b'\0', 0, BINARY_CHECK_SIZE) >= 0:
+                return None
+            if marker is not None and data.find(marker) < 0:
+                return u''
+            return str(data, 'utf-8')
+
+def check_lists(lines):
+    """ Get the wrongly numbered list items in lines, as
+    (line index, label, expected label) """
+    problems = []
+    line = 0
+    while line < len(lines):
+        block = None
+        if lists.parse_item(lines[line]) is not None:
+            block = lists.find_block(lines.__getitem__, len(lines), line)
+        if block is None:
+            line += 1
+            continue
+        for index, item_line in enumerate(block.items):
+            item_line += block.first_line
+            if item_line < line:
+                continue
+            label = lists.parse_item(lines[item_line])[1]
+            expected = block.label(index)
+            if label != expected:
+                problems.append((item_line, label, expected))
+        line = block.last_line + 1
+    return problems
+
+def fix_lists(path, parts, problems):
+    """ Write the file at path with the labels of the list items corrected.
+    parts are the lines of the file, with the line breaks in between. """
+    for line, label, expected in problems:
+        text = parts[2 * line]
+        start = text.index(label)
+        parts[2 * line] = text[:start] + expected + text[start + len(label):]
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix='.itc-', dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(''.join(parts).encode('utf-8'))
+        os.chmod(tmp_path, os.stat(path).st_mode & 0o7777)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def check_file(args):
+    """ Check the file at path, in a worker process """
+    path, fix = args
+    result = {'path': path}
+    language = EXTENSION_LANGUAGES.get(os.path.splitext(path)[1].lower())
+    rules = get_rule_table(language)
+    if language is None:
+        # the default pack is a guess, don't rewrite files based on it
+        fix = False
+    if 'numbered_lists' in rules:
+        marker = None
+    elif 'xml_tags' in rules:
+        # without a '<' there are no tags
+        marker = b'<'
+    else:
+        # nothing to check
+        return result
+    try:
+        text = read_text(path, marker)
+    except (IOError, OSError) as e:
+        result['error'] = str(e)
+        return result
+    except UnicodeDecodeError as e:
+        # don't guess the encoding: a fix would rewrite the file as UTF-8
+        result['error'] = 'not UTF-8: %s' % e
+        return result
+    if text is None:
+        result['skipped'] = 'binary'
+        return result
+    if 'xml_tags' in rules:
+        result['unclosed_tags'] = get_unclosed_xml_tags(text, html='html_elements' in rules)
+    if 'numbered_lists' in rules:
+        parts = LINE_BREAK_RE.split(text)
+        problems = check_lists(parts[0::2])
+        result['lists'] = [
+            {'line': line + 1, 'label': label, 'expected': expected}
+            for line, label, expected in problems
+        ]
+        if fix and problems:
+            try:
+                fix_lists(path, parts, problems)
+            except (IOError, OSError) as e:
+                # the problems are still reported, as not fixed
+                result['error'] = str(e)
+            else:
+                result['fixed'] = True
+    return result
+
+def iter_paths(paths, extensions):
+    """ Get the files under paths, with one of extensions if given and in a
+    language of EXTENSION_LANGUAGES otherwise. Paths of files are always
+    returned. """
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for directory, dirnames, filenames in os.walk(path):
+            # skip hidden directories like .git
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith('.'))
+            for filename in sorted(filenames):
+                if os.path.splitext(filename)[1].lower() not in (extensions or EXTENSION_LANGUAGES):
+                    continue
+                yield os.path.join(directory, filename)
+
+def has_problems(result):
+    return bool(result.get('unclosed_tags') or (result.get('lists') and not result.get('fixed')) or
+                result.get('error'))
+
+def main(argv):
+    parser = argparse.ArgumentParser(prog='python -m intelligent_text_completion_lib.batch',
+                                     description='Check files with the intelligent text completion rules.')
+    parser.add_argument('paths', metavar='PATH', nargs='+', help='file or directory to check')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('-e', '--extension', action='append', default=[],
+                        help='only check files with this extension, like .html, also one '
+                             'without a language of its own (repeatable)')
+    parser.add_argument('--fix', action='store_true', help='correct the labels of numbered lists')
+    options = parser.parse_args(argv)
+    extensions = set(e.lower() if e.startswith('.') else '.' + e.lower() for e in options.extension)
+
+    tasks = ((path, options.fix) for path in iter_paths(options.paths, extensions))
+    status = 0
+    pool = multiprocessing.Pool(options.jobs)
+    try:
+        for result in pool.imap_unordered(check_file, tasks, chunksize=16):
+            sys.stdout.write(json.dumps(result) + '\n')
+            if has_problems(result):
+                status = 1
+    finally:
+        pool.close()
+        pool.join()
+    return status
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
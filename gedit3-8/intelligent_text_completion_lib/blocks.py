@@ -0,0 +1,90 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Cache of the blocks of lines (lists, tables) that were found in a document.
+
+A block has a first_line, a length (last_line - first_line) and a method
+lines_replaced(first_line, old_count, new_count) that is called when lines
+inside it change. It returns whether the block kept itself up to date;
+otherwise it is dropped and found again when it is needed. Blocks next to
+the changed lines are dropped as well, since the change may extend them.
+Blocks below the changed lines are moved without looking at their lines.
+"""
+
+import re
+from bisect import bisect_right
+
+LINE_BREAK_RE = re.compile(u'(\r\n|\r|\n|\u2029)')
+
+def join_lines(old_text, lines):
+    """ Join lines with the line breaks between the lines of old_text """
+    breaks = LINE_BREAK_RE.split(old_text)[1::2]
+    breaks.append('')
+    return ''.join(line + breaks[i] for i, line in enumerate(lines))
+
+class BlockCache(object):
+    """ The blocks of a document that are known """
+
+    def __init__(self):
+        # blocks sorted by first line
+        self.blocks = []
+        self.first_lines = []
+
+    def get(self, line):
+        """ Get the cached block that contains line, or None """
+        index = bisect_right(self.first_lines, line) - 1
+        if index >= 0 and line <= self.blocks[index].last_line:
+            return self.blocks[index]
+        return None
+
+    def add(self, block):
+        self._touching(block.first_line, block.last_line + 1, keep=lambda other: False)
+        index = bisect_right(self.first_lines, block.first_line)
+        self.blocks.insert(index, block)
+        self.first_lines.insert(index, block.first_line)
+
+    def discard(self, block):
+        if block in self.blocks:
+            index = self.blocks.index(block)
+            del self.blocks[index]
+            del self.first_lines[index]
+
+    def lines_replaced(self, first_line, old_count, new_count):
+        """ Lines first_line to first_line + old_count - 1 were replaced by
+        new_count lines """
+        if not self.blocks:
+            return
+        end_line = first_line + old_count
+        delta = new_count - old_count
+        def keep(block):
+            return (first_line >= block.first_line and end_line <= block.last_line + 1 and
+                    block.lines_replaced(first_line, old_count, new_count))
+        below = self._touching(first_line, end_line, keep)
+        for block in self.blocks[below:]:
+            block.first_line += delta
+        self.first_lines = [block.first_line for block in self.blocks]
+
+    def _touching(self, first_line, end_line, keep):
+        """ Drop the blocks that touch lines first_line to end_line - 1 unless
+        keep(block), and get the index of the first block below them """
+        start = bisect_right(self.first_lines, first_line - 2)
+        if start and self.blocks[start - 1].last_line + 1 >= first_line:
+            start -= 1
+        end = bisect_right(self.first_lines, end_line)
+        kept = [block for block in self.blocks[start:end] if keep(block)]
+        self.blocks[start:end] = kept
+        self.first_lines[start:end] = [block.first_line for block in kept]
+        return start + len(kept)
+
+    def clear(self):
+        self.blocks = []
+        self.first_lines = []
@@ -0,0 +1,127 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""A memory budget for the caches the plugin keeps per document.
+
+Documents are kept in order of when they were last active. When the caches
+of all documents together take more than the budget, the caches of the
+documents that were active longest ago are evicted. A document's cache must
+have cache_usage(), the number of bytes that can be built again,
+evict_caches(), which drops those and returns the number of bytes freed, and
+memory_usage(), the number of bytes it keeps as long as the document is
+open, like its word counts. Caches are keyed by buffer, so views of the same
+buffer share one cache and it is counted once.
+
+Structures that all documents share, like the word index, are added with
+add_shared(). They need memory_usage() and count against the budget, but
+are never evicted. Nothing is evicted when that wouldn't bring the total
+within the budget: the caches would only be built again on the next tab
+switch. enforce() runs on every tab switch, so cache_usage() and
+memory_usage() should not walk the whole structure each time.
+"""
+
+import sys
+from array import array
+from collections import OrderedDict
+
+DEFAULT_BUDGET_MB = 64
+MIN_BUDGET_MB = 1
+MAX_BUDGET_MB = 4096
+
+_LEAVES = (str, bytes, int, float, bool, type(None), array)
+
+def deep_getsizeof(obj):
+    """ Get the size of obj and of the objects it refers to, counting each
+    object once """
+    size = 0
+    seen = set()
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, _LEAVES):
+            continue
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        else:
+            attributes = getattr(item, '__dict__', None)
+            if attributes is not None:
+                stack.append(attributes)
+            for cls in type(item).__mro__:
+                for slot in getattr(cls, '__slots__', ()):
+                    if hasattr(item, slot):
+                        stack.append(getattr(item, slot))
+    return size
+
+class CacheBudget(object):
+    """ Least recently active eviction of per-document caches """
+
+    def __init__(self, budget_mb=DEFAULT_BUDGET_MB):
+        self.budget = budget_mb * 1024 * 1024
+        # key -> cache, the most recently active last
+        self._caches = OrderedDict()
+        self._shared = []
+
+    def set_budget_mb(self, budget_mb):
+        self.budget = budget_mb * 1024 * 1024
+
+    def touch(self, key, cache):
+        """ Mark the cache of key as the most recently active one """
+        self._caches.pop(key, None)
+        self._caches[key] = cache
+
+    def remove(self, key):
+        self._caches.pop(key, None)
+
+    def add_shared(self, structure):
+        self._shared.append(structure)
+
+    def remove_shared(self, structure):
+        if structure in self._shared:
+            self._shared.remove(structure)
+
+    def shared_usage(self):
+        """ Get the number of bytes of the shared structures """
+        return sum(structure.memory_usage() for structure in self._shared)
+
+    def usage(self):
+        """ Get [(key, bytes)] of all caches, the most recently active first """
+        return [(key, cache.cache_usage() + cache.memory_usage())
+                for key, cache in reversed(self._caches.items())]
+
+    def enforce(self):
+        """ Evict the caches of the least recently active documents until the
+        total fits in the budget. The most recently active one is kept, and
+        nothing is evicted if the total doesn't fit without the others.
+        Returns the number of bytes freed. """
+        usages = [(cache, cache.cache_usage()) for cache in self._caches.values()]
+        if not usages:
+            return 0
+        kept = self.shared_usage() + sum(cache.memory_usage() for cache in self._caches.values())
+        if kept + usages[-1][1] > self.budget:
+            return 0
+        total = kept + sum(usage for cache, usage in usages)
+        freed = 0
+        for cache, usage in usages[:-1]:
+            if total <= self.budget:
+                break
+            if usage:
+                evicted = cache.evict_caches()
+                total -= evicted
+                freed += evicted
+        return freed
@@ -0,0 +1,188 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Block comments (/* ... */) of a document.
+
+For every line, the index stores whether the line ends inside a comment
+when it starts outside one and when it starts inside one, and which comment
+token (/* or */) comes first on it. Lines are stored in blocks like in
+lineindex: every block keeps the combined effect of its lines and its first
+token.
+
+The state at the start of every block is cached and bisected over. After an
+edit, only the states of the blocks from the edit on are computed again,
+and only up to the block that is asked for, so looking up a line near the
+cursor while typing costs a bisect and a walk over part of one block.
+"""
+
+import re
+from array import array
+from bisect import bisect_right
+
+from .lineindex import BLOCK_SIZE, split_lines
+
+NO_TOKEN = 0
+OPENER = 1
+CLOSER = 2
+
+# bytes taken by the row of a line
+ROW_BYTES = array('b').itemsize
+
+# things that can hide a /* outside a comment
+TOKEN_RE = re.compile(r'/\*|//|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+# things that can hide the first token of a line, which may start inside a
+# comment, where // doesn't hide anything (as in a URL)
+FIRST_TOKEN_RE = re.compile(r'/\*|\*/|"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+
+def scan_line(text, inside):
+    """ Get whether text ends inside a comment, when it starts inside one or not """
+    pos = 0
+    while True:
+        if inside:
+            end = text.find('*/', pos)
+            if end < 0:
+                return True
+            inside = False
+            pos = end + 2
+        else:
+            m = TOKEN_RE.search(text, pos)
+            if m is None:
+                return False
+            token = m.group()
+            if token == '//':
+                return False
+            if token == '/*':
+                inside = True
+            pos = m.end()
+
+def first_token(text):
+    """ Get the comment token that comes first in text, outside of string
+    literals """
+    for m in FIRST_TOKEN_RE.finditer(text):
+        token = m.group()
+        if token == '/*':
+            return OPENER
+        if token == '*/':
+            return CLOSER
+    return NO_TOKEN
+
+def parse_line(line):
+    """ Get the row of the index for line: bit 0 and bit 1 tell whether the
+    line ends inside a comment when it starts outside and inside one, the
+    other bits hold its first token """
+    if '/' not in line:
+        # no comment can start or end on this line
+        return 2
+    return scan_line(line, False) | scan_line(line, True) << 1 | first_token(line) << 2
+
+def _end_state(row, inside):
+    return bool(row >> inside & 1)
+
+class _Block(object):
+    __slots__ = ('rows', 'ends', 'first_token')
+
+    def __init__(self, rows):
+        self.rows = array('b', rows)
+        # end state of the block for a start outside and inside a comment
+        self.ends = (self._end(False), self._end(True))
+        self.first_token = NO_TOKEN
+        for row in self.rows:
+            if row >> 2:
+                self.first_token = row >> 2
+                break
+
+    def __len__(self):
+        return len(self.rows)
+
+    def _end(self, inside):
+        for row in self.rows:
+            inside = _end_state(row, inside)
+        return inside
+
+class CommentIndex(object):
+    """ Block comments of a document """
+
+    def __init__(self, text=''):
+        self.blocks = []
+        self._append_rows([parse_line(line) for line in split_lines(text)])
+        # first line and state at the start of the first blocks
+        self._starts = []
+        self._states = []
+
+    def _append_rows(self, rows):
+        for start in range(0, len(rows), BLOCK_SIZE):
+            self.blocks.append(_Block(rows[start:start + BLOCK_SIZE]))
+
+    def __len__(self):
+        return sum(len(block) for block in self.blocks)
+
+    def _locate(self, line):
+        """ Get (block index, state at its start, line offset in block) of line """
+        starts = self._starts
+        states = self._states
+        if not starts:
+            starts.append(0)
+            states.append(False)
+        # extend the cached starts until they cover line
+        while starts[-1] + len(self.blocks[len(starts) - 1]) <= line:
+            if len(starts) == len(self.blocks):
+                raise IndexError(line)
+            block = self.blocks[len(starts) - 1]
+            starts.append(starts[-1] + len(block))
+            states.append(block.ends[states[-1]])
+        i = bisect_right(starts, line) - 1
+        return i, states[i], line - starts[i]
+
+    def replace_lines(self, first_line, count, lines):
+        """ Replace count rows starting at first_line by the rows of lines """
+        new_rows = [parse_line(line) for line in lines]
+        i, state, offset = self._locate(first_line)
+        rows = list(self.blocks[i].rows[:offset])
+        end = i
+        remaining = offset + count
+        while end < len(self.blocks) and remaining >= len(self.blocks[end]):
+            remaining -= len(self.blocks[end])
+            end += 1
+        tail = list(self.blocks[end].rows[remaining:]) if end < len(self.blocks) else []
+        rows = rows + new_rows + tail
+        replacement = []
+        for start in range(0, len(rows), BLOCK_SIZE):
+            replacement.append(_Block(rows[start:start + BLOCK_SIZE]))
+        self.blocks[i:end + 1] = replacement
+        if not self.blocks:
+            # a document always has a line
+            self._append_rows([parse_line('')])
+        # the states from block i on have to be computed again
+        del self._starts[i + 1:]
+        del self._states[i + 1:]
+
+    def inside(self, line):
+        """ Get whether line starts inside a comment """
+        i, state, offset = self._locate(line)
+        for row in self.blocks[i].rows[:offset]:
+            state = _end_state(row, state)
+        return state
+
+    def next_token(self, line):
+        """ Get the first comment token from the start of line on """
+        try:
+            i, state, offset = self._locate(line)
+        except IndexError:
+            # there are no lines from line on
+            return NO_TOKEN
+        for row in self.blocks[i].rows[offset:]:
+            if row >> 2:
+                return row >> 2
+        for block in self.blocks[i + 1:]:
+            if block.first_token:
+                return block.first_token
+        return NO_TOKEN
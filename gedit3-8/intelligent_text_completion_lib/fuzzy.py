@@ -0,0 +1,334 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Fuzzy matching and ranking of completion candidates.
+
+A word matches a typed pattern when it
+  * starts with the pattern (exact),
+  * starts with something within max_distance edits of the pattern (typo),
+    for patterns of at least MIN_TYPO_LENGTH characters, or
+  * contains the characters of the pattern in order, starting with the
+    same character (subsequence).
+
+Matches are ranked on this quality first, then on the word's count and how
+recently it was used. Only a few candidates are scored: exact matches come
+from a sorted word list, typos are found through an index of the character
+bigrams at the start of the words and subsequences through the words that
+start with the same character and contain all of the pattern's characters.
+A quality class is only searched when the better ones yield fewer than k
+matches.
+
+A word that starts one edit away from the pattern either has the pattern's
+first bigram at its start (the edit is at the third character or later) or
+the pattern's last bigram within one position of where the pattern has it
+(the edit is before the last two characters), so typos of one edit are only
+looked for among the words with one of these four bigrams. They are verified
+at the first character where the word and the pattern differ. For more
+edits, a word has all but at most 2 * max_distance of the pattern's bigrams,
+each within max_distance positions of where the pattern has it, and it is
+verified with Myers' bit-parallel edit distance algorithm. This leaves
+nothing to look for in patterns of fewer than 2 * max_distance + 2
+characters, which then get no typo matches.
+"""
+
+import bisect
+import heapq
+import math
+import re
+import sys
+from array import array
+from collections import Counter
+from itertools import chain
+
+EXACT = 3
+TYPO = 2
+SUBSEQUENCE = 1
+
+MIN_TYPO_LENGTH = 4
+# only the bigrams in the first characters of a word are indexed
+PREFIX_LENGTH = 12
+MAX_PATTERN_LENGTH = 60
+# new words are kept out of the sorted word list until there are this many
+MAX_UNSORTED_WORDS = 256
+
+FREQUENCY_WEIGHT = 0.5
+RECENCY_WEIGHT = 0.5
+
+def positional_bigrams(text):
+    """ Get the (position, bigram) pairs in text """
+    return [(i, text[i:i + 2]) for i in range(len(text) - 1)]
+
+def pattern_bitmasks(pattern):
+    """ Get {char: bitmask of the positions of char in pattern} """
+    masks = {}
+    for i, char in enumerate(pattern):
+        masks[char] = masks.get(char, 0) | (1 << i)
+    return masks
+
+def prefix_distance(masks, length, word, max_distance):
+    """ Get the edit distance between a pattern and the closest prefix of word
+
+    masks and length describe the pattern (see pattern_bitmasks()). This is
+    Myers' bit-parallel algorithm in its global variant, where the score after
+    j characters is the distance between the pattern and word[:j]. The result
+    is only exact when it is <= max_distance.
+    """
+    full = (1 << length) - 1
+    high = 1 << (length - 1)
+    pv = full
+    mv = 0
+    score = best = length
+    for char in word[:length + max_distance]:
+        eq = masks.get(char, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & high:
+            score += 1
+        elif mh & high:
+            score -= 1
+            if score < best:
+                best = score
+                if best == 0:
+                    break
+        ph = ((ph << 1) | 1) & full
+        mh = (mh << 1) & full
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+    return best
+
+def within_one_edit(pattern, word):
+    """ Whether word starts with something at most one edit away from pattern """
+    if word.startswith(pattern):
+        return True
+    # a single edit can always be made at the first difference
+    i = 0
+    while i < len(word) and pattern[i] == word[i]:
+        i += 1
+    return (word.startswith(pattern[i + 1:], i + 1) or   # substitution
+            word.startswith(pattern[i:], i + 1) or       # insertion
+            word.startswith(pattern[i + 1:], i))         # deletion
+
+def is_subsequence(pattern, word):
+    pos = 0
+    for char in pattern:
+        pos = word.find(char, pos) + 1
+        if pos == 0:
+            return False
+    return True
+
+def subsequence_regex(pattern):
+    """ Get a regular expression that matches the words that start with the
+    first character of pattern and contain the others in order """
+    # [^c]*c finds the next c without backtracking over earlier characters
+    parts = [re.escape(pattern[0])]
+    for char in pattern[1:]:
+        char = re.escape(char)
+        parts.append('[^%s]*%s' % (char, char))
+    return re.compile(''.join(parts), re.DOTALL)
+
+class FuzzyIndex(object):
+    """ Words indexed for fuzzy matching, with their counts and last use """
+
+    def __init__(self):
+        self.word_ids = {}
+        self.words = []
+        self.sorted_words = []
+        # words that aren't in sorted_words yet
+        self._unsorted_words = []
+        self.counts = array('l')
+        self.last_used = array('l')
+        self.live = 0
+        self.clock = 0
+        self.max_count = 0
+        # bytes of the words and their ids, and number of word ids in
+        # the postings, for memory_usage()
+        self._word_bytes = 0
+        self._posting_count = 0
+        # (position, bigram) -> ids of the words that have bigram at position
+        self._bigram_postings = {}
+        # (first character, other character) -> ids of the words that start
+        # with the first character and contain the other one after it
+        self._initial_postings = {}
+
+    def add(self, word, count=1):
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = len(self.words)
+            self.word_ids[word] = word_id
+            self.words.append(word)
+            self._unsorted_words.append(word)
+            self.counts.append(0)
+            self.last_used.append(0)
+            self._word_bytes += sys.getsizeof(word) + sys.getsizeof(word_id)
+            bigrams = positional_bigrams(word[:PREFIX_LENGTH])
+            for key in bigrams:
+                self._bigram_postings.setdefault(key, array('l')).append(word_id)
+            chars = set(word[1:])
+            for char in chars:
+                self._initial_postings.setdefault((word[0], char), array('l')).append(word_id)
+            self._posting_count += len(bigrams) + len(chars)
+        if self.counts[word_id] <= 0:
+            self.live += 1
+        self.counts[word_id] += count
+        self.max_count = max(self.max_count, self.counts[word_id])
+
+    def remove(self, word, count=1):
+        word_id = self.word_ids.get(word)
+        if word_id is None or self.counts[word_id] <= 0:
+            return
+        self.counts[word_id] = max(0, self.counts[word_id] - count)
+        if self.counts[word_id] == 0:
+            self.live -= 1
+            # forget the removed words once they make up most of the index
+            if len(self.words) > 1024 and self.live < len(self.words) // 4:
+                self._compact()
+
+    def _compact(self):
+        old = [(word, self.counts[i], self.last_used[i]) for i, word in enumerate(self.words)]
+        clock = self.clock
+        self.__init__()
+        self.clock = clock
+        for word, count, last_used in old:
+            if count > 0:
+                self.add(word, count)
+                self.last_used[self.word_ids[word]] = last_used
+
+    def memory_usage(self):
+        """ Get an estimate of the number of bytes taken by the index, without
+        walking it """
+        containers = [self.word_ids, self.words, self.sorted_words, self._unsorted_words,
+                      self.counts, self.last_used,
+                      self._bigram_postings, self._initial_postings]
+        # the keys are (position, bigram) and (character, character)
+        bigram_key = sys.getsizeof((0, u'ab')) + sys.getsizeof(u'ab')
+        initial_key = sys.getsizeof((u'a', u'b'))
+        posting_list = sys.getsizeof(array('l'))
+        return (sum(sys.getsizeof(container) for container in containers) + self._word_bytes +
+                len(self._bigram_postings) * (bigram_key + posting_list) +
+                len(self._initial_postings) * (initial_key + posting_list) +
+                self._posting_count * self.counts.itemsize)
+
+    def touch(self, word):
+        """ Mark word as just used """
+        word_id = self.word_ids.get(word)
+        if word_id is not None:
+            self.clock += 1
+            self.last_used[word_id] = self.clock
+
+    def score(self, word_id, quality):
+        """ Get the ranking score of a match """
+        count = self.counts[word_id]
+        score = quality + FREQUENCY_WEIGHT * math.log(1 + count) / math.log(2 + self.max_count)
+        if self.last_used[word_id]:
+            score += RECENCY_WEIGHT / (1 + self.clock - self.last_used[word_id])
+        return score
+
+    def _exact_candidates(self, pattern):
+        # inserting every word into the sorted list would shift the list each
+        # time, so new words are merged in bulk
+        if len(self._unsorted_words) > MAX_UNSORTED_WORDS:
+            self.sorted_words.extend(self._unsorted_words)
+            self.sorted_words.sort()
+            self._unsorted_words = []
+        start = bisect.bisect_left(self.sorted_words, pattern)
+        end = bisect.bisect_left(self.sorted_words, pattern + u'\U0010ffff', start)
+        word_ids = self.word_ids
+        candidates = [word_ids[word] for word in self.sorted_words[start:end]]
+        candidates.extend(word_ids[word] for word in self._unsorted_words if word.startswith(pattern))
+        return candidates
+
+    def _one_edit_candidates(self, pattern):
+        # a typo in the first characters of pattern is also a typo in the
+        # indexed part of the word, which has bigrams up to PREFIX_LENGTH - 2
+        pattern = pattern[:PREFIX_LENGTH - 1]
+        last = len(pattern) - 2
+        postings = self._bigram_postings
+        first_bigram = postings.get((0, pattern[:2]), ())
+        # the edit is after the first three characters
+        candidates = set(first_bigram).intersection(postings.get((1, pattern[1:3]), ()))
+        # the edit is before the last three characters, which are shifted by
+        # at most one position
+        last_bigrams = []
+        for position in (last - 1, last, last + 1):
+            last_bigram = postings.get((position, pattern[last:]), ())
+            last_bigrams.append(last_bigram)
+            candidates.update(set(last_bigram).intersection(postings.get((position - 1, pattern[last - 1:last + 1]), ())))
+        # in short patterns, the edit can also be at a character that is
+        # part of neither three
+        if len(pattern) == 5:
+            candidates.update(set(first_bigram).intersection(chain.from_iterable(last_bigrams)))
+        elif len(pattern) == 4:
+            candidates.update(first_bigram)
+            words = self.words
+            candidates.update(word_id for word_id in chain.from_iterable(last_bigrams)
+                              if words[word_id][0] == pattern[0])
+        return candidates
+
+    def _typo_candidates(self, pattern, max_distance):
+        # bigrams can shift by max_distance, and have to stay in the indexed part
+        pattern_bigrams = positional_bigrams(pattern[:PREFIX_LENGTH - max_distance])
+        threshold = len(pattern_bigrams) - 2 * max_distance
+        if threshold < 1:
+            return ()
+        postings = []
+        for position, bigram in pattern_bigrams:
+            for shifted in range(max(0, position - max_distance), position + max_distance + 1):
+                postings.append(self._bigram_postings.get((shifted, bigram), ()))
+        hits = Counter(chain.from_iterable(postings))
+        return [word_id for word_id, n in hits.items() if n >= threshold]
+
+    def _subsequence_candidates(self, pattern):
+        if len(pattern) < 2:
+            # only the exact matches are subsequences
+            return ()
+        buckets = [self._initial_postings.get((pattern[0], char), ()) for char in set(pattern[1:])]
+        buckets.sort(key=len)
+        candidates = set(buckets[0])
+        for bucket in buckets[1:]:
+            candidates.intersection_update(bucket)
+        return candidates
+
+    def match(self, pattern, k=10, max_distance=1):
+        """ Get the k best (word, quality) matches of pattern, best first
+
+        quality is EXACT, TYPO or SUBSEQUENCE. pattern itself is never returned.
+        """
+        length = len(pattern)
+        if length == 0 or length > MAX_PATTERN_LENGTH:
+            return []
+        words = self.words
+        counts = self.counts
+        found = {}
+        for word_id in self._exact_candidates(pattern):
+            if counts[word_id] > 0 and words[word_id] != pattern:
+                found[word_id] = EXACT
+        if len(found) < k and length >= MIN_TYPO_LENGTH and max_distance == 1:
+            for word_id in self._one_edit_candidates(pattern):
+                if word_id not in found and counts[word_id] > 0 and words[word_id] != pattern:
+                    if within_one_edit(pattern, words[word_id]):
+                        found[word_id] = TYPO
+        elif len(found) < k and length >= MIN_TYPO_LENGTH and max_distance > 1:
+            masks = pattern_bitmasks(pattern)
+            for word_id in self._typo_candidates(pattern, max_distance):
+                if word_id not in found and counts[word_id] > 0 and words[word_id] != pattern:
+                    if prefix_distance(masks, length, words[word_id], max_distance) <= max_distance:
+                        found[word_id] = TYPO
+        if len(found) < k:
+            is_match = subsequence_regex(pattern).match
+            for word_id in self._subsequence_candidates(pattern):
+                if word_id not in found and counts[word_id] > 0 and words[word_id] != pattern:
+                    if is_match(words[word_id]):
+                        found[word_id] = SUBSEQUENCE
+        best = heapq.nlargest(k, found.items(), key=lambda item: (self.score(*item), words[item[0]]))
+        return [(words[word_id], quality) for word_id, quality in best]
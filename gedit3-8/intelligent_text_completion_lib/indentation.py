@@ -0,0 +1,163 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Detection of the indentation style of a document from a sample of lines.
+
+The sample is a fixed number of windows of consecutive lines, spread evenly
+over the document, so detection takes the same time for any document size.
+Consecutive lines are needed to see by how much the indentation grows.
+
+The detected style is also used to re-indent pasted text.
+"""
+
+from .blocks import LINE_BREAK_RE
+from .lineindex import parse_line
+
+SAMPLE_WINDOWS = 32
+WINDOW_SIZE = 8
+# only the start of a line is needed to know its indentation
+MAX_SAMPLE_LINE_LENGTH = 120
+INDENT_WIDTHS = (2, 3, 4, 8)
+# line endings that open a block, besides braces and keywords
+BLOCK_OPENER_ENDINGS = (':', '(', '[')
+
+def sample_windows(line_count, windows=SAMPLE_WINDOWS, size=WINDOW_SIZE):
+    """ Get (first line, end line) ranges of the lines to sample """
+    if line_count <= windows * size:
+        return [(0, line_count)]
+    step = line_count // windows
+    return [(i * step, i * step + size) for i in range(windows)]
+
+def leading_whitespace(line):
+    return line[:len(line) - len(line.lstrip(' \t'))]
+
+def detect_indentation(windows):
+    """ Detect the indentation style of the given windows of lines
+
+    Returns (use_spaces, width), where width is the number of spaces per
+    indentation level (None when using tabs), or None if the lines don't
+    tell.
+    """
+    tab_lines = 0
+    space_lines = 0
+    deltas = {}
+    smallest = None
+    for lines in windows:
+        previous = None
+        for line in lines:
+            whitespace = leading_whitespace(line)
+            content = line[len(whitespace):]
+            if not content.strip():
+                continue
+            if whitespace.startswith('\t'):
+                tab_lines += 1
+                previous = None
+                continue
+            if whitespace == ' ' and content.startswith('*'):
+                # continuation of a /* */ comment
+                continue
+            width = len(whitespace)
+            if width:
+                space_lines += 1
+                if smallest is None or width < smallest:
+                    smallest = width
+            if previous is not None and width > previous:
+                delta = width - previous
+                deltas[delta] = deltas.get(delta, 0) + 1
+            previous = width
+    if tab_lines == 0 and space_lines == 0:
+        return None
+    if tab_lines > space_lines:
+        return (False, None)
+    votes = [(deltas.get(width, 0), -width) for width in INDENT_WIDTHS]
+    count, width = max(votes)
+    if count:
+        return (True, -width)
+    return (True, smallest if smallest in INDENT_WIDTHS else INDENT_WIDTHS[-2])
+
+def whitespace_conflicts(text, style):
+    """ Check whether inserting text at the start of a line could change style """
+    if style is None:
+        return True
+    use_spaces, width = style
+    if use_spaces:
+        return '\t' in text
+    return '  ' in text
+
+def opens_block(line):
+    """ Check whether the lines after line are nested in it """
+    if line.rstrip().endswith(BLOCK_OPENER_ENDINGS):
+        return True
+    indent, brace_delta, brace_low, keyword_delta, keyword_low = parse_line(line)
+    return brace_delta > 0 or keyword_delta > 0
+
+def reindent_text(text, preceding_line, tab_string, tab_width):
+    """ Re-base pasted text on the indentation of the line it is pasted in
+
+    preceding_line is the text in front of the cursor. The indentation that
+    all lines of text have in common is replaced by the indentation of that
+    line, and the levels of indentation in text are converted to tab_string,
+    the indentation of the document. The first line goes after the cursor,
+    so it keeps no indentation unless only whitespace is in front of the
+    cursor. Line breaks are kept.
+
+    A first line without indentation is left out of the common indentation
+    when it doesn't open a block: then it was probably copied from the middle
+    of a line, and the indentation of the lines below it is the one to
+    replace.
+    """
+    parts = LINE_BREAK_RE.split(text)
+    lines = parts[0::2]
+    # measure the indentation of every line and the smallest one in a
+    # single scan; blank lines don't count
+    columns = []
+    common = None
+    for i, line in enumerate(lines):
+        rest = line.lstrip(' \t')
+        if not rest:
+            columns.append(None)
+            continue
+        column = 0
+        for char in line[:len(line) - len(rest)]:
+            if char == '\t':
+                column += tab_width - column % tab_width
+            else:
+                column += 1
+        columns.append(column)
+        if i == 0 and not column and not opens_block(line):
+            continue
+        if common is None or column < common:
+            common = column
+    if common is None:
+        common = 0
+    # width of one indentation level in the pasted text
+    style = detect_indentation([lines[first:end] for first, end in sample_windows(len(lines))])
+    level_width = style[1] if style is not None and style[0] else tab_width
+    base = leading_whitespace(preceding_line)
+    at_line_start = len(base) == len(preceding_line)
+    result = []
+    for i, line in enumerate(lines):
+        column = columns[i]
+        if column is None:
+            new_line = ''
+        else:
+            levels, spaces = divmod(max(column - common, 0), level_width)
+            new_line = tab_string * levels + ' ' * spaces + line.lstrip(' \t')
+            if i == 0:
+                if not at_line_start:
+                    new_line = line.lstrip(' \t')
+            else:
+                new_line = base + new_line
+        result.append(new_line)
+        if 2 * i + 1 < len(parts):
+            result.append(parts[2 * i + 1])
+    return ''.join(result)
@@ -0,0 +1,211 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Per-line indentation and block nesting of a document.
+
+For every line, the index stores the length of its leading whitespace and,
+for braces and for block keywords (if/fi, do/done, def/end, ...), how much the
+line changes the nesting depth (delta) and how far the depth drops below
+the depth at its start (low, <= 0).
+
+Lines are stored in blocks of array columns, and every block keeps the sum of
+its deltas and the lowest depth reached in it. Finding the line that opened
+the block around a line can skip whole blocks, so it doesn't need to look at
+every line in between.
+"""
+
+import re
+from array import array
+
+from .blocks import LINE_BREAK_RE
+
+BRACES = 0
+KEYWORDS = 1
+
+BLOCK_SIZE = 512
+
+# columns of a row
+INDENT = 0
+_DELTA = (1, 3)
+_LOW = (2, 4)
+COLUMN_COUNT = 5
+# bytes taken by the row of a line
+ROW_BYTES = COLUMN_COUNT * array('i').itemsize
+
+STRING_RE = re.compile(r'"(?:\\.|[^"\\])*"|\'(?:\\.|[^\'\\])*\'')
+KEYWORD_RE = re.compile(r'\b(if|case|do|def|class|module|begin|function|fi|esac|done|end)\b')
+# keywords that only open a block as the first word of a line
+LEADING_OPENERS = frozenset(['if', 'case', 'def', 'class', 'module'])
+# keywords that open a block anywhere, unless a rule pack says otherwise
+OPENERS = frozenset(['do', 'begin', 'function'])
+CLOSERS = frozenset(['fi', 'esac', 'done', 'end'])
+
+def completed_closer(preceding_line, typed_char):
+    """ Get the keyword that closes a block when preceding_line holds only
+    that keyword and typed_char ends it, or None. A keyword isn't complete
+    while more word characters may follow, as in find or endpoint. """
+    keyword = preceding_line.lstrip(' \t')
+    if keyword in CLOSERS and typed_char and not (typed_char.isalnum() or typed_char == '_'):
+        return keyword
+    return None
+
+def split_lines(text):
+    """ Split text where GtkTextBuffer starts a new line """
+    # the line breaks are at the odd indexes
+    return LINE_BREAK_RE.split(text)[0::2]
+
+def _delta_and_low(changes):
+    depth = low = 0
+    for change in changes:
+        depth += change
+        if depth < low:
+            low = depth
+    return depth, low
+
+def parse_line(line, openers=OPENERS):
+    """ Get the row of the index for line """
+    stripped = line.lstrip(' \t')
+    code = stripped
+    if '"' in code or "'" in code:
+        code = STRING_RE.sub('', code)
+    opening = code.count('{')
+    closing = code.count('}')
+    if not closing:
+        brace_delta, brace_low = opening, 0
+    elif not opening:
+        brace_delta, brace_low = -closing, -closing
+    else:
+        brace_delta, brace_low = _delta_and_low(
+            1 if char == '{' else -1 for char in code if char == '{' or char == '}'
+        )
+    keywords = []
+    for m in KEYWORD_RE.finditer(code):
+        word = m.group(1)
+        if word in CLOSERS:
+            keywords.append(-1)
+        elif word in openers or (word in LEADING_OPENERS and m.start() == 0):
+            keywords.append(1)
+    keyword_delta, keyword_low = _delta_and_low(keywords)
+    return (len(line) - len(stripped), brace_delta, brace_low, keyword_delta, keyword_low)
+
+class _Block(object):
+    __slots__ = ('columns', 'sums', 'lows')
+
+    def __init__(self, rows):
+        self.columns = [array('i', [row[i] for row in rows]) for i in range(COLUMN_COUNT)]
+        self.update()
+
+    def __len__(self):
+        return len(self.columns[INDENT])
+
+    def update(self):
+        """ Recompute the sums and lows of both channels """
+        self.sums = []
+        self.lows = []
+        for channel in (BRACES, KEYWORDS):
+            deltas = self.columns[_DELTA[channel]]
+            line_lows = self.columns[_LOW[channel]]
+            depth = low = 0
+            for delta, line_low in zip(deltas, line_lows):
+                if depth + line_low < low:
+                    low = depth + line_low
+                depth += delta
+            self.sums.append(depth)
+            self.lows.append(low)
+
+    def rows(self, start=0, end=None):
+        return list(zip(*[column[start:end] for column in self.columns]))
+
+class LineIndex(object):
+    """ Indentation and nesting of every line of a document """
+
+    def __init__(self, text='', openers=OPENERS):
+        self.blocks = []
+        self.openers = openers
+        self._append_rows([parse_line(line, openers) for line in split_lines(text)])
+
+    def _append_rows(self, rows):
+        for start in range(0, len(rows), BLOCK_SIZE):
+            self.blocks.append(_Block(rows[start:start + BLOCK_SIZE]))
+
+    def __len__(self):
+        return sum(len(block) for block in self.blocks)
+
+    def _locate(self, line):
+        """ Get (block index, line offset in block) of line """
+        for i, block in enumerate(self.blocks):
+            if line < len(block):
+                return i, line
+            line -= len(block)
+        raise IndexError(line)
+
+    def replace_lines(self, first_line, count, lines):
+        """ Replace count rows starting at first_line by the rows of lines """
+        new_rows = [parse_line(line, self.openers) for line in lines]
+        i, offset = self._locate(first_line)
+        # collect the affected blocks, and the rows around the replaced ones
+        rows = self.blocks[i].rows(0, offset)
+        end = i
+        remaining = offset + count
+        while end < len(self.blocks) and remaining >= len(self.blocks[end]):
+            remaining -= len(self.blocks[end])
+            end += 1
+        tail = self.blocks[end].rows(remaining) if end < len(self.blocks) else []
+        rows = rows + new_rows + tail
+        replacement = []
+        for start in range(0, len(rows), BLOCK_SIZE):
+            replacement.append(_Block(rows[start:start + BLOCK_SIZE]))
+        self.blocks[i:end + 1] = replacement
+        if not self.blocks:
+            # a document always has a line
+            self._append_rows([parse_line('')])
+
+    def indent(self, line):
+        """ Get the length of the leading whitespace of line """
+        i, offset = self._locate(line)
+        return self.blocks[i].columns[INDENT][offset]
+
+    def find_opener(self, line, channel=BRACES):
+        """ Get the line that opened the innermost block around the start of line
+
+        Returns None if line is not inside a block.
+        """
+        i, offset = self._locate(line)
+        # depth at the start of line, relative to the start of the document
+        depth = sum(block.sums[channel] for block in self.blocks[:i])
+        block = self.blocks[i]
+        deltas = block.columns[_DELTA[channel]]
+        line_lows = block.columns[_LOW[channel]]
+        depth += sum(deltas[:offset])
+        target = depth
+        if target <= 0:
+            return None
+        # walk back through the lines before line in its block
+        for j in range(offset - 1, -1, -1):
+            depth -= deltas[j]
+            if depth + line_lows[j] < target:
+                return line - offset + j
+        line -= offset
+        # skip the blocks that don't drop below the target depth
+        for k in range(i - 1, -1, -1):
+            block = self.blocks[k]
+            depth -= block.sums[channel]
+            line -= len(block)
+            if depth + block.lows[channel] < target:
+                deltas = block.columns[_DELTA[channel]]
+                line_lows = block.columns[_LOW[channel]]
+                block_depth = depth + block.sums[channel]
+                for j in range(len(block) - 1, -1, -1):
+                    block_depth -= deltas[j]
+                    if block_depth + line_lows[j] < target:
+                        return line + j
+        return None
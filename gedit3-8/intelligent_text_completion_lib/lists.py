@@ -0,0 +1,269 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Numbered lists: 1. 2. 3., a) b) c), i. ii. iii. and their upper case forms.
+
+A list block is a run of items with the same indentation and delimiter.
+Lines between the items that are indented deeper than the items (the rest of
+a long item, or a nested list) belong to the block too. A lettered list
+starts at a or A: other letters at the start of a line are more likely
+initials, like in "D. Brown".
+
+Blocks that were found are cached per document in a blocks.BlockCache, so
+renumbering the items after a new item doesn't have to search for the start
+of the list again.
+"""
+
+import re
+from bisect import bisect_right
+
+from .blocks import LINE_BREAK_RE
+
+ITEM_RE = re.compile(r'([ \t]*)(\d{1,9}|[ivxlcdm]+|[IVXLCDM]+|[a-zA-Z])([.)])[ \t]')
+
+DECIMAL = 'decimal'
+ALPHA = 'alpha'
+ROMAN = 'roman'
+
+ROMAN_NUMERALS = [
+    (1000, 'm'), (900, 'cm'), (500, 'd'), (400, 'cd'), (100, 'c'), (90, 'xc'),
+    (50, 'l'), (40, 'xl'), (10, 'x'), (9, 'ix'), (5, 'v'), (4, 'iv'), (1, 'i'),
+]
+ROMAN_DIGITS = {'i': 1, 'v': 5, 'x': 10, 'l': 50, 'c': 100, 'd': 500, 'm': 1000}
+
+def parse_item(line):
+    """ Get (indent, label, delimiter) of a numbered list item, or None """
+    m = ITEM_RE.match(line)
+    if m is None:
+        return None
+    return m.groups()
+
+def guess_style(label):
+    """ Get the style of the first label of a list: i is a roman one, other
+    single letters are alphabetic """
+    if label.isdigit():
+        return DECIMAL
+    if len(label) == 1 and label not in 'iI':
+        return ALPHA
+    return ROMAN
+
+def label_value(label, style):
+    """ Get the number of label in style, or None if it isn't one """
+    if style == DECIMAL:
+        return int(label) if label.isdigit() else None
+    if style == ALPHA:
+        if len(label) != 1 or not label.isalpha():
+            return None
+        return ord(label.lower()) - ord('a') + 1
+    value = 0
+    previous = 0
+    for char in reversed(label.lower()):
+        digit = ROMAN_DIGITS.get(char)
+        if digit is None:
+            return None
+        if digit < previous:
+            value -= digit
+        else:
+            value += digit
+            previous = digit
+    if value <= 0 or format_label(value, style, False) != label.lower():
+        return None
+    return value
+
+def format_label(value, style, upper):
+    """ Get the label of number value in style """
+    if style == DECIMAL:
+        return str(value)
+    if style == ALPHA:
+        label = chr(ord('a') + (value - 1) % 26)
+    else:
+        numerals = []
+        for numeral_value, numeral in ROMAN_NUMERALS:
+            while value >= numeral_value:
+                numerals.append(numeral)
+                value -= numeral_value
+        label = ''.join(numerals)
+    return label.upper() if upper else label
+
+class ListBlock(object):
+    """ The items of a numbered list """
+
+    def __init__(self, first_line, indent, delimiter, style, upper, start):
+        self.first_line = first_line
+        self.indent = indent
+        self.delimiter = delimiter
+        self.style = style
+        self.upper = upper
+        # number of the first item
+        self.start = start
+        # lines of the items, relative to first_line
+        self.items = []
+        # labels of the items as they are in the text
+        self.labels = []
+        # last line of the block, relative to first_line
+        self.length = 0
+        # lines that changed in place since the block was read, relative to
+        # first_line
+        self.dirty = set()
+
+    @property
+    def last_line(self):
+        return self.first_line + self.length
+
+    def item_index(self, line):
+        """ Get the index of the item that line belongs to """
+        return bisect_right(self.items, line - self.first_line) - 1
+
+    def label(self, index):
+        """ Get the label the item at index should have """
+        return format_label(self.start + index, self.style, self.upper)
+
+    def item_prefix(self, index):
+        return self.indent + self.label(index) + self.delimiter
+
+    def matches(self, item):
+        """ Check whether the parsed item belongs to this list """
+        indent, label, delimiter = item
+        return (indent == self.indent and delimiter == self.delimiter and
+                label_value(label, self.style) is not None)
+
+    def insert_item(self, index, line):
+        """ Add an item at index on the new line (relative to first_line)
+        before the line of the item that is now at index """
+        self.items.insert(index, line)
+        self.labels.insert(index, self.label(index))
+        for i in range(index + 1, len(self.items)):
+            self.items[i] += 1
+        self.length += 1
+
+    def lines_replaced(self, first_line, old_count, new_count):
+        """ Lines of the block changed in place: check them again later """
+        if old_count != new_count:
+            return False
+        self.dirty.update(range(first_line - self.first_line, first_line - self.first_line + old_count))
+        return True
+
+    def refresh(self, get_line):
+        """ Parse the dirty lines again, reading them with get_line(line).
+        Returns False if one of them isn't what it was: an item with the same
+        label, or a line that continues an item. Other labels can change
+        where the list starts and ends. """
+        for line in sorted(self.dirty):
+            text = get_line(self.first_line + line)
+            item = parse_item(text)
+            index = bisect_right(self.items, line) - 1
+            if index >= 0 and self.items[index] == line:
+                if item is None or not self.matches(item) or item[1] != self.labels[index]:
+                    return False
+            elif (item is not None and self.matches(item)) or not _is_continuation(text, self.indent):
+                return False
+        self.dirty = set()
+        return True
+
+    def remove_item(self, index):
+        """ Remove the item at index, keeping its line """
+        del self.items[index]
+        del self.labels[index]
+
+def _is_continuation(line, indent):
+    return len(line) > len(indent) and line.startswith(indent) and line[len(indent)] in ' \t' and line.strip()
+
+def find_block(get_line, line_count, line):
+    """ Get the ListBlock with the item on line, reading the lines with
+    get_line(line), or None if line isn't an item """
+    item = parse_item(get_line(line))
+    if item is None:
+        return None
+    indent, label, delimiter = item
+    # find the first item with the same indentation and delimiter
+    first_line = line
+    top = line
+    while top > 0:
+        text = get_line(top - 1)
+        above = parse_item(text)
+        if above is not None and above[0] == indent and above[2] == delimiter:
+            top -= 1
+            first_line = top
+        elif _is_continuation(text, indent):
+            top -= 1
+        else:
+            break
+    # the labels above may belong to other lists, like h. after i. ii. iii.
+    while True:
+        block = _read_block(get_line, line_count, first_line, label)
+        if block.style == ALPHA and block.start != 1:
+            # the first label isn't the start of a list
+            if first_line == line:
+                return None
+            first_line += 1
+        elif line <= block.last_line:
+            return block
+        else:
+            first_line = block.last_line + 1
+        while first_line < line and parse_item(get_line(first_line)) is None:
+            first_line += 1
+
+def _read_block(get_line, line_count, first_line, label):
+    indent, first_label, delimiter = parse_item(get_line(first_line))
+    style = guess_style(first_label)
+    if style == ALPHA and label_value(label, style) is None:
+        # a roman list that starts at v, x, l, c, d or m
+        style = ROMAN
+    start = label_value(first_label, style)
+    block = ListBlock(first_line, indent, delimiter, style, first_label.isupper(), start)
+    current = first_line
+    while current < line_count:
+        text = get_line(current)
+        item = parse_item(text)
+        if item is not None and block.matches(item):
+            block.items.append(current - first_line)
+            block.labels.append(item[1])
+        elif current == first_line or not _is_continuation(text, indent):
+            break
+        block.length = current - first_line
+        current += 1
+    if not block.items:
+        # the first label isn't valid in the style of line
+        block.style = guess_style(first_label)
+        block.start = label_value(first_label, block.style)
+        block.items.append(0)
+        block.labels.append(first_label)
+    return block
+
+def renumber_text(block, text, first_index):
+    """ Relabel the items from first_index on.
+
+    text are the lines of the block from the item at first_index to the end
+    of the block. The labels of block are set to the new ones. Returns
+    (first, last, new_text) with the range of lines in text that changes and
+    the new text of those lines, or None if all labels are right.
+    """
+    parts = LINE_BREAK_RE.split(text)
+    base = block.items[first_index]
+    first = last = None
+    for index in range(first_index, len(block.items)):
+        i = block.items[index] - base
+        line = parts[2 * i]
+        item = parse_item(line)
+        if item is None:
+            continue
+        indent, label, delimiter = item
+        new_label = block.label(index)
+        if label != new_label:
+            parts[2 * i] = indent + new_label + line[len(indent) + len(label):]
+            block.labels[index] = new_label
+            if first is None:
+                first = i
+            last = i
+    if first is None:
+        return None
+    return first, last, ''.join(parts[2 * first:2 * last + 1])
@@ -0,0 +1,295 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Bigram and trigram counts for next-word prediction.
+
+Words are interned into ids. A bigram is stored as (context, word) with the
+id of its first word as context, and a trigram with the id of the bigram of
+its first two words as context, so every column fits in 32 bits. Each order
+has a table of entries in array columns, indexed by entry id, and a small
+open-addressing table of entry ids to find an entry by (context, word).
+Entries with the same context are chained, starting at the head of their
+context, so that the followers of a context are listed without a scan.
+
+Entries and words whose count drops to 0 stay until there are more of them
+than live ones; then the whole model is rebuilt without them.
+"""
+
+import heapq
+import sys
+from array import array
+
+from .words import WORD_RE
+
+EMPTY = -1
+MIN_CAPACITY = 1024
+# the entry tables are kept at most this full
+MAX_LOAD = 0.75
+MAX_COUNT = 2 ** 32 - 1
+
+class NgramTable(object):
+    """ Counts of the n-grams of a single order, in 32-bit columns """
+
+    def __init__(self):
+        # entry columns
+        self.contexts = array('I')
+        self.words = array('I')
+        self.counts = array('I')
+        self.next = array('i')
+        # context -> first entry with that context
+        self.heads = array('i')
+        self.live = 0
+        self._allocate(MIN_CAPACITY)
+
+    def _allocate(self, capacity):
+        self.mask = capacity - 1
+        self.slots = array('i', [EMPTY]) * capacity
+
+    def __len__(self):
+        return len(self.counts)
+
+    def _probe(self, context, word):
+        """ Get the slot of (context, word), or the empty slot to put it in """
+        slots = self.slots
+        contexts = self.contexts
+        words = self.words
+        mask = self.mask
+        slot = hash((context, word)) & mask
+        while True:
+            entry = slots[slot]
+            if entry == EMPTY or (contexts[entry] == context and words[entry] == word):
+                return slot
+            slot = (slot + 1) & mask
+
+    def find(self, context, word):
+        """ Get the entry of (context, word), or EMPTY """
+        return self.slots[self._probe(context, word)]
+
+    def add(self, context, word, count=1):
+        """ Add count (which may be negative) to (context, word) and get its
+        entry, or EMPTY if it isn't there and count isn't positive """
+        # _probe(), inlined since this runs for every n-gram of a text
+        slots = self.slots
+        contexts = self.contexts
+        words = self.words
+        mask = self.mask
+        slot = hash((context, word)) & mask
+        while True:
+            entry = slots[slot]
+            if entry == EMPTY or (contexts[entry] == context and words[entry] == word):
+                break
+            slot = (slot + 1) & mask
+        if entry == EMPTY:
+            if count <= 0:
+                return EMPTY
+            entry = self._insert(slot, context, word)
+        old_count = self.counts[entry]
+        new_count = min(MAX_COUNT, max(0, old_count + count))
+        self.counts[entry] = new_count
+        if not old_count and new_count:
+            self.live += 1
+        elif old_count and not new_count:
+            self.live -= 1
+        return entry
+
+    def _insert(self, slot, context, word):
+        entry = len(self.counts)
+        if entry + 1 > MAX_LOAD * len(self.slots):
+            self._allocate(2 * len(self.slots))
+            for old_entry in range(entry):
+                self.slots[self._probe(self.contexts[old_entry], self.words[old_entry])] = old_entry
+            slot = self._probe(context, word)
+        self.slots[slot] = entry
+        self.contexts.append(context)
+        self.words.append(word)
+        self.counts.append(0)
+        heads = self.heads
+        if context >= len(heads):
+            heads.extend(array('i', [EMPTY]) * (context + 1 - len(heads)))
+        self.next.append(heads[context])
+        heads[context] = entry
+        return entry
+
+    def memory_usage(self):
+        """ Get the number of bytes taken by the table """
+        return sum(sys.getsizeof(column) for column in
+                   (self.contexts, self.words, self.counts, self.next, self.heads, self.slots))
+
+    def count(self, context, word):
+        entry = self.find(context, word)
+        return self.counts[entry] if entry != EMPTY else 0
+
+    def followers(self, context):
+        """ Iterate over (word id, count) of the entries with the given context """
+        if context >= len(self.heads):
+            return
+        words = self.words
+        counts = self.counts
+        next = self.next
+        entry = self.heads[context]
+        while entry != EMPTY:
+            if counts[entry]:
+                yield words[entry], counts[entry]
+            entry = next[entry]
+
+class NgramModel(object):
+    """ Bigram up to max_order-gram counts of words on the same line """
+
+    def __init__(self, max_order=3):
+        self.word_ids = {}
+        self.words = []
+        self.word_counts = array('I')
+        self.live_words = 0
+        # bytes of the interned words, for memory_usage()
+        self.word_bytes = 0
+        # tables of order 2 to max_order
+        self.tables = [NgramTable() for n in range(2, max_order + 1)]
+
+    def _intern(self, word):
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = len(self.words)
+            self.word_ids[word] = word_id
+            self.words.append(word)
+            self.word_counts.append(0)
+            self.word_bytes += sys.getsizeof(word)
+        return word_id
+
+    def _add_word(self, word_id, count):
+        old_count = self.word_counts[word_id]
+        new_count = min(MAX_COUNT, max(0, old_count + count))
+        self.word_counts[word_id] = new_count
+        if not old_count and new_count:
+            self.live_words += 1
+        elif old_count and not new_count:
+            self.live_words -= 1
+
+    def add_text(self, text, count=1):
+        """ Count the n-grams of every line in text """
+        if count > 0:
+            get_id = self._intern
+        else:
+            get_id = self.word_ids.get
+        add_word = self._add_word
+        tables = self.tables
+        for line in text.splitlines():
+            ids = [get_id(word) for word in WORD_RE.findall(line)]
+            for word_id in ids:
+                if word_id is not None:
+                    add_word(word_id, count)
+            # the contexts of the n-grams of the next order
+            contexts = ids
+            for n, table in enumerate(tables, 2):
+                add = table.add
+                entries = []
+                for i in range(len(ids) - n + 1):
+                    context = contexts[i]
+                    word_id = ids[i + n - 1]
+                    if context is None or context == EMPTY or word_id is None:
+                        entries.append(None)
+                    else:
+                        entries.append(add(context, word_id, count))
+                contexts = entries
+        if count < 0:
+            self._maybe_compact()
+
+    def remove_text(self, text):
+        """ Uncount the n-grams of every line in text """
+        self.add_text(text, -1)
+
+    def _maybe_compact(self):
+        dead_words = len(self.words) - self.live_words
+        dead = dead_words > max(MIN_CAPACITY, self.live_words)
+        for table in self.tables:
+            if len(table) - table.live > max(MIN_CAPACITY, table.live):
+                dead = True
+        if dead:
+            self.compact()
+
+    def compact(self):
+        """ Rebuild the model without the words and n-grams whose count is 0 """
+        word_map = array('i', [EMPTY]) * len(self.words)
+        words = []
+        word_counts = array('I')
+        for word_id, count in enumerate(self.word_counts):
+            if count:
+                word_map[word_id] = len(words)
+                words.append(self.words[word_id])
+                word_counts.append(count)
+        context_map = word_map
+        tables = []
+        for old in self.tables:
+            table = NgramTable()
+            entry_map = array('i', [EMPTY]) * len(old)
+            old_contexts = old.contexts
+            old_words = old.words
+            for entry, count in enumerate(old.counts):
+                if count:
+                    context = context_map[old_contexts[entry]]
+                    word_id = word_map[old_words[entry]]
+                    if context != EMPTY and word_id != EMPTY:
+                        entry_map[entry] = table.add(context, word_id, count)
+            tables.append(table)
+            context_map = entry_map
+        self.words = words
+        self.word_ids = dict((word, word_id) for word_id, word in enumerate(words))
+        self.word_counts = word_counts
+        self.live_words = len(words)
+        self.word_bytes = sum(sys.getsizeof(word) for word in words)
+        self.tables = tables
+
+    def memory_usage(self):
+        """ Get the number of bytes taken by the model, without walking it """
+        return (sys.getsizeof(self.word_ids) + sys.getsizeof(self.words) + self.word_bytes +
+                sys.getsizeof(self.word_counts) + sum(table.memory_usage() for table in self.tables))
+
+    def _context(self, ids, n):
+        """ Get the context of the n-grams after the n - 1 word ids, or EMPTY """
+        context = ids[0]
+        for table, word_id in zip(self.tables[:n - 2], ids[1:]):
+            context = table.find(context, word_id)
+            if context == EMPTY:
+                break
+        return context
+
+    def predict(self, preceding_words, prefix='', k=5):
+        """ Get the k words most likely to follow preceding_words
+
+        Words that follow the longest known context come first. Only words
+        that start with prefix (and are longer than it) are returned.
+        """
+        result = []
+        for n in range(len(self.tables) + 1, 1, -1):
+            context_words = preceding_words[len(preceding_words) - n + 1:]
+            if len(context_words) != n - 1:
+                continue
+            ids = [self.word_ids.get(word) for word in context_words]
+            if None in ids:
+                continue
+            context = self._context(ids, n)
+            if context == EMPTY:
+                continue
+            candidates = (
+                (count, self.words[word_id])
+                for word_id, count in self.tables[n - 2].followers(context)
+            )
+            if prefix:
+                candidates = (
+                    (count, word) for count, word in candidates
+                    if word.startswith(prefix) and word != prefix
+                )
+            for count, word in heapq.nlargest(k, candidates):
+                if word not in result:
+                    result.append(word)
+            if len(result) >= k:
+                break
+        return result[:k]
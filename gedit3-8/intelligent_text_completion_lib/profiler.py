@@ -0,0 +1,155 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Records of the slowest key presses, for bug reports about freezes.
+
+Every key press is timed, which costs two clock reads. Only the N slowest
+are kept, in a heap, with the context they were handled in. One in every K
+key presses is also run under cProfile, so the slow presses that happened to
+be sampled come with a profile. cProfile slows down every call it records,
+so the time of a sampled press is corrected by an estimate of that overhead,
+measured once; the time under the profiler is kept as well. dump() writes the
+profiles as .pstats files next to a summary.json that lists all kept
+presses, slowest first.
+"""
+
+import heapq
+import itertools
+import os
+import time
+
+SLOWEST_EVENTS = 20
+SAMPLE_EVERY = 10
+# number of calls timed to estimate the overhead of cProfile
+CALIBRATION_CALLS = 5000
+
+_call_overhead = None
+
+def profile_call_overhead():
+    """ Get an estimate of the seconds cProfile adds to every call it records """
+    global _call_overhead
+    if _call_overhead is None:
+        import cProfile
+        def noop():
+            pass
+        def run():
+            start = time.perf_counter()
+            for _ in range(CALIBRATION_CALLS):
+                noop()
+            return time.perf_counter() - start
+        # the fastest of a few runs, to leave out interruptions
+        plain = min(run() for _ in range(3))
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # another profiler is running, try again next time
+            return 0.0
+        try:
+            profiled = min(run() for _ in range(3))
+        finally:
+            profile.disable()
+        _call_overhead = max(0.0, (profiled - plain) / CALIBRATION_CALLS)
+    return _call_overhead
+
+def default_profile_dir():
+    """ Get the directory in the user's cache dir to write profiles to """
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache')
+    return os.path.join(cache_dir, 'gedit', 'intelligent_text_completion_profiles')
+
+class SlowEventRecorder(object):
+    """ The slowest events that were recorded """
+
+    def __init__(self, capacity=SLOWEST_EVENTS, sample_every=SAMPLE_EVERY):
+        self.capacity = capacity
+        self.sample_every = sample_every
+        # min-heap of (seconds, number, context, profile, profiled seconds),
+        # so the fastest kept event is the first to go
+        self._heap = []
+        self._count = itertools.count()
+
+    def start(self):
+        """ Start timing an event; pass the result to stop() """
+        number = next(self._count)
+        profile = None
+        if self.sample_every and number % self.sample_every == 0:
+            # cProfile is only needed when sampling is on
+            import cProfile
+            profile_call_overhead()
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # another profiler is running
+                profile = None
+        return (number, profile, time.perf_counter())
+
+    def stop(self, token, get_context):
+        """ Stop timing an event and keep it if it is one of the slowest.
+        get_context() returns a dict describing the event; it is only
+        called for events that are kept. """
+        number, profile, start = token
+        seconds = profiled_seconds = time.perf_counter() - start
+        if profile is not None:
+            profile.disable()
+            calls = sum(entry.callcount for entry in profile.getstats())
+            seconds = max(0.0, profiled_seconds - calls * profile_call_overhead())
+        if len(self._heap) >= self.capacity and seconds <= self._heap[0][0]:
+            return False
+        record = (seconds, number, get_context(), profile, profiled_seconds)
+        if len(self._heap) < self.capacity:
+            heapq.heappush(self._heap, record)
+        else:
+            heapq.heapreplace(self._heap, record)
+        return True
+
+    def events(self):
+        """ Get the kept (seconds, number, context, profile, profiled seconds),
+        slowest first. profiled seconds is the time under the profiler, or
+        seconds if the event wasn't profiled. """
+        return sorted(self._heap, key=lambda record: record[0], reverse=True)
+
+    def clear(self):
+        self._heap = []
+
+    def dump(self, directory):
+        """ Write the profiles and summary.json to a new directory inside
+        directory, and return its path """
+        path = os.path.join(directory, time.strftime('%Y%m%d-%H%M%S'))
+        suffix = 1
+        while os.path.exists(path):
+            suffix += 1
+            path = os.path.join(directory, time.strftime('%Y%m%d-%H%M%S') + '-%d' % suffix)
+        os.makedirs(path)
+        summary = []
+        for rank, (seconds, number, context, profile, profiled_seconds) in enumerate(self.events()):
+            entry = {
+                'rank': rank + 1,
+                'event': number,
+                'milliseconds': round(seconds * 1000, 3),
+                'context': context,
+                'profile': None,
+            }
+            if profile is not None:
+                entry['profiled_milliseconds'] = round(profiled_seconds * 1000, 3)
+                entry['profile'] = 'event-%d.pstats' % (rank + 1)
+                profile.dump_stats(os.path.join(path, entry['profile']))
+            summary.append(entry)
+        # json is only needed when the profiles are saved
+        import json
+        with open(os.path.join(path, 'summary.json'), 'w') as f:
+            json.dump({
+                'capacity': self.capacity,
+                'sample_every': self.sample_every,
+                'events': summary,
+            }, f, indent=2, sort_keys=True)
+        return path
@@ -0,0 +1,104 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Rule packs: which completion rules apply to a language.
+
+A pack is a module in this package that defines
+  RULES            names of the rules that apply (see ALL_RULES)
+  LIST_BULLETS     list bullets that are continued on return
+  COMMENTS         {comment opener: (middle, end)} continued on return
+  INDENT_TRIGGERS  {line end: closer} that indent the next line
+  LINE_PREFIXES    {typed char: prefix} put in front of every selected line
+and may define
+  KEYWORD_OPENERS  keywords that open a block anywhere on a line (the
+                   default is lineindex.OPENERS)
+
+Packs are imported the first time a document in one of their languages is
+seen, and compiled into a RuleTable that is shared by all those documents.
+Documents without a language, or in a language without a pack, get the
+default pack, which enables every rule that isn't specific to a language.
+"""
+
+import importlib
+
+from ..lineindex import OPENERS
+from ..triggers import TriggerMatcher
+
+ALL_RULES = frozenset([
+    'python_docstring',  # complete """ to """ """
+    'xml_tags',          # complete </ to the closing tag
+    'django_tags',       # complete {% to {%  %}
+    'python_dedent',     # dedent after return, break, continue, pass, raise
+    'hanging_indent',    # align with the first argument after an open bracket
+    'brace_dedent',      # align } with the line of the matching {
+    'keyword_dedent',    # align end, fi, done, esac with the opening line
+    'numbered_lists',    # continue and renumber 1. a) i. lists
+    'tables',            # align the columns of | tables
+    'block_comments',    # continue /* */ comments on every line inside them
+    'html_elements',     # know the void elements and optional end tags of HTML
+])
+
+# GtkSourceLanguage id -> pack
+LANGUAGE_PACKS = {
+    'python': 'python',
+    'python3': 'python',
+    'xml': 'xml',
+    'html': 'html',
+    'markdown': 'markdown',
+    'c': 'c',
+    'chdr': 'c',
+    'cpp': 'c',
+    'cpphdr': 'c',
+    'java': 'c',
+    'c-sharp': 'c',
+    'js': 'js',
+    'json': 'js',
+    'django': 'django',
+    'sh': 'sh',
+    'ruby': 'ruby',
+    'lua': 'ruby',
+}
+DEFAULT_PACK = 'default'
+
+class RuleTable(object):
+    """ The compiled rules of a pack """
+
+    def __init__(self, pack):
+        self.rules = frozenset(pack.RULES)
+        self.return_triggers = build_return_triggers(pack.LIST_BULLETS, pack.COMMENTS, pack.INDENT_TRIGGERS)
+        self.line_prefixes = dict(pack.LINE_PREFIXES)
+        self.keyword_openers = frozenset(getattr(pack, 'KEYWORD_OPENERS', OPENERS))
+
+    def __contains__(self, rule):
+        return rule in self.rules
+
+def build_return_triggers(list_bullets, comments, indent_triggers):
+    """ Compile the triggers that are checked when return is pressed """
+    matcher = TriggerMatcher()
+    for bullet in list_bullets:
+        matcher.add_line_start(bullet, ('list', bullet))
+    for comment_start, comment_middle_and_end in comments.items():
+        matcher.add_line_start(comment_start, ('comment', comment_middle_and_end), whole_line=True)
+    for indent_trigger, ending_char in indent_triggers.items():
+        matcher.add_line_end(indent_trigger, ('indent', ending_char))
+    return matcher
+
+_tables = {}
+
+def get_rule_table(language_id):
+    """ Get the RuleTable for a GtkSourceLanguage id (None for no language) """
+    pack_name = LANGUAGE_PACKS.get(language_id, DEFAULT_PACK)
+    table = _tables.get(pack_name)
+    if table is None:
+        pack = importlib.import_module('.' + pack_name, __name__)
+        table = _tables[pack_name] = RuleTable(pack)
+    return table
@@ -0,0 +1,32 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Rules for C and the languages with a C-like syntax."""
+
+RULES = ['brace_dedent', 'hanging_indent', 'block_comments']
+
+LIST_BULLETS = []
+
+COMMENTS = {
+    '/**' : (' * ', ' */'),
+    '/*'  : (' * ', ' */'),
+}
+
+INDENT_TRIGGERS = {
+    '(': ')',
+    '{': '}',
+    '[': ']',
+}
+
+LINE_PREFIXES = {
+    '/': '// ',
+}
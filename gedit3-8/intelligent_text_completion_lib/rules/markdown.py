@@ -0,0 +1,34 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Rules for Markdown."""
+
+# Markdown may contain HTML
+RULES = ['xml_tags', 'numbered_lists', 'tables']
+
+LIST_BULLETS = ['* ', '- ', '$ ', '> ', '+ ', '~ ']
+
+COMMENTS = {}
+
+INDENT_TRIGGERS = {
+    '(': ')',
+    '{': '}',
+    '[': ']',
+    ':': '',
+}
+
+LINE_PREFIXES = {
+    '*': '* ',
+    '-': '- ',
+    '+': '+ ',
+    '>': '> ',
+}
@@ -0,0 +1,75 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Edits on all lines of a selection: indent, dedent and prefix.
+
+Each function maps the text of whole lines to its new text in a single pass,
+so the editor can replace the selection with one delete and one insert
+instead of editing it line by line. Line breaks are kept as they are and
+blank lines are left alone.
+"""
+
+from .blocks import LINE_BREAK_RE
+
+def _split_lines(text):
+    """ Split text into (leading whitespace, rest of the line, line break)
+    triples """
+    parts = LINE_BREAK_RE.split(text)
+    parts.append('')
+    for i in range(0, len(parts) - 1, 2):
+        line = parts[i]
+        rest = line.lstrip(' \t')
+        yield line[:len(line) - len(rest)], rest, parts[i + 1]
+
+def indent_text(text, tab_string):
+    """ Add one indentation level in front of every line """
+    result = []
+    for whitespace, rest, line_break in _split_lines(text):
+        if rest:
+            whitespace = tab_string + whitespace
+        result.append(whitespace + rest + line_break)
+    return ''.join(result)
+
+def dedent_text(text, tab_string):
+    """ Remove one indentation level from every line """
+    result = []
+    for whitespace, rest, line_break in _split_lines(text):
+        if rest:
+            whitespace = dedent_whitespace(whitespace, tab_string)
+        result.append(whitespace + rest + line_break)
+    return ''.join(result)
+
+def prefix_text(text, prefix):
+    """ Put prefix after the leading whitespace of every line, or remove it
+    from every line if all lines already have it """
+    lines = list(_split_lines(text))
+    stripped = prefix.rstrip()
+    if all(rest.startswith(stripped) for whitespace, rest, line_break in lines if rest):
+        # toggle the prefix off again
+        result = []
+        for whitespace, rest, line_break in lines:
+            if rest.startswith(prefix):
+                rest = rest[len(prefix):]
+            elif rest:
+                rest = rest[len(stripped):]
+            result.append(whitespace + rest + line_break)
+        return ''.join(result)
+    return ''.join(whitespace + prefix + rest + line_break if rest else whitespace + line_break
+                   for whitespace, rest, line_break in lines)
+
+def dedent_whitespace(whitespace, tab_string):
+    """ Remove one indentation level from whitespace """
+    if whitespace.endswith(tab_string):
+        return whitespace[:-len(tab_string)]
+    if whitespace.endswith("\t"):
+        return whitespace[:-1]
+    return whitespace[:max(0, len(whitespace) - len(tab_string))]
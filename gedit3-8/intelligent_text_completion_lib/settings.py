@@ -0,0 +1,138 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Plugin options stored in a key file, for when the GSettings schema of the
+plugin isn't installed.
+
+The file is read once and the options are kept in memory. Changed options
+are only written when flush() is called, all at once, so toggling several
+options in a row costs a single write. maybe_reload() takes over changes
+that were made to the file by another instance of the plugin.
+"""
+
+import os
+import re
+
+SETTINGS_GROUP = 'intelligent_text_completion'
+
+def default_settings_path():
+    """ Get the path of the settings file in the user's config dir """
+    config_dir = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+    return os.path.join(config_dir, 'gedit', 'intelligent_text_completion.ini')
+
+def key_name(option_name):
+    """ Get the settings key of an option, like close-brackets-and-quotes
+    for closeBracketsAndQuotes """
+    return re.sub('(?<=[a-z0-9])([A-Z])', r'-\1', option_name).lower()
+
+def format_value(value):
+    if value is True or value is False:
+        return 'true' if value else 'false'
+    return str(value)
+
+def parse_value(text, default):
+    """ Parse text as a value of the type of default, or get default """
+    if default is True or default is False:
+        if text in ('true', 'false'):
+            return text == 'true'
+        return default
+    try:
+        return type(default)(text)
+    except ValueError:
+        return default
+
+class KeyFileSettings(object):
+    """ Options kept in memory and written to a key file on flush() """
+
+    def __init__(self, path):
+        self.path = path
+        # key -> value as it is written in the file
+        self._values = {}
+        # key -> value of the options that were changed since the last flush()
+        self._pending = {}
+        self._mtime = None
+        self.maybe_reload()
+
+    def get(self, name, default):
+        """ Get the value of an option, or default if it isn't set """
+        text = self._values.get(key_name(name))
+        if text is None:
+            return default
+        return parse_value(text, default)
+
+    def set(self, name, value):
+        """ Change an option; it is written on the next flush() """
+        key = key_name(name)
+        text = format_value(value)
+        if self._values.get(key) != text:
+            self._values[key] = text
+            self._pending[key] = text
+
+    def maybe_reload(self):
+        """ Read the file again if it changed, and get the keys of the
+        options that changed """
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return []
+        self._mtime = mtime
+        values = self._read()
+        # changes that aren't written yet win over the file
+        values.update(self._pending)
+        changed = [key for key in set(values) | set(self._values)
+                   if values.get(key) != self._values.get(key)]
+        self._values = values
+        return changed
+
+    def _read(self):
+        values = {}
+        try:
+            with open(self.path) as f:
+                lines = f.read().splitlines()
+        except (IOError, OSError):
+            return values
+        in_group = False
+        for line in lines:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            if line.startswith('['):
+                in_group = line == '[' + SETTINGS_GROUP + ']'
+            elif in_group and '=' in line:
+                key, value = line.split('=', 1)
+                values[key.strip()] = value.strip()
+        return values
+
+    def flush(self):
+        """ Write the options to the file if any of them changed """
+        if not self._pending:
+            return False
+        # tempfile is slow to import and only needed when writing
+        import tempfile
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        fd, tmp_path = tempfile.mkstemp(dir=directory or None, prefix='.settings-')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write('[' + SETTINGS_GROUP + ']\n')
+                for key in sorted(self._values):
+                    f.write('%s=%s\n' % (key, self._values[key]))
+            os.replace(tmp_path, self.path)
+        except:
+            os.unlink(tmp_path)
+            raise
+        self._pending = {}
+        self._mtime = os.stat(self.path).st_mtime
+        return True
@@ -0,0 +1,151 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""User-defined snippets.
+
+Snippets are read from a JSON file that looks like this:
+
+    {
+        "key": "Tab",
+        "snippets": {
+            "ifmain": "if __name__ == '__main__':\\n\\t$0",
+            "pr": "print($0)"
+        }
+    }
+
+"key" is the name of the key that expands the word before the cursor (see
+gdkkeysyms.h). In a template, $0 marks where the cursor goes and $$ stands for
+a literal $. Without $0, the cursor is placed after the expansion.
+"""
+
+import os
+import sys
+import time
+import traceback
+
+from .triggers import TriggerTrie
+
+DEFAULT_KEY = 'Tab'
+CURSOR_PLACEHOLDER = '$0'
+
+# minimal number of seconds between two checks for changes of the file
+RELOAD_INTERVAL = 1.0
+
+def default_snippets_path():
+    """ Get the path of the snippets file in the user's config dir """
+    config_dir = os.environ.get('XDG_CONFIG_HOME') or os.path.expanduser('~/.config')
+    return os.path.join(config_dir, 'gedit', 'intelligent_text_completion_snippets.json')
+
+def is_word_char(char):
+    return char.isalnum() or char == '_'
+
+class SnippetStore(object):
+    """ Snippets of a file, indexed on their trigger
+
+    The file is parsed again only when its modification time changes, and its
+    modification time is checked at most once every RELOAD_INTERVAL seconds.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.key_name = DEFAULT_KEY
+        self._templates = {}
+        # the problems in the file when it was last loaded
+        self.errors = []
+        # triggers are stored reversed to match them against the end of a line
+        self._trie = TriggerTrie()
+        self._mtime = None
+        self._last_check = None
+
+    def maybe_reload(self):
+        """ Reload the file if it changed, return whether it was reloaded """
+        now = time.time()
+        if self._last_check is not None and now - self._last_check < RELOAD_INTERVAL:
+            return False
+        self._last_check = now
+        try:
+            mtime = os.stat(self.path).st_mtime
+        except OSError:
+            mtime = None
+        if mtime == self._mtime:
+            return False
+        self._mtime = mtime
+        self._load()
+        return True
+
+    def _load(self):
+        # json is only needed once there is a snippets file
+        import json
+        key_name = DEFAULT_KEY
+        templates = {}
+        errors = []
+        if self._mtime is not None:
+            try:
+                with open(self.path) as f:
+                    config = json.load(f)
+                key_name = config.get('key', DEFAULT_KEY)
+                templates = dict(config.get('snippets', {}))
+            except (IOError, ValueError, TypeError, AttributeError) as e: # catch, just in case
+                traceback.print_exc()
+                errors.append(str(e))
+        # the traceback of a file that couldn't be parsed is printed already
+        reported = len(errors)
+        # the file is written by hand, skip the values of the wrong type
+        if not isinstance(key_name, str) or not key_name:
+            errors.append("key should be a key name, using %s" % DEFAULT_KEY)
+            key_name = DEFAULT_KEY
+        for trigger, template in list(templates.items()):
+            if not trigger or not isinstance(template, str):
+                errors.append("skipping %r, it needs a trigger and a string template" % trigger)
+                del templates[trigger]
+        for error in errors[reported:]:
+            sys.stderr.write("snippets: %s\n" % error)
+        trie = TriggerTrie()
+        for trigger in templates:
+            trie.add(trigger[::-1], trigger)
+        self.key_name = key_name
+        self.errors = errors
+        self._templates = templates
+        self._trie = trie
+
+    def lookup(self, preceding_line):
+        """ Get (trigger, template) of the snippet that ends preceding_line
+
+        The trigger has to be a whole word: it should not be preceded by a
+        word character when it starts with one. The longest trigger wins.
+        Returns None if there is no such snippet.
+        """
+        found = None
+        for triggers, start in self._trie.match(preceding_line, len(preceding_line) - 1, -1, -1):
+            # start is the position right before the trigger
+            for trigger in triggers:
+                if start >= 0 and is_word_char(trigger[0]) and is_word_char(preceding_line[start]):
+                    continue
+                found = trigger
+        if found is None:
+            return None
+        return found, self._templates[found]
+
+def expand_snippet(template, whitespace, tab_string='\t'):
+    """ Expand template on a line that starts with whitespace
+
+    Returns (middle, end): the text before and after the cursor.
+    """
+    text = template.replace('\t', tab_string).replace('\n', '\n' + whitespace)
+    parts = text.split('$$')
+    for i, part in enumerate(parts):
+        if CURSOR_PLACEHOLDER in part:
+            middle, end = part.split(CURSOR_PLACEHOLDER, 1)
+            middle = '$'.join(parts[:i] + [middle])
+            end = '$'.join([end.replace(CURSOR_PLACEHOLDER, '')] + parts[i + 1:])
+            return middle, end
+    return '$'.join(parts), ''
@@ -0,0 +1,243 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Pipe tables, as in Markdown:
+
+    | Name  | Size |
+    |:------|-----:|
+    | a     |    1 |
+
+Tables are aligned by padding every cell to the widest cell of its column.
+A Table keeps, for every column, how many rows have a cell of each width, so
+the widths follow a change of a single row without looking at the others.
+Rows that change in place are only marked dirty and parsed again when the
+table is aligned the next time. Widths are counted in columns of a monospace
+font: wide characters, like CJK ones, take two and combining marks none.
+"""
+
+import re
+import unicodedata
+
+SEPARATOR_RE = re.compile(r':?-+:?$')
+PIPE_RE = re.compile(r'(?<!\\)\|')
+NON_ASCII_RE = re.compile(r'[^\x00-\x7f]')
+# separator cells are at least this wide, like ---
+MIN_SEPARATOR_WIDTH = 3
+
+def text_width(text):
+    """ Get the number of columns text takes in a monospace font """
+    if not NON_ASCII_RE.search(text):
+        return len(text)
+    width = 0
+    for char in text:
+        if unicodedata.combining(char):
+            continue
+        width += 2 if unicodedata.east_asian_width(char) in 'WF' else 1
+    return width
+
+class Row(object):
+    """ A parsed line of a table """
+
+    def __init__(self, text, indent, cells, closed):
+        self.text = text
+        self.indent = indent
+        self.cells = cells
+        # whether the line ends with a |
+        self.closed = closed
+        self.is_separator = all(SEPARATOR_RE.match(cell) for cell in cells) and bool(cells)
+
+    def widths(self):
+        if self.is_separator:
+            return [MIN_SEPARATOR_WIDTH] * len(self.cells)
+        return [text_width(cell) for cell in self.cells]
+
+def parse_row(line):
+    """ Get the Row of a line of a table, or None if it isn't one """
+    stripped = line.lstrip(' \t')
+    if not stripped.startswith('|'):
+        return None
+    indent = line[:len(line) - len(stripped)]
+    parts = PIPE_RE.split(stripped.rstrip())
+    # the text in front of the first | is empty
+    parts = parts[1:]
+    closed = parts and not parts[-1].strip()
+    if closed:
+        parts.pop()
+    return Row(line, indent, [part.strip() for part in parts], bool(closed))
+
+def format_cell(row, index, width):
+    cell = row.cells[index]
+    if not row.is_separator:
+        return cell + ' ' * (width - text_width(cell))
+    left = ':' if cell.startswith(':') else ''
+    right = ':' if cell.endswith(':') and len(cell) > 1 else ''
+    return left + '-' * (width - len(left) - len(right)) + right
+
+def format_row(row, widths):
+    """ Get the text of row with its cells padded to widths """
+    cells = [format_cell(row, i, width) for i, width in enumerate(widths[:len(row.cells)])]
+    if row.closed:
+        return row.indent + '|' + ''.join(' %s |' % cell for cell in cells)
+    if not cells:
+        return row.indent + '|'
+    # don't pad the cell that is still being typed
+    cells[-1] = row.cells[-1]
+    return row.indent + '| ' + ' | '.join(cells)
+
+def cell_position(line, column):
+    """ Get (cell index, offset in the text of the cell) of column in a row """
+    start = line.find('|')
+    if column <= start:
+        return 0, 0
+    pipes = [m.start() for m in PIPE_RE.finditer(line, start)]
+    index = len([pipe for pipe in pipes if pipe < column]) - 1
+    cell_start = pipes[index] + 1
+    raw = line[cell_start:column]
+    return index, len(raw.lstrip())
+
+def cell_column(row, widths, index, offset):
+    """ Get the column in the aligned row of offset in the text of cell index """
+    column = len(row.indent) + 1
+    for i in range(min(index, len(row.cells))):
+        column += len(format_cell(row, i, widths[i])) + 3
+    if index >= len(row.cells):
+        return len(format_row(row, widths))
+    return column + 1 + min(offset, len(row.cells[index]))
+
+class Table(object):
+    """ The rows of a pipe table, with the width of each column """
+
+    def __init__(self, first_line, rows):
+        self.first_line = first_line
+        self.rows = []
+        # per column: {width: number of rows with a cell that wide}
+        self.histograms = []
+        self.widths = []
+        # rows that changed in place since they were parsed
+        self.dirty = set()
+        # whether all rows but the unaligned ones are aligned to widths
+        self.aligned = False
+        self.unaligned = set()
+        for row in rows:
+            self.rows.append(row)
+            self._count(row, 1)
+        self.widths = [max(histogram) for histogram in self.histograms]
+
+    @property
+    def length(self):
+        return len(self.rows) - 1
+
+    @property
+    def last_line(self):
+        return self.first_line + len(self.rows) - 1
+
+    def lines_replaced(self, first_line, old_count, new_count):
+        """ Lines of the table changed in place: parse them again later """
+        if old_count != new_count:
+            return False
+        self.dirty.update(range(first_line - self.first_line, first_line - self.first_line + old_count))
+        return True
+
+    def _count(self, row, change):
+        histograms = self.histograms
+        for column, width in enumerate(row.widths()):
+            if column == len(histograms):
+                histograms.append({})
+            histogram = histograms[column]
+            count = histogram.get(width, 0) + change
+            if count:
+                histogram[width] = count
+            else:
+                del histogram[width]
+
+    def set_row(self, index, row):
+        """ Replace the row at index, updating the widths of its columns """
+        old_row = self.rows[index]
+        self._count(old_row, -1)
+        self._count(row, 1)
+        self.rows[index] = row
+        columns = max(len(old_row.cells), len(row.cells))
+        while self.histograms and not self.histograms[-1]:
+            self.histograms.pop()
+        del self.widths[len(self.histograms):]
+        changed = False
+        for column in range(min(columns, len(self.histograms))):
+            width = max(self.histograms[column])
+            if column == len(self.widths):
+                self.widths.append(width)
+                changed = True
+            elif self.widths[column] != width:
+                self.widths[column] = width
+                changed = True
+        return changed
+
+    def refresh(self, get_line):
+        """ Parse the dirty rows again, reading them with get_line(line).
+        Returns False if one of them isn't a row anymore """
+        for index in sorted(self.dirty):
+            row = parse_row(get_line(self.first_line + index))
+            if row is None:
+                return False
+            if self.set_row(index, row):
+                self.aligned = False
+            self.unaligned.add(index)
+        self.dirty = set()
+        return True
+
+    def align(self):
+        """ Get [(first, last, lines)] for the runs of rows that aren't aligned
+        yet, with the index of their first and last row and their new text.
+        Only the rows that changed are looked at if the widths didn't. """
+        if self.aligned:
+            indexes = sorted(self.unaligned)
+        else:
+            indexes = range(len(self.rows))
+        runs = []
+        for index in indexes:
+            row = self.rows[index]
+            text = format_row(row, self.widths)
+            if text == row.text:
+                continue
+            self.rows[index] = parse_row(text)
+            if runs and runs[-1][1] == index - 1:
+                first, last, lines = runs[-1]
+                lines.append(text)
+                runs[-1] = (first, index, lines)
+            else:
+                runs.append((index, index, [text]))
+        self.aligned = True
+        self.unaligned = set()
+        return runs
+
+def find_table(get_line, line_count, line):
+    """ Get the Table with a row on line, reading the lines with
+    get_line(line), or None if line isn't a row """
+    row = parse_row(get_line(line))
+    if row is None:
+        return None
+    rows = [row]
+    first_line = line
+    while first_line > 0:
+        above = parse_row(get_line(first_line - 1))
+        if above is None:
+            break
+        rows.append(above)
+        first_line -= 1
+    rows.reverse()
+    last_line = line
+    while last_line + 1 < line_count:
+        below = parse_row(get_line(last_line + 1))
+        if below is None:
+            break
+        rows.append(below)
+        last_line += 1
+    return Table(first_line, rows)
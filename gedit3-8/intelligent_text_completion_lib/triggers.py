@@ -0,0 +1,83 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Matching of line-prefix and line-suffix triggers in a single pass."""
+
+# key in a trie node that holds the values of the triggers ending there
+_VALUES = None
+
+class TriggerTrie(object):
+    """ Trie of trigger strings """
+
+    def __init__(self):
+        self._root = {}
+
+    def add(self, trigger, value):
+        """ Add trigger, value is returned by match() when it matches """
+        node = self._root
+        for char in trigger:
+            node = node.setdefault(char, {})
+        node.setdefault(_VALUES, []).append(value)
+
+    def match(self, text, start, stop, step=1):
+        """ Walk text from start towards stop (exclusive) with step.
+
+        Returns (values, end) tuples for every trigger that is found, shortest
+        first, where end is the position in text right after the trigger.
+        """
+        matches = []
+        node = self._root
+        pos = start
+        while pos != stop:
+            node = node.get(text[pos])
+            if node is None:
+                break
+            pos += step
+            if _VALUES in node:
+                matches.append((node[_VALUES], pos))
+        return matches
+
+class TriggerMatcher(object):
+    """ Matches all triggers at the start and at the end of a line at once
+
+    Line-start triggers are matched after the leading whitespace of the line.
+    The values of all matching triggers are returned in the order: line-start
+    triggers (shortest first), then line-end triggers (shortest first).
+    """
+
+    def __init__(self):
+        self._line_start = TriggerTrie()
+        self._line_end = TriggerTrie()
+
+    def add_line_start(self, trigger, value, whole_line=False):
+        """ Add a trigger that matches the start of the line
+
+        If whole_line is set, the trigger only matches when nothing but the
+        trigger follows the whitespace in front of the line.
+        """
+        self._line_start.add(trigger, (value, whole_line))
+
+    def add_line_end(self, trigger, value):
+        """ Add a trigger that matches the end of the line """
+        self._line_end.add(trigger[::-1], value)
+
+    def match(self, line, whitespace_pos=0):
+        """ Get the values of all triggers that match line """
+        result = []
+        line_length = len(line)
+        for values, end in self._line_start.match(line, whitespace_pos, line_length):
+            for value, whole_line in values:
+                if not whole_line or end == line_length:
+                    result.append(value)
+        for values, end in self._line_end.match(line, line_length - 1, whitespace_pos - 1, -1):
+            result.extend(values)
+        return result
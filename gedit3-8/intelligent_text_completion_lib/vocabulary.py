@@ -0,0 +1,321 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Persistent user vocabulary, stored in a memory-mapped binary file.
+
+The file contains every word once, sorted by its UTF-8 encoding, so that it
+can be searched with binary search without being parsed:
+
+    header   magic, format version, byte order, number of words
+    offsets  (number of words + 1) unsigned ints, start of each word in blob
+    counts   (number of words) unsigned ints
+    blob     the UTF-8 encoded words, back to back
+
+The file is never modified in place: updates are merged into a new file that
+atomically replaces the old one. The plugin does this in a worker thread, as
+merging a large vocabulary takes a while.
+
+Usage: python -m intelligent_text_completion_lib.vocabulary FILE...
+adds the words of the given files to the user vocabulary.
+"""
+
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import sys
+import traceback
+from array import array
+
+from .words import tokenize
+
+MAGIC = b'ITCV'
+VERSION = 1
+HEADER = struct.Struct('<4sBBxxI')
+BYTE_ORDERS = {'little': 0, 'big': 1}
+MAX_COUNT = 2 ** 32 - 1
+
+def default_vocabulary_path():
+    """ Get the path of the vocabulary file in the user's data dir """
+    data_dir = os.environ.get('XDG_DATA_HOME') or os.path.expanduser('~/.local/share')
+    return os.path.join(data_dir, 'gedit', 'intelligent_text_completion_vocabulary.bin')
+
+def write_vocabulary(path, items):
+    """ Atomically replace the file at path by the sorted (word, count) items """
+    # tempfile is slow to import and only needed when writing
+    import tempfile
+    offsets = array('I', [0])
+    counts = array('I')
+    blob = bytearray()
+    for word, count in items:
+        blob += word.encode('utf-8')
+        offsets.append(len(blob))
+        counts.append(min(count, MAX_COUNT))
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    fd, tmp_path = tempfile.mkstemp(dir=directory or None, prefix='.vocabulary-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, BYTE_ORDERS[sys.byteorder], len(counts)))
+            f.write(offsets.tobytes())
+            f.write(counts.tobytes())
+            f.write(blob)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except:
+        os.unlink(tmp_path)
+        raise
+    return len(counts)
+
+def merge_items(old_items, new_counts):
+    """ Merge sorted (word, count) items with a dict of extra counts """
+    new_items = sorted(new_counts.items(), key=lambda item: item[0].encode('utf-8'))
+    merged = heapq.merge(old_items, new_items, key=lambda item: item[0].encode('utf-8'))
+    previous_word = None
+    total = 0
+    for word, count in merged:
+        if word != previous_word:
+            if previous_word is not None:
+                yield previous_word, total
+            previous_word = word
+            total = 0
+        total += count
+    if previous_word is not None:
+        yield previous_word, total
+
+def _identity(stat):
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+class Vocabulary(object):
+    """ Word counts in a memory-mapped vocabulary file plus pending updates
+
+    The file is mapped on first use. Updates are collected with add() and only
+    written by flush() or flush_in_background().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.pending = {}
+        self._file = None
+        self._mmap = None
+        self._offsets = None
+        self._counts = None
+        self._blob_start = 0
+        self._size = 0
+        self._opened = False
+        # (inode, mtime, size) of the file that was opened, or None
+        self._identity = None
+        # the worker thread of flush_in_background() and the lock around
+        # pending, which that thread takes over
+        self._writer = None
+        self._lock = None
+        # set by the worker thread once it replaced the file
+        self._replaced = False
+
+    def _open(self):
+        self._opened = True
+        try:
+            f = open(self.path, 'rb')
+        except (IOError, OSError):
+            return
+        self._identity = _identity(os.fstat(f.fileno()))
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            # empty file
+            f.close()
+            return
+        if len(data) < HEADER.size:
+            data.close()
+            f.close()
+            return
+        magic, version, byte_order, size = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION or byte_order != BYTE_ORDERS[sys.byteorder]:
+            data.close()
+            f.close()
+            return
+        offsets_start = HEADER.size
+        counts_start = offsets_start + 4 * (size + 1)
+        blob_start = counts_start + 4 * size
+        # a truncated file would make lookups read past its end; the last
+        # offset is the size of the blob
+        if (len(data) < blob_start or
+                len(data) < blob_start + struct.unpack_from('=I', data, counts_start - 4)[0]):
+            data.close()
+            f.close()
+            return
+        view = memoryview(data)
+        self._blob_start = blob_start
+        self._offsets = view[offsets_start:counts_start].cast('I')
+        self._counts = view[counts_start:self._blob_start].cast('I')
+        self._file = f
+        self._mmap = data
+        self._size = size
+
+    def close(self):
+        """ Unmap the file, it is mapped again on next use """
+        if self._mmap is not None:
+            self._offsets.release()
+            self._counts.release()
+            self._offsets = self._counts = None
+            self._mmap.close()
+            self._file.close()
+            self._mmap = self._file = None
+        self._size = 0
+        self._opened = False
+        self._identity = None
+
+    def _is_stale(self):
+        """ Check whether the file was replaced since it was opened, for
+        example by the vocabulary of another window """
+        try:
+            identity = _identity(os.stat(self.path))
+        except OSError:
+            identity = None
+        return identity != self._identity
+
+    def __len__(self):
+        if self._replaced:
+            # map the file that was written by the worker thread
+            self._replaced = False
+            self.close()
+        if not self._opened:
+            self._open()
+        return self._size
+
+    def _word_bytes(self, i):
+        start = self._blob_start
+        return self._mmap[start + self._offsets[i]:start + self._offsets[i + 1]]
+
+    def _bisect(self, key, size):
+        """ Get the index of the first word whose encoding is >= key, among
+        the first size words """
+        lo = 0
+        hi = size
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._word_bytes(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def count(self, word):
+        """ Get the count of word in the file, without the pending updates """
+        key = word.encode('utf-8')
+        # len() maps the file written by the worker thread, once per lookup
+        size = len(self)
+        i = self._bisect(key, size)
+        if i < size and self._word_bytes(i) == key:
+            return self._counts[i]
+        return 0
+
+    def complete(self, prefix, k=10):
+        """ Get the (word, count) of the k most frequent words that start with prefix """
+        key = prefix.encode('utf-8')
+        # both ends have to be found in the same file
+        size = len(self)
+        start = self._bisect(key, size)
+        # no UTF-8 encoded string contains the byte 0xff
+        end = self._bisect(key + b'\xff', size)
+        counts = self._counts
+        best = heapq.nlargest(k, range(start, end), key=counts.__getitem__) if end > start else []
+        return [(self._word_bytes(i).decode('utf-8'), counts[i]) for i in best]
+
+    def items(self):
+        """ Iterate over the sorted (word, count) items in the file """
+        for i in range(len(self)):
+            yield self._word_bytes(i).decode('utf-8'), self._counts[i]
+
+    def add(self, word, count=1):
+        """ Add word to the pending updates """
+        if self._lock is not None:
+            with self._lock:
+                self.pending[word] = self.pending.get(word, 0) + count
+        else:
+            self.pending[word] = self.pending.get(word, 0) + count
+
+    def flush(self):
+        """ Write the pending updates to a new file and map that one instead """
+        writer = self._writer
+        if writer is not None:
+            writer.join()
+        if not self.pending:
+            return
+        if self._opened and self._is_stale():
+            # merge with what is in the file now, not with what was opened
+            self.close()
+        items = list(merge_items(self.items(), self.pending))
+        self.close()
+        write_vocabulary(self.path, items)
+        self.pending = {}
+
+    def flush_in_background(self):
+        """ Write the pending updates in a worker thread. The new file is
+        mapped on the next lookup after it was written. The thread isn't a
+        daemon thread, so the interpreter lets it finish before exiting. """
+        # threading is only needed once a document is closed
+        import threading
+        if self._lock is None:
+            self._lock = threading.Lock()
+        with self._lock:
+            if not self.pending or self._writer is not None:
+                # a running worker also writes what was added since it started
+                return
+            self._writer = threading.Thread(target=self._write_pending, name='vocabulary-writer')
+            self._writer.start()
+
+    def _write_pending(self):
+        """ Merge the pending updates into the file until there are none left.
+        Runs in the worker thread, which reads the file through a mapping of
+        its own. """
+        pending = {}
+        try:
+            while True:
+                with self._lock:
+                    pending, self.pending = self.pending, {}
+                    if not pending:
+                        self._writer = None
+                        return
+                reader = Vocabulary(self.path)
+                try:
+                    items = list(merge_items(reader.items(), pending))
+                finally:
+                    reader.close()
+                write_vocabulary(self.path, items)
+                pending = {}
+                self._replaced = True
+        except (IOError, OSError):
+            traceback.print_exc()
+        finally:
+            if pending:
+                # keep the updates that weren't written, flush() tries again
+                with self._lock:
+                    for word, count in pending.items():
+                        self.pending[word] = self.pending.get(word, 0) + count
+                    self._writer = None
+
+def main(argv):
+    vocabulary = Vocabulary(default_vocabulary_path())
+    for filename in argv:
+        with open(filename) as f:
+            for line in f:
+                for word in tokenize(line):
+                    vocabulary.add(word)
+    vocabulary.flush()
+    print("%d words in %s" % (len(vocabulary), vocabulary.path))
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,89 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Word-frequency indexes for word completion."""
+
+import re
+import sys
+
+from .fuzzy import FuzzyIndex
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+MIN_WORD_LENGTH = 3
+MIN_PREFIX_LENGTH = 2
+
+def tokenize(text):
+    """ Get the words in text that are long enough to be completed """
+    return [word for word in WORD_RE.findall(text) if len(word) >= MIN_WORD_LENGTH]
+
+class WordIndex(object):
+    """ Word counts, with a FuzzyIndex of the same words to match them
+    against what is typed """
+
+    def __init__(self):
+        self.counts = {}
+        self.fuzzy = FuzzyIndex()
+
+    def add(self, word, count=1):
+        self.counts[word] = self.counts.get(word, 0) + count
+        self.fuzzy.add(word, count)
+
+    def remove(self, word, count=1):
+        new_count = self.counts.get(word, 0) - count
+        if new_count > 0:
+            self.counts[word] = new_count
+        elif word in self.counts:
+            del self.counts[word]
+        self.fuzzy.remove(word, count)
+
+    def memory_usage(self):
+        """ Get an estimate of the number of bytes taken by the index """
+        # the words themselves are counted by the fuzzy index
+        return sys.getsizeof(self.counts) + self.fuzzy.memory_usage()
+
+class DocumentWordIndex(object):
+    """ Word counts of one document, which are also added to a shared WordIndex """
+
+    def __init__(self, shared_index):
+        self.counts = {}
+        self.shared_index = shared_index
+
+    def add_text(self, text):
+        counts = self.counts
+        shared_index = self.shared_index
+        for word in tokenize(text):
+            counts[word] = counts.get(word, 0) + 1
+            shared_index.add(word)
+
+    def remove_text(self, text):
+        counts = self.counts
+        shared_index = self.shared_index
+        for word in tokenize(text):
+            count = counts.get(word, 0)
+            if count == 0:
+                continue
+            if count == 1:
+                del counts[word]
+            else:
+                counts[word] = count - 1
+            shared_index.remove(word)
+
+    def memory_usage(self):
+        """ Get the number of bytes taken by the counts. The words are shared
+        with the shared index and counted there. """
+        return sys.getsizeof(self.counts)
+
+    def clear(self):
+        """ Remove all words of this document from the shared index """
+        for word, count in self.counts.items():
+            self.shared_index.remove(word, count)
+        self.counts = {}
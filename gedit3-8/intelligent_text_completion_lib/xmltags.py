@@ -0,0 +1,288 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+"""Matching of XML and HTML tags.
+
+get_closing_xml_tag() looks at the tags of a piece of text. A TagIndex keeps
+the tags of the start of a document, so that the tags in front of the cursor
+don't have to be found again on every key press. It stores them in parallel
+arrays (start offset, length, kind, name id) with the names interned, which
+takes 17 bytes per tag instead of a tuple and a string per tag.
+
+closing_tags_text() writes the end tags of all elements that are open at
+the cursor, as found in one pass by TagIndex.open_tags_before().
+
+For HTML, void elements like <br> are never open, and elements like <li>, <p>
+and <td> are closed by the end of their parent or by the elements that may
+follow them without an end tag.
+"""
+
+import re
+from array import array
+from bisect import bisect_left, bisect_right
+
+TAG_RE = re.compile(r'<.*?>')
+SPECIAL_TAG_RE = re.compile(r'<[!?].*?>')
+NEUTRAL_TAG_RE = re.compile(r'<.*?/>')
+CLOSING_TAG_RE = re.compile(r'</ *([^ ]*).*?>')
+OPENING_TAG_RE = re.compile(r'< *([^/][^ ]*).*?>')
+
+# kinds of tags
+OPENING = 0
+CLOSING = 1
+# <br/>
+NEUTRAL = 2
+# <!-- -->, <!doctype ...>, <?php ?> and what isn't a tag
+SPECIAL = 3
+
+# bytes taken by a tag in a TagIndex, without its name
+TAG_BYTES = sum(array(code).itemsize for code in 'qIbi')
+
+# elements that can't have content or an end tag
+VOID_ELEMENTS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link',
+    'meta', 'param', 'source', 'track', 'wbr',
+])
+
+# elements whose end tag may be left out -> the elements that close them when
+# they follow them. They are also closed by the end of their parent.
+_CLOSES_P = frozenset([
+    'address', 'article', 'aside', 'blockquote', 'details', 'dialog', 'div', 'dl',
+    'fieldset', 'figcaption', 'figure', 'footer', 'form', 'h1', 'h2', 'h3', 'h4',
+    'h5', 'h6', 'header', 'hgroup', 'hr', 'main', 'menu', 'nav', 'ol', 'p', 'pre',
+    'section', 'table', 'ul',
+])
+IMPLIED_END_TAGS = {
+    'html': frozenset(),
+    'head': frozenset(['body']),
+    'body': frozenset(),
+    'li': frozenset(['li']),
+    'dt': frozenset(['dt', 'dd']),
+    'dd': frozenset(['dt', 'dd']),
+    'p': _CLOSES_P,
+    'rt': frozenset(['rt', 'rp']),
+    'rp': frozenset(['rt', 'rp']),
+    'optgroup': frozenset(['optgroup']),
+    'option': frozenset(['option', 'optgroup']),
+    'thead': frozenset(['tbody', 'tfoot']),
+    'tbody': frozenset(['tbody', 'tfoot']),
+    'tfoot': frozenset(),
+    'tr': frozenset(['tr']),
+    'td': frozenset(['td', 'th']),
+    'th': frozenset(['td', 'th']),
+}
+
+def classify_tag(tag):
+    """ Get (kind, name) of tag """
+    # ignore special tags like <!-- -->, <!doctype ...> and <?, <?=, <?php
+    if SPECIAL_TAG_RE.match(tag):
+        return SPECIAL, None
+    # neutral tag
+    if NEUTRAL_TAG_RE.match(tag):
+        return NEUTRAL, None
+    # closing tag
+    m = CLOSING_TAG_RE.match(tag)
+    if m:
+        return CLOSING, m.group(1)
+    # opening tag
+    m = OPENING_TAG_RE.match(tag)
+    if m:
+        return OPENING, m.group(1)
+    return SPECIAL, None
+
+def find_unclosed(tags, limit=None, html=False):
+    """ Get the names of the tags that are open after tags, innermost first.
+    tags are (kind, name, lower case name), from the last one back. Only the
+    lower case names are compared, so the names can be anything that should
+    be returned for the tags. """
+    closed = []
+    unclosed = []
+    # the elements after the current tag on its level: the last unclosed
+    # element and the closed elements after it
+    level = set()
+    for kind, name, folded in tags:
+        if kind == CLOSING:
+            if html and folded in VOID_ELEMENTS:
+                continue
+            closed.append(folded)
+        elif kind == OPENING:
+            if html:
+                if folded in VOID_ELEMENTS:
+                    if not closed:
+                        level.add(folded)
+                    continue
+                implied_end = IMPLIED_END_TAGS.get(folded)
+                if implied_end is not None:
+                    if closed and closed[-1] != folded:
+                        # closed by the end of its parent
+                        continue
+                    if not closed and not implied_end.isdisjoint(level):
+                        # closed by an element that follows it
+                        level.add(folded)
+                        continue
+            while True:
+                if len(closed) == 0:
+                    unclosed.append(name)
+                    level = set()
+                    break
+                close_tag = closed.pop()
+                if close_tag == folded:
+                    break
+            if not closed:
+                level.add(folded)
+            if limit is not None and len(unclosed) >= limit:
+                break
+    return unclosed
+
+def get_unclosed_xml_tags(document, limit=None, html=False):
+    """ Get the names of the tags that are still open at the end of document,
+    innermost first, looking at the tags from the end of document back """
+    tags = []
+    for tag in reversed(TAG_RE.findall(document)):
+        kind, name = classify_tag(tag)
+        if kind == OPENING or kind == CLOSING:
+            tags.append((kind, name, name.lower()))
+    return find_unclosed(tags, limit, html)
+
+def get_closing_xml_tag(document, html=False):
+    """ Get the name of the innermost tag that is open at the end of document,
+    or None """
+    unclosed = get_unclosed_xml_tags(document, limit=1, html=html)
+    return unclosed[0] if unclosed else None
+
+class TagIndex(object):
+    """ The tags of the start of a document.
+
+    The index covers the text up to scanned_end. Call forget(offset) before
+    the text at offset changes, and scan() to index more text.
+    """
+
+    def __init__(self):
+        self.starts = array('q')
+        self.lengths = array('I')
+        self.kinds = array('b')
+        self.name_ids = array('i')
+        # interned names, and the id of the lower case form of every name
+        self.names = []
+        self.folded_ids = array('i')
+        self._ids = {}
+        self.scanned_end = 0
+
+    def __len__(self):
+        return len(self.starts)
+
+    def _intern(self, name):
+        name_id = self._ids.get(name)
+        if name_id is None:
+            name_id = self._ids[name] = len(self.names)
+            self.names.append(name)
+            folded = name.lower()
+            self.folded_ids.append(name_id if folded == name else self._intern(folded))
+        return name_id
+
+    def scan(self, text, offset):
+        """ Index the tags of text, which starts at offset == scanned_end """
+        starts = self.starts
+        lengths = self.lengths
+        kinds = self.kinds
+        name_ids = self.name_ids
+        for m in TAG_RE.finditer(text):
+            tag = m.group()
+            kind, name = classify_tag(tag)
+            starts.append(offset + m.start())
+            lengths.append(len(tag))
+            kinds.append(kind)
+            name_ids.append(-1 if name is None else self._intern(name))
+        # a < without > on its line may still become a tag
+        self.scanned_end = self._end(len(starts) - 1)
+
+    def _end(self, index):
+        return self.starts[index] + self.lengths[index] if index >= 0 else 0
+
+    def forget(self, offset):
+        """ Drop the tags that end after offset, the text from offset on changes """
+        if offset >= self.scanned_end:
+            return
+        count = self.count_before(offset)
+        del self.starts[count:]
+        del self.lengths[count:]
+        del self.kinds[count:]
+        del self.name_ids[count:]
+        self.scanned_end = self._end(count - 1)
+
+    def count_before(self, offset):
+        """ Get the number of tags that end at or before offset """
+        # tags don't overlap, so only the last one that starts before offset
+        # can end after it
+        count = bisect_left(self.starts, offset)
+        if count and self._end(count - 1) > offset:
+            count -= 1
+        return count
+
+    def tag_at(self, offset):
+        """ Get the index of the tag around offset, or None """
+        index = bisect_right(self.starts, offset) - 1
+        if index >= 0 and offset < self._end(index):
+            return index
+        return None
+
+    def name(self, index):
+        name_id = self.name_ids[index]
+        return None if name_id < 0 else self.names[name_id]
+
+    def unclosed_before(self, offset, limit=None, html=False):
+        """ Get the names of the tags that are open at offset, innermost first,
+        like get_unclosed_xml_tags() on the text in front of offset """
+        return find_unclosed(self._tags_before(offset), limit, html)
+
+    def open_tags_before(self, offset, html=False):
+        """ Get (name, start offset) of the tags that are open at offset,
+        innermost first """
+        return find_unclosed(self._tags_before(offset, with_starts=True), html=html)
+
+    def _tags_before(self, offset, with_starts=False):
+        starts = self.starts
+        kinds = self.kinds
+        name_ids = self.name_ids
+        folded_ids = self.folded_ids
+        names = self.names
+        for index in range(self.count_before(offset) - 1, -1, -1):
+            kind = kinds[index]
+            if kind == OPENING or kind == CLOSING:
+                name_id = name_ids[index]
+                if with_starts:
+                    yield kind, (names[name_id], starts[index]), names[folded_ids[name_id]]
+                else:
+                    yield kind, names[name_id], names[folded_ids[name_id]]
+
+def closing_tags_text(open_tags, cursor_line, at_line_start):
+    """ Get the text that closes open_tags, (name, line, leading whitespace
+    of line) innermost first, typed at the cursor on cursor_line.
+
+    The end tags of elements that start on the same line go on one line,
+    indented like that line. If at_line_start, the text replaces the
+    whitespace in front of the cursor; otherwise end tags of elements that
+    start on cursor_line are put right at the cursor.
+    """
+    groups = []
+    group_line = None
+    for name, line, whitespace in open_tags:
+        if line != group_line or not groups:
+            group_line = line
+            if not groups and not at_line_start and line == cursor_line:
+                whitespace = ''
+            groups.append([whitespace])
+        groups[-1].append('</' + name + '>')
+    text = '\n'.join(''.join(group) for group in groups)
+    if groups and not at_line_start and open_tags[0][1] != cursor_line:
+        text = '\n' + text
+    return text
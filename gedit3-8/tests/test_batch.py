@@ -0,0 +1,111 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from intelligent_text_completion_lib.batch import check_file, check_lists, fix_lists, iter_paths
+from intelligent_text_completion_lib.blocks import LINE_BREAK_RE
+
+class BatchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'wb') as f:
+            f.write(text.encode('utf-8'))
+        return path
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read().decode('utf-8')
+
+class CheckListsTest(unittest.TestCase):
+
+    def test_wrong_labels(self):
+        lines = ['1. one', '2. two', '4. three', '', 'a) x', 'c) y']
+        self.assertEqual(check_lists(lines), [(2, '4', '3'), (5, 'c', 'b')])
+
+    def test_initials_are_not_a_list(self):
+        self.assertEqual(check_lists(['C. Smith', 'D. Jones', 'F. Brown']), [])
+
+    def test_right_labels(self):
+        self.assertEqual(check_lists(['1. one', '   more of one', '2. two', 'text']), [])
+
+class FixListsTest(BatchTestCase):
+
+    def test_fix_keeps_line_breaks(self):
+        text = '1. one\r\n3. two\n5. three'
+        path = self.write('a.md', text)
+        parts = LINE_BREAK_RE.split(text)
+        fix_lists(path, parts, check_lists(parts[0::2]))
+        self.assertEqual(self.read(path), '1. one\r\n2. two\n3. three')
+
+class CheckFileTest(BatchTestCase):
+
+    def test_markdown_list_is_fixed(self):
+        path = self.write('a.md', '1. one\n3. two\n')
+        result = check_file((path, True))
+        self.assertEqual(result['lists'], [{'line': 2, 'label': '3', 'expected': '2'}])
+        self.assertTrue(result['fixed'])
+        self.assertEqual(self.read(path), '1. one\n2. two\n')
+
+    def test_html_unclosed_tags(self):
+        path = self.write('a.html', '<div><p>text</p>')
+        self.assertEqual(check_file((path, False))['unclosed_tags'], ['div'])
+
+    def test_default_pack_is_never_fixed(self):
+        text = 'A. Smith\nB. Jones\nD. Brown\n'
+        path = self.write('NOTES.txt', text)
+        result = check_file((path, True))
+        self.assertNotIn('fixed', result)
+        self.assertEqual(self.read(path), text)
+
+    def test_not_utf8(self):
+        path = os.path.join(self.directory, 'a.md')
+        with open(path, 'wb') as f:
+            f.write(b'1. caf\xe9\n3. x\n')
+        self.assertIn('error', check_file((path, True)))
+
+    def test_write_error(self):
+        path = self.write('a.md', '1. one\n3. two\n')
+        with mock.patch('tempfile.mkstemp', side_effect=OSError(13, 'Permission denied')):
+            result = check_file((path, True))
+        self.assertIn('Permission denied', result['error'])
+        self.assertEqual(len(result['lists']), 1)
+        self.assertNotIn('fixed', result)
+        self.assertEqual(self.read(path), '1. one\n3. two\n')
+
+class IterPathsTest(BatchTestCase):
+
+    def test_files_without_a_language_are_skipped(self):
+        for name in ['a.html', 'b.go', 'c.txt']:
+            self.write(name, '')
+        names = [os.path.basename(path) for path in iter_paths([self.directory], set())]
+        self.assertEqual(names, ['a.html'])
+
+    def test_extension_option_names_them(self):
+        for name in ['a.html', 'b.go', 'c.txt']:
+            self.write(name, '')
+        names = [os.path.basename(path) for path in iter_paths([self.directory], set(['.go']))]
+        self.assertEqual(names, ['b.go'])
+
+if __name__ == '__main__':
+    unittest.main()
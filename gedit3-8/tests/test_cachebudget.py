@@ -0,0 +1,75 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+import unittest
+
+from intelligent_text_completion_lib.cachebudget import CacheBudget
+
+MB = 1024 * 1024
+
+class FakeCache(object):
+
+    def __init__(self, cached, kept=0):
+        self.cached = cached
+        self.kept = kept
+
+    def cache_usage(self):
+        return self.cached
+
+    def memory_usage(self):
+        return self.kept
+
+    def evict_caches(self):
+        freed = self.cached
+        self.cached = 0
+        return freed
+
+class FakeShared(object):
+
+    def __init__(self, size):
+        self.size = size
+
+    def memory_usage(self):
+        return self.size
+
+class EnforceTest(unittest.TestCase):
+
+    def test_evicts_least_recently_active_first(self):
+        budget = CacheBudget(3)
+        old, middle, active = FakeCache(MB), FakeCache(MB), FakeCache(2 * MB)
+        budget.touch('old', old)
+        budget.touch('middle', middle)
+        budget.touch('active', active)
+        self.assertEqual(budget.enforce(), MB)
+        self.assertEqual((old.cached, middle.cached, active.cached), (0, MB, 2 * MB))
+
+    def test_kept_memory_is_not_evicted(self):
+        budget = CacheBudget(3)
+        old, active = FakeCache(MB, kept=2 * MB), FakeCache(MB)
+        budget.touch('old', old)
+        budget.touch('active', active)
+        self.assertEqual(budget.enforce(), MB)
+        self.assertEqual(old.kept, 2 * MB)
+        self.assertEqual(budget.usage(), [('active', MB), ('old', 2 * MB)])
+
+    def test_nothing_evicted_when_it_does_not_fit_anyway(self):
+        # the words alone take more than the budget
+        budget = CacheBudget(1)
+        budget.add_shared(FakeShared(2 * MB))
+        old, active = FakeCache(MB), FakeCache(MB)
+        budget.touch('old', old)
+        budget.touch('active', active)
+        self.assertEqual(budget.enforce(), 0)
+        self.assertEqual(old.cached, MB)
+
+if __name__ == '__main__':
+    unittest.main()
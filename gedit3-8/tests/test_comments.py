@@ -0,0 +1,48 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+import unittest
+
+from intelligent_text_completion_lib.comments import CommentIndex, NO_TOKEN, OPENER, CLOSER, first_token
+
+class FirstTokenTest(unittest.TestCase):
+
+    def test_tokens_in_strings_are_skipped(self):
+        self.assertEqual(first_token('printf("/*");'), NO_TOKEN)
+        self.assertEqual(first_token("s = '*/'; /* x"), OPENER)
+        self.assertEqual(first_token('s = "a\\"*/"; */'), CLOSER)
+
+    def test_unclosed_quote_in_a_comment(self):
+        self.assertEqual(first_token(" * it's done */"), CLOSER)
+        self.assertEqual(first_token(' * see http://example.com */'), CLOSER)
+
+class NextTokenTest(unittest.TestCase):
+
+    def test_opener_on_last_line(self):
+        # return after /* on the last line looks at the line after it
+        index = CommentIndex('int x;\n/*')
+        self.assertEqual(index.next_token(2), NO_TOKEN)
+
+    def test_past_the_end(self):
+        self.assertEqual(CommentIndex('a\nb').next_token(10), NO_TOKEN)
+
+    def test_closer_below(self):
+        index = CommentIndex('/*\n\n */\n/*')
+        self.assertEqual(index.next_token(1), CLOSER)
+        self.assertEqual(index.next_token(3), OPENER)
+
+    def test_string_below(self):
+        index = CommentIndex('/*\nputs("*/");\n/*')
+        self.assertEqual(index.next_token(1), OPENER)
+
+if __name__ == '__main__':
+    unittest.main()
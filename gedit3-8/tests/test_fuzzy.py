@@ -0,0 +1,105 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+import random
+import unittest
+
+from intelligent_text_completion_lib.fuzzy import (
+    FuzzyIndex, EXACT, TYPO, SUBSEQUENCE, MIN_TYPO_LENGTH,
+    pattern_bitmasks, prefix_distance, within_one_edit, is_subsequence, subsequence_regex,
+)
+
+def edit_distance(a, b):
+    row = list(range(len(b) + 1))
+    for i, char in enumerate(a, 1):
+        previous, row[0] = row[0], i
+        for j, other in enumerate(b, 1):
+            previous, row[j] = row[j], min(row[j] + 1, row[j - 1] + 1, previous + (char != other))
+    return row[-1]
+
+def naive_quality(pattern, word, max_distance):
+    """ Get the quality of word as a match of pattern by trying everything """
+    if word.startswith(pattern):
+        return EXACT
+    # with more than one edit, too short patterns have no bigrams to look for
+    if len(pattern) >= max(MIN_TYPO_LENGTH, 2 * max_distance + 2):
+        if min(edit_distance(pattern, word[:j]) for j in range(len(word) + 1)) <= max_distance:
+            return TYPO
+    if word[0] == pattern[0] and is_subsequence(pattern[1:], word[1:]):
+        return SUBSEQUENCE
+    return None
+
+def index_of(words):
+    index = FuzzyIndex()
+    for word in words:
+        index.add(word)
+    return index
+
+class MatchTest(unittest.TestCase):
+
+    def test_qualities(self):
+        index = index_of(['complete', 'compute', 'compiler', 'completion', 'cmplx'])
+        self.assertEqual(dict(index.match('compl')), {'complete': EXACT, 'completion': EXACT,
+                                                      'compiler': TYPO, 'compute': TYPO, 'cmplx': TYPO})
+        self.assertEqual(dict(index.match('cmp')), {'cmplx': EXACT, 'complete': SUBSEQUENCE,
+                                                    'compute': SUBSEQUENCE, 'compiler': SUBSEQUENCE,
+                                                    'completion': SUBSEQUENCE})
+
+    def test_pattern_and_removed_words_are_left_out(self):
+        index = index_of(['word', 'words', 'wordy'])
+        index.remove('wordy')
+        self.assertEqual(index.match('word'), [('words', EXACT)])
+
+    def test_ranked_on_count_and_recent_use(self):
+        index = index_of(['value', 'values', 'valid'])
+        index.add('values', 5)
+        self.assertEqual([word for word, quality in index.match('val')], ['values', 'value', 'valid'])
+        index.touch('valid')
+        self.assertEqual(index.match('val', k=1), [('valid', EXACT)])
+
+    def test_same_as_trying_every_word(self):
+        rng = random.Random(4)
+        words = set(''.join(rng.choice('abcde') for _ in range(rng.randint(1, 9))) for _ in range(250))
+        index = index_of(words)
+        for _ in range(150):
+            pattern = ''.join(rng.choice('abcde') for _ in range(rng.randint(1, 7)))
+            for max_distance in (1, 2):
+                expected = {}
+                for word in words:
+                    quality = naive_quality(pattern, word, max_distance)
+                    if quality is not None and word != pattern:
+                        expected[word] = quality
+                found = dict(index.match(pattern, k=len(words), max_distance=max_distance))
+                self.assertEqual(found, expected, (pattern, max_distance))
+
+class DistanceTest(unittest.TestCase):
+
+    def test_prefix_distance(self):
+        masks = pattern_bitmasks('kitten')
+        self.assertEqual(prefix_distance(masks, 6, 'kitten', 2), 0)
+        self.assertEqual(prefix_distance(masks, 6, 'sittingly', 2), 2)
+        self.assertEqual(prefix_distance(masks, 6, 'kitchen', 2), 2)
+
+    def test_within_one_edit(self):
+        self.assertTrue(within_one_edit('helo', 'hello'))
+        self.assertTrue(within_one_edit('hxllo', 'hello'))
+        self.assertTrue(within_one_edit('heello', 'hello'))
+        self.assertFalse(within_one_edit('hxxlo', 'hello'))
+
+    def test_subsequence_regex(self):
+        self.assertTrue(subsequence_regex('cmp').match('complete'))
+        self.assertFalse(subsequence_regex('cmp').match('xcmp'))
+        self.assertFalse(subsequence_regex('cpm').match('complete'))
+        self.assertTrue(subsequence_regex('a.b').match('a..b'))
+
+if __name__ == '__main__':
+    unittest.main()
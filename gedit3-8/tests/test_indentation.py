@@ -0,0 +1,49 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+import unittest
+
+from intelligent_text_completion_lib.indentation import reindent_text
+
+class ReindentTextTest(unittest.TestCase):
+
+    def test_whole_block_keeps_its_nesting(self):
+        self.assertEqual(reindent_text('def f():\n    return 1\n', '    ', '    ', 4),
+                         'def f():\n        return 1\n')
+
+    def test_whole_block_with_braces(self):
+        self.assertEqual(reindent_text('if (x) {\n  y();\n}', '\t', '\t', 4),
+                         'if (x) {\n\t\ty();\n\t}')
+
+    def test_indented_block(self):
+        self.assertEqual(reindent_text('    if x:\n        y()\n', '', '\t', 4),
+                         'if x:\n\ty()\n')
+
+    def test_copied_from_the_middle_of_a_line(self):
+        # the first line is the end of a line, the others are one block
+        self.assertEqual(reindent_text('bar()\n        baz()\n        qux()', '    x = ', '    ', 4),
+                         'bar()\n    baz()\n    qux()')
+
+    def test_pasted_in_the_middle_of_a_line(self):
+        self.assertEqual(reindent_text('    a(\n        b)', '  x = ', '  ', 4),
+                         'a(\n    b)')
+
+    def test_tabs_and_spaces_mixed(self):
+        # a tab after four spaces ends at column 8, two levels of 4
+        self.assertEqual(reindent_text('if x:\n    \ty()\n\tz()\n', '', '  ', 4),
+                         'if x:\n    y()\n  z()\n')
+
+    def test_blank_lines_are_emptied(self):
+        self.assertEqual(reindent_text('a\n   \nb', '  ', '  ', 4), 'a\n\n  b')
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+import unittest
+
+from intelligent_text_completion_lib.lineindex import LineIndex, KEYWORDS, completed_closer
+from intelligent_text_completion_lib.rules import get_rule_table
+
+NESTED_FUNCTION = 'if true; then\n  function f {\n    echo\n  }\nfi'
+
+class CompletedCloserTest(unittest.TestCase):
+
+    def test_word_that_starts_with_a_closer(self):
+        # typing find inside an if block doesn't stop at fi
+        self.assertIsNone(completed_closer('    fi', 'n'))
+        self.assertIsNone(completed_closer('    find', ' '))
+        self.assertIsNone(completed_closer('    end', 'p'))
+        self.assertIsNone(completed_closer('    done', '_'))
+
+    def test_closer_followed_by_a_non_word_character(self):
+        self.assertEqual(completed_closer('    fi', ' '), 'fi')
+        self.assertEqual(completed_closer('\tdone', ';'), 'done')
+        self.assertEqual(completed_closer('  end', '\r'), 'end')
+
+    def test_no_typed_character(self):
+        self.assertIsNone(completed_closer('    fi', ''))
+
+    def test_opener_of_closer(self):
+        index = LineIndex('if true; then\n    echo\n    fi')
+        self.assertEqual(index.find_opener(2, KEYWORDS), 0)
+
+    def test_shell_function_is_a_brace_block(self):
+        index = LineIndex(NESTED_FUNCTION, get_rule_table('sh').keyword_openers)
+        self.assertEqual(index.find_opener(4, KEYWORDS), 0)
+
+    def test_lua_function_ends_with_end(self):
+        index = LineIndex('function f()\n  return 1\nend', get_rule_table('lua').keyword_openers)
+        self.assertEqual(index.find_opener(2, KEYWORDS), 0)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+import unittest
+
+from intelligent_text_completion_lib.lists import find_block, renumber_text, parse_item, DECIMAL, ALPHA, ROMAN
+
+def block_of(lines, line):
+    return find_block(lambda i: lines[i], len(lines), line)
+
+class FindBlockTest(unittest.TestCase):
+
+    def test_styles(self):
+        self.assertEqual(block_of(['1. a', '2. b'], 1).style, DECIMAL)
+        self.assertEqual(block_of(['a) a', 'b) b'], 1).style, ALPHA)
+        self.assertEqual(block_of(['i. a', 'ii. b'], 1).style, ROMAN)
+
+    def test_continuation_lines_belong_to_the_block(self):
+        block = block_of(['1. a', '   more', '2. b', 'after'], 2)
+        self.assertEqual((block.first_line, block.items, block.last_line), (0, [0, 2], 2))
+
+    def test_roman_list_after_a_lettered_item(self):
+        # h. is the item before i. in a lettered list, but this one starts at i
+        block = block_of(['h. x', 'i. a', 'ii. b'], 2)
+        self.assertEqual((block.first_line, block.style, block.items), (1, ROMAN, [0, 1]))
+
+    def test_initials_are_not_a_list(self):
+        self.assertIsNone(block_of(['D. Brown said'], 0))
+        self.assertIsNone(parse_item('word'))
+
+class RenumberTextTest(unittest.TestCase):
+
+    def test_lettered_list(self):
+        lines = ['a) one', 'c) two', 'b) three']
+        block = block_of(lines, 1)
+        self.assertEqual(renumber_text(block, '\n'.join(lines), 0), (1, 2, 'b) two\nc) three'))
+        self.assertEqual(block.labels, ['a', 'b', 'c'])
+
+    def test_upper_case_lettered_list_after_a_new_item(self):
+        lines = ['A. one', 'B. two', 'B. three']
+        block = block_of(lines, 0)
+        self.assertEqual(renumber_text(block, '\n'.join(lines[1:]), 1), (1, 1, 'C. three'))
+
+    def test_roman_list(self):
+        lines = ['i. one', 'ii. two', 'v. three']
+        block = block_of(lines, 2)
+        self.assertEqual(renumber_text(block, '\n'.join(lines), 0), (2, 2, 'iii. three'))
+
+    def test_only_the_changed_lines(self):
+        lines = ['1. a', '   more', '2. b', '4. c']
+        block = block_of(lines, 3)
+        self.assertEqual(renumber_text(block, '\n'.join(lines), 0), (3, 3, '3. c'))
+
+    def test_nothing_to_renumber(self):
+        lines = ['1. a', '2. b']
+        self.assertIsNone(renumber_text(block_of(lines, 0), '\n'.join(lines), 0))
+
+if __name__ == '__main__':
+    unittest.main()
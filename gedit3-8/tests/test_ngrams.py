@@ -0,0 +1,73 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+import unittest
+
+from intelligent_text_completion_lib.ngrams import NgramModel
+
+TEXT = 'import os\nimport sys\nimport os.path\nfrom os import path\nself.assertEqual(a, b)\n'
+
+def counts_of(model):
+    """ Get the live word counts, and the number and total count of the live
+    n-grams of model """
+    words = dict((model.words[word_id], count) for word_id, count in enumerate(model.word_counts) if count)
+    ngrams = {}
+    for n, table in enumerate(model.tables, 2):
+        for entry, count in enumerate(table.counts):
+            if count:
+                ngrams[(n, entry)] = count
+    return words, len(ngrams), sum(ngrams.values())
+
+class NgramModelTest(unittest.TestCase):
+
+    def test_predict_follows_the_longest_context(self):
+        model = NgramModel()
+        model.add_text(TEXT)
+        self.assertEqual(model.predict(['import']), ['os', 'sys', 'path'])
+        # the followers of os come after those of from os
+        self.assertEqual(model.predict(['from', 'os']), ['import', 'path'])
+        self.assertEqual(model.predict(['import'], prefix='s'), ['sys'])
+        self.assertEqual(model.predict(['unknown']), [])
+
+    def test_only_words_on_the_same_line(self):
+        model = NgramModel()
+        model.add_text('a b\nc d')
+        self.assertEqual(model.predict(['b']), [])
+
+    def test_removal_restores_the_counts(self):
+        model = NgramModel()
+        model.add_text(TEXT)
+        before = counts_of(model)
+        model.add_text('import re\nfrom os import sep\n')
+        model.remove_text('import re\nfrom os import sep\n')
+        self.assertEqual(counts_of(model), before)
+        self.assertEqual(model.predict(['import']), ['os', 'sys', 'path'])
+
+    def test_compact_keeps_the_live_counts(self):
+        model = NgramModel()
+        model.add_text(TEXT)
+        model.add_text('x y z')
+        model.remove_text('x y z')
+        before = counts_of(model)
+        model.compact()
+        self.assertEqual(counts_of(model), before)
+        self.assertNotIn('x', model.word_ids)
+        self.assertEqual(model.predict(['from', 'os']), ['import', 'path'])
+
+    def test_removing_everything(self):
+        model = NgramModel()
+        model.add_text(TEXT)
+        model.remove_text(TEXT)
+        self.assertEqual(counts_of(model), ({}, 0, 0))
+
+if __name__ == '__main__':
+    unittest.main()
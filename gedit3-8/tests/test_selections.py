@@ -0,0 +1,45 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+import unittest
+
+from intelligent_text_completion_lib.selections import indent_text, dedent_text, prefix_text, dedent_whitespace
+
+class IndentTest(unittest.TestCase):
+
+    def test_indent_keeps_blank_lines_and_line_breaks(self):
+        self.assertEqual(indent_text('a\r\n\n  b', '\t'), '\ta\r\n\n\t  b')
+
+    def test_dedent(self):
+        self.assertEqual(dedent_text('    a\n\tb\n  c\nd', '    '), 'a\nb\nc\nd')
+
+class PrefixTest(unittest.TestCase):
+
+    def test_prefix_after_the_indentation(self):
+        self.assertEqual(prefix_text('a\n\n  b', '# '), '# a\n\n  # b')
+
+    def test_prefix_is_toggled_off(self):
+        self.assertEqual(prefix_text('# a\n  #b', '# '), 'a\n  b')
+
+    def test_prefix_on_when_a_line_lacks_it(self):
+        self.assertEqual(prefix_text('# a\nb', '# '), '# # a\n# b')
+
+class DedentWhitespaceTest(unittest.TestCase):
+
+    def test_dedent_whitespace(self):
+        self.assertEqual(dedent_whitespace('\t\t', '\t'), '\t')
+        self.assertEqual(dedent_whitespace('    \t', '    '), '    ')
+        self.assertEqual(dedent_whitespace('      ', '    '), '  ')
+        self.assertEqual(dedent_whitespace('  ', '    '), '')
+
+if __name__ == '__main__':
+    unittest.main()
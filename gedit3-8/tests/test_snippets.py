@@ -0,0 +1,90 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from intelligent_text_completion_lib.snippets import SnippetStore, expand_snippet, DEFAULT_KEY
+
+class ExpandSnippetTest(unittest.TestCase):
+
+    def test_cursor_placeholder(self):
+        self.assertEqual(expand_snippet('print($0)', ''), ('print(', ')'))
+
+    def test_cursor_after_the_expansion_without_placeholder(self):
+        self.assertEqual(expand_snippet('pass', ''), ('pass', ''))
+
+    def test_new_lines_get_the_indentation_of_the_line(self):
+        self.assertEqual(expand_snippet('if x:\n\t$0\nelse:\n\tpass', '  ', '    '),
+                         ('if x:\n      ', '\n  else:\n      pass'))
+
+    def test_literal_dollar(self):
+        self.assertEqual(expand_snippet('$$0 $0 $$', ''), ('$0 ', ' $'))
+        self.assertEqual(expand_snippet('a$$b', ''), ('a$b', ''))
+
+    def test_only_the_first_placeholder_is_the_cursor(self):
+        self.assertEqual(expand_snippet('$0x$0', ''), ('', 'x'))
+
+class SnippetStoreTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'snippets.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def load(self, text):
+        with open(self.path, 'w') as f:
+            f.write(text)
+        store = SnippetStore(self.path)
+        stderr = io.StringIO()
+        with contextlib.redirect_stderr(stderr):
+            store.maybe_reload()
+        return store
+
+    def test_lookup_whole_words(self):
+        store = self.load(json.dumps({'key': 'F2', 'snippets': {'pr': 'print($0)', 'fpr': 'f($0)', '->': 'x'}}))
+        self.assertEqual(store.key_name, 'F2')
+        self.assertEqual(store.lookup('  pr'), ('pr', 'print($0)'))
+        self.assertEqual(store.lookup('fpr'), ('fpr', 'f($0)'))
+        self.assertIsNone(store.lookup('xpr'))
+        self.assertEqual(store.lookup('a->'), ('->', 'x'))
+        self.assertEqual(store.errors, [])
+
+    def test_malformed_entries_are_skipped(self):
+        store = self.load(json.dumps({'key': 3, 'snippets': {'pr': 'print($0)', 'n': None, '': 'x'}}))
+        self.assertEqual(store.key_name, DEFAULT_KEY)
+        self.assertEqual(store.lookup('pr'), ('pr', 'print($0)'))
+        self.assertIsNone(store.lookup('n'))
+        self.assertEqual(len(store.errors), 3)
+
+    def test_malformed_file(self):
+        for text in ['{"snippets": ', '[]', '{"snippets": 3}']:
+            store = self.load(text)
+            self.assertEqual(store.key_name, DEFAULT_KEY)
+            self.assertIsNone(store.lookup('pr'))
+            self.assertEqual(len(store.errors), 1, text)
+
+    def test_no_file(self):
+        store = SnippetStore(self.path)
+        self.assertFalse(store.maybe_reload())
+        self.assertIsNone(store.lookup('pr'))
+        self.assertEqual(store.errors, [])
+
+if __name__ == '__main__':
+    unittest.main()
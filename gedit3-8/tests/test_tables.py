@@ -0,0 +1,64 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+import unittest
+
+from intelligent_text_completion_lib.tables import find_table, parse_row, cell_position, cell_column, text_width
+
+def table_of(lines, line=0):
+    return find_table(lambda i: lines[i], len(lines), line)
+
+class AlignTest(unittest.TestCase):
+
+    def test_pads_cells_to_their_column(self):
+        table = table_of(['| a | bb |', '|:-|-:|', '| ccc | d |'])
+        # separator cells are at least 3 wide
+        self.assertEqual(table.align(), [(0, 2, ['| a   | bb  |', '| :-- | --: |', '| ccc | d   |'])])
+        self.assertEqual(table.align(), [])
+
+    def test_cell_being_typed_is_not_padded(self):
+        table = table_of(['| a | b', '|--|'])
+        self.assertEqual(table.align(), [(0, 1, ['| a   | b', '| --- |'])])
+
+    def test_wide_characters(self):
+        table = table_of(['| 名前 | x |', '| ab | yyyy |'])
+        self.assertEqual(table.widths, [4, 4])
+        self.assertEqual(table.align(), [(0, 1, ['| 名前 | x    |', '| ab   | yyyy |'])])
+        self.assertEqual(cell_column(table.rows[0], table.widths, 1, 0), 7)
+
+    def test_only_changed_rows_after_an_edit(self):
+        lines = ['| a | b |', '| c | d |']
+        table = table_of(lines)
+        table.align()
+        lines[1] = '| c | dd |'
+        table.lines_replaced(1, 1, 1)
+        self.assertTrue(table.refresh(lambda i: lines[i]))
+        # the edited row is aligned already
+        self.assertEqual(table.align(), [(0, 0, ['| a | b  |'])])
+
+class RowTest(unittest.TestCase):
+
+    def test_escaped_pipe(self):
+        self.assertEqual(parse_row('| a \\| b | c |').cells, ['a \\| b', 'c'])
+        self.assertIsNone(parse_row('a | b'))
+
+    def test_cell_position(self):
+        self.assertEqual(cell_position('| ab | cd |', 8), (1, 1))
+        self.assertEqual(cell_position('  | ab |', 1), (0, 0))
+
+    def test_text_width(self):
+        self.assertEqual(text_width('abc'), 3)
+        self.assertEqual(text_width('名'), 2)
+        self.assertEqual(text_width('é'), 1)
+
+if __name__ == '__main__':
+    unittest.main()
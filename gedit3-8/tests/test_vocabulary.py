@@ -0,0 +1,54 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from intelligent_text_completion_lib.vocabulary import Vocabulary
+
+class VocabularyTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'vocabulary.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_complete_and_count(self):
+        vocabulary = Vocabulary(self.path)
+        for word, count in [('print', 3), ('private', 5), ('prize', 1), ('process', 2), ('été', 4)]:
+            vocabulary.add(word, count)
+        vocabulary.flush()
+        self.assertEqual(vocabulary.complete('pri', k=2), [('private', 5), ('print', 3)])
+        self.assertEqual(vocabulary.complete('x'), [])
+        self.assertEqual(vocabulary.count('été'), 4)
+        self.assertEqual(vocabulary.count('pr'), 0)
+        vocabulary.close()
+
+    def test_file_written_in_the_background_is_mapped_on_next_lookup(self):
+        vocabulary = Vocabulary(self.path)
+        vocabulary.add('alpha')
+        vocabulary.flush()
+        self.assertEqual(vocabulary.complete('a'), [('alpha', 1)])
+        vocabulary.add('alpha', 2)
+        vocabulary.add('apple')
+        vocabulary.flush_in_background()
+        # waits for the worker thread, there is nothing left to write
+        vocabulary.flush()
+        self.assertEqual(vocabulary.complete('a'), [('alpha', 3), ('apple', 1)])
+        vocabulary.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+# Copyright (C) 2010 - Jens Nyman (nymanjens.nj@gmail.com)
+#
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+
+import unittest
+
+from intelligent_text_completion_lib.xmltags import TagIndex, get_unclosed_xml_tags, get_closing_xml_tag, closing_tags_text
+
+DOCUMENT = '<root>\n  <a href="x">\n    <B>text</b>\n    <!-- <c> -->\n    <br/>\n    <d>\n'
+
+def indexed(text):
+    index = TagIndex()
+    index.scan(text, 0)
+    return index
+
+class TagIndexTest(unittest.TestCase):
+
+    def test_matches_scanning_the_text(self):
+        index = indexed(DOCUMENT)
+        for offset in range(len(DOCUMENT) + 1):
+            self.assertEqual(index.unclosed_before(offset), get_unclosed_xml_tags(DOCUMENT[:offset]))
+
+    def test_names_are_interned(self):
+        index = indexed('<a><A></a><a>')
+        self.assertEqual(len(index), 4)
+        self.assertEqual(index.names, ['a', 'A'])
+
+    def test_forget_and_scan_again(self):
+        index = indexed(DOCUMENT)
+        offset = DOCUMENT.index('<B>') + 1
+        index.forget(offset)
+        # the index ends after the last tag that is kept
+        self.assertEqual(index.scanned_end, DOCUMENT.index('<a href="x">') + len('<a href="x">'))
+        changed = DOCUMENT[:offset] + 'i>text</i>\n  </a>\n'
+        index.scan(changed[index.scanned_end:], index.scanned_end)
+        for offset in range(len(changed) + 1):
+            self.assertEqual(index.unclosed_before(offset), get_unclosed_xml_tags(changed[:offset]))
+
+    def test_unfinished_tag_is_scanned_again(self):
+        index = indexed('<a><b')
+        self.assertEqual(index.scanned_end, 3)
+        index.scan('<b>', index.scanned_end)
+        self.assertEqual(index.unclosed_before(6), ['b', 'a'])
+
+    def test_open_tags_with_their_offsets(self):
+        index = indexed('<a>\n<b></b><c>')
+        self.assertEqual(index.open_tags_before(14), [('c', 11), ('a', 0)])
+
+class ClosingXmlTagTest(unittest.TestCase):
+
+    def test_innermost_open_tag(self):
+        self.assertEqual(get_closing_xml_tag(DOCUMENT), 'd')
+        self.assertEqual(get_closing_xml_tag('<a><b></B>'), 'a')
+        self.assertIsNone(get_closing_xml_tag('<?php ?><a></a>'))
+
+class HtmlRulesTest(unittest.TestCase):
+
+    def assertUnclosed(self, document, expected):
+        self.assertEqual(get_unclosed_xml_tags(document, html=True), expected)
+        self.assertEqual(indexed(document).unclosed_before(len(document), html=True), expected)
+
+    def test_implied_end_by_a_sibling(self):
+        self.assertUnclosed('<ul><li>a<li>b', ['li', 'ul'])
+        self.assertUnclosed('<table><tr><td>a<td>b', ['td', 'tr', 'table'])
+        self.assertUnclosed('<dl><dt>a<dd>b', ['dd', 'dl'])
+        self.assertUnclosed('<select><option>a<optgroup>', ['optgroup', 'select'])
+
+    def test_implied_end_by_the_parent(self):
+        self.assertUnclosed('<ul><li>a</ul>', [])
+
+    def test_paragraph_closed_by_a_block(self):
+        self.assertUnclosed('<p>a<div>', ['div'])
+        self.assertUnclosed('<P>a<UL>', ['UL'])
+        self.assertUnclosed('<p>a<span>', ['span', 'p'])
+
+    def test_void_elements(self):
+        self.assertUnclosed('<br><img src=x><div>', ['div'])
+        self.assertUnclosed('<div></br>', ['div'])
+
+    def test_head_closed_by_body(self):
+        self.assertUnclosed('<html><head><title>x</title><body><p>', ['p', 'body', 'html'])
+
+    def test_xml_keeps_every_tag(self):
+        self.assertEqual(get_unclosed_xml_tags('<ul><li>a<li>b'), ['li', 'li', 'ul'])
+
+class ClosingTagsTextTest(unittest.TestCase):
+
+    def test_tags_of_one_line_go_on_one_line(self):
+        open_tags = [('b', 2, '    '), ('a', 2, '    '), ('root', 0, '')]
+        self.assertEqual(closing_tags_text(open_tags, 3, True), '    </b></a>\n</root>')
+
+    def test_tag_opened_on_the_cursor_line_is_closed_at_the_cursor(self):
+        self.assertEqual(closing_tags_text([('b', 3, '  '), ('a', 1, '')], 3, False), '</b>\n</a>')
+
+    def test_starts_a_new_line_after_text(self):
+        self.assertEqual(closing_tags_text([('b', 1, '  ')], 3, False), '\n  </b>')
+
+    def test_nothing_open(self):
+        self.assertEqual(closing_tags_text([], 3, False), '')
+
+if __name__ == '__main__':
+    unittest.main()